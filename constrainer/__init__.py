@@ -6,4 +6,7 @@ constrainer/__init__.py
         https://github.com/switham/constrainer/blob/master/LICENSE
 """
 from constrainer import *
+from intvar import *
+from logic import *
+from propagator import *
 
@@ -0,0 +1,308 @@
+"""
+constrainer/bitsearch.py -- A SearchState that keeps values and
+membership as integer bitsets.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+BitSearchState searches a Model (see model.py) the way SearchState
+does, and has the same methods, so either can be used:
+
+    search = BitSearchState(Model.from_state(state))
+    for is_solution in search.generate_leaves():
+        ...
+
+The assignment is two bitsets, the True bits and the False bits, each a
+list of words: Python ints of chunk_bits bits, with var #id at bit
+id % chunk_bits of word id // chunk_bits.  Each constraint's vars are a
+mask for each word they're in.  A constraint's counts are popcounts of
+its masks ANDed with the words, and forcing a constraint's Maybes is one
+OR per word.  The only per-var work is finding which constraints to look
+at after a change.
+
+Undo restores whole words: the first time a stack level changes a word,
+the word's True and False bits are saved, and popping the level puts
+them back.  There's no trail of single changes.
+
+One int for the whole model would be simpler, but then every AND and
+popcount would cost in proportion to the vars in the model rather than
+in the constraint.  With words, a constraint costs in proportion to the
+words its vars are in, so it helps to number a constraint's vars close
+together.  Small models fit in one word.
+
+SearchState keeps each constraint's counts up to date one var at a time,
+while this counts a constraint over again each time it's looked at.  So
+this is faster on models like soma's, whose constraints fit in a word or
+two, and slower on models whose constraints are long and spread over
+many words: the columns of a 300 by 300 grid are spread over 88 words,
+and SearchState searches that grid about 25 times as fast.
+examples/engine_bench.py compares the engines.
+"""
+
+from maybies import *
+from model import _code, FALSE, TRUE
+
+CHUNK_BITS = 1024
+
+
+def popcount(x):
+    return bin(x).count("1")
+
+
+def _bits(x):
+    """ Yield the positions of x's 1 bits, lowest first. """
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def model_masks(model, chunk_bits=CHUNK_BITS):
+    """
+    Return, for each of model's constraints, a tuple of (word number,
+    mask) for the words its vars are in.  Made once per Model and
+    chunk_bits, and kept on the Model.
+    """
+    cache = getattr(model, "bit_masks", None)
+    if cache is None:
+        cache = model.bit_masks = {}
+    if chunk_bits not in cache:
+        masks = []
+        for ids in model.constraint_vars:
+            words = {}
+            for id in ids:
+                i, bit = divmod(id, chunk_bits)
+                words[i] = words.get(i, 0) | 1 << bit
+            masks.append(tuple(sorted(words.iteritems())))
+        cache[chunk_bits] = masks
+    return cache[chunk_bits]
+
+
+class BitSearchState(object):
+    """
+    One search of a Model, with bitsets.  assumptions is a dict of {var
+    or var id: True or False} to fix before the search.
+    """
+    def __init__(self, model, assumptions=None, verbose=False,
+                 chunk_bits=CHUNK_BITS):
+        self.model = model
+        self.verbose = verbose
+        self.chunk_bits = chunk_bits
+        self.masks = model_masks(model, chunk_bits)
+        n_words, n_last = divmod(model.n_vars, chunk_bits)
+        self.all_words = [(1 << chunk_bits) - 1] * n_words
+        if n_last:
+            self.all_words.append( (1 << n_last) - 1 )
+        self.true_words = [0] * len(self.all_words)
+        self.false_words = [0] * len(self.all_words)
+        for id, code in enumerate(model.initial_values):
+            i, bit = divmod(id, chunk_bits)
+            if code == TRUE:
+                self.true_words[i] |= 1 << bit
+            elif code == FALSE:
+                self.false_words[i] |= 1 << bit
+        self.initial = (list(self.true_words), list(self.false_words))
+        # Constraints to look at in the next propagate().
+        self.dirty = set(xrange(len(self.masks)))
+        # For each stack level, [the (word number, True word, False word)
+        # saved by this level, the dirty constraints to go back to, this
+        # level's serial number].
+        self.frames = []
+        # saved_by[i] is the serial number of the last level to save word
+        # i.  Serial numbers aren't reused, so a level whose mark was
+        # overwritten only saves the word again, which is harmless.
+        self.saved_by = [None] * len(self.all_words)
+        self.serial = 0
+        self.assumptions = {}
+        for var, value in (assumptions or {}).iteritems():
+            self.assumptions[getattr(var, "id", var)] = value
+        self.cancelled = False
+
+    def value(self, var):
+        """ The value of a var (or var id) in this search. """
+        i, bit = divmod(getattr(var, "id", var), self.chunk_bits)
+        if self.true_words[i] >> bit & 1:
+            return True
+        if self.false_words[i] >> bit & 1:
+            return False
+        return Maybe
+
+    def true_ids(self):
+        chunk_bits = self.chunk_bits
+        return [i * chunk_bits + bit
+                for i, word in enumerate(self.true_words)
+                for bit in _bits(word)]
+
+    def true_vars(self):
+        return [self.model.var(id) for id in self.true_ids()]
+
+    def depth(self):
+        return len(self.frames)
+
+    def lowest_maybe(self):
+        """ Return the id of the lowest-numbered Maybe var, or None. """
+        true_words = self.true_words
+        false_words = self.false_words
+        for i, all_bits in enumerate(self.all_words):
+            maybes = all_bits & ~(true_words[i] | false_words[i])
+            if maybes:
+                return i * self.chunk_bits \
+                       + (maybes & -maybes).bit_length() - 1
+        return None
+
+    def _save(self, i):
+        """ Save word i in the current level, if it isn't already. """
+        frame = self.frames[-1]
+        if self.saved_by[i] != frame[2]:
+            self.saved_by[i] = frame[2]
+            frame[0].append( (i, self.true_words[i], self.false_words[i]) )
+
+    def _changed(self, i, bits):
+        """ Mark the constraints of the vars in bits of word i. """
+        var_constraints = self.model.var_constraints
+        base = i * self.chunk_bits
+        for bit in _bits(bits):
+            self.dirty.update(var_constraints[base + bit])
+
+    def set(self, id, code):
+        i, bit = divmod(id, self.chunk_bits)
+        self._save(i)
+        if code == TRUE:
+            self.true_words[i] |= 1 << bit
+        else:
+            self.false_words[i] |= 1 << bit
+        self._changed(i, 1 << bit)
+
+    def push(self):
+        self.serial += 1
+        self.frames.append( [[], frozenset(self.dirty), self.serial] )
+
+    def pop(self):
+        """
+        Undo one level and return True, or return False at the bottom.
+        """
+        if len(self.frames) <= 1:
+            return False
+
+        saved, dirty, serial = self.frames.pop()
+        for i, true_word, false_word in reversed(saved):
+            self.true_words[i] = true_word
+            self.false_words[i] = false_word
+        self.dirty = set(dirty)
+        return True
+
+    def reset(self):
+        """ Undo everything, as State.reset() does. """
+        self.true_words = list(self.initial[0])
+        self.false_words = list(self.initial[1])
+        del self.frames[:]
+        self.dirty = set(xrange(len(self.masks)))
+        self.cancelled = False
+
+    def cancel(self):
+        """ Ask generate_leaves() to stop, as State.cancel() does. """
+        self.cancelled = True
+
+    def propagate(self):
+        """
+        Make the inferences the BoolConstraints would.  Return False on a
+        contradiction.
+        """
+        masks = self.masks
+        mins = self.model.mins
+        maxes = self.model.maxes
+        true_words = self.true_words
+        false_words = self.false_words
+        dirty = self.dirty
+        while dirty:
+            c = dirty.pop()
+            n_True = 0
+            n_Maybe = 0
+            for i, mask in masks[c]:
+                true_word = true_words[i]
+                trues = mask & true_word
+                if trues:
+                    n_True += popcount(trues)
+                maybes = mask & ~(true_word | false_words[i])
+                if maybes:
+                    n_Maybe += popcount(maybes)
+            if n_True > maxes[c] or n_True + n_Maybe < mins[c]:
+                if self.verbose:
+                    print "Conflict:", self.model.constraints[c]
+                dirty.clear()
+                return False
+
+            if not n_Maybe:
+                continue
+
+            if n_True + n_Maybe == mins[c]:
+                words = true_words
+            elif n_True == maxes[c]:
+                words = false_words
+            else:
+                continue
+
+            for i, mask in masks[c]:
+                maybes = mask & ~(true_words[i] | false_words[i])
+                if maybes:
+                    self._save(i)
+                    words[i] |= maybes
+                    self._changed(i, maybes)
+        return True
+
+    def guess(self, default_guess=None):
+        """ Return (var id, value): the lowest-numbered Maybe var. """
+        if default_guess == None:
+            default_guess = False
+        return self.lowest_maybe(), default_guess
+
+    def branch(self, id, value):
+        """ Like State.branch(), for var #id. """
+        if self.verbose:
+            print "guess", self.model.var(id), value
+        assert self.value(id) == Maybe, "You can only guess about Maybies."
+        self.set(id, _code(not value))
+        self.push()  # -------- the stack frame boundary --------
+        # Popping back to here leaves (not value) set; now undo it in
+        # this level only, and set value.
+        i, bit = divmod(id, self.chunk_bits)
+        self._save(i)
+        self.true_words[i] &= ~(1 << bit)
+        self.false_words[i] &= ~(1 << bit)
+        self.set(id, _code(value))
+
+    def generate_leaves(self, verbose=False, default_guess=None):
+        """
+        Search for solutions.  Yield False at dead ends and True at
+        solutions, like State.generate_leaves().
+        """
+        self.push()
+        for id, value in self.assumptions.iteritems():
+            current = self.value(id)
+            if current == Maybe:
+                self.set(id, _code(value))
+            elif current != value:
+                # The assumption contradicts the model.
+                self.reset()
+                return
+
+        while True:
+            if self.cancelled:
+                break
+
+            if not self.propagate():
+                if verbose: print "Conflict at depth", self.depth()
+                yield False
+
+            elif self.lowest_maybe() is None:
+                yield True
+
+            else:
+                self.branch(*self.guess(default_guess=default_guess))
+                continue
+
+            if not self.pop():
+                break
+
+        self.reset()
@@ -6,9 +6,23 @@ constrainer.py -- a simple constraint-solver.
         https://github.com/switham/constrainer/blob/master/LICENSE
 """
 
+import random
+
 from maybies import *
 
 
+# Orders of search for generate_leaves(mode=...):
+SEARCH_MODES = {
+    "dfs": "depth-first, the default",
+    "lds": "limited discrepancy search: iteration k allows up to k guesses "
+           "against the preferred value",
+    "ilds": "iterative-deepening discrepancy search: iteration k takes "
+            "exactly k guesses against the preferred value",
+    "dds": "depth-bounded discrepancy search: iteration k branches freely "
+           "above depth k, and takes only preferred values below it",
+}
+
+
 class State(object):
     """ The overall state for a constraints-problem-solving process. """
 
@@ -16,12 +30,35 @@ class State(object):
         if verbose:
             print "Hi, I am a new State."
         self.verbose = verbose
-        self.vars = set()
+        self.vars = []  # Indexed by var.id.
+        # IntVars (see intvar.py), indexed by their own ids.
+        self.int_vars = []
+        # BoolVars and IntVars whose values aren't known yet.
         self.maybe_vars = set()
+        self.metadata = VarMetadata()
         self.constraints = set()
         self.conflicted_constraints = set()
         self.eager_constraints = set()
-        self.log_stack = []  # a list of lists of (var, prev_value) pairs.
+        # Propagators (see propagator.py) that want to run, once the
+        # eager_constraints are done.
+        self.eager_propagators = set()
+        # A list of lists of (var, prev_value) pairs.  (Or (propagator,
+        # saved_value) pairs; anything with a raw_set() method.)
+        self.log_stack = []
+        self.cancelled = False
+        # Zobrist hashing of the residual problem, off until
+        # enable_hashing(): hash_keys[id] is var #id's (Maybe, False, True)
+        # keys.
+        self.hash_keys = None
+        self.hash = 0
+        # Something to tell about branches and pops, such as a Progress
+        # (see progress.py), or None.
+        self.tracker = None
+        # The deepest and longest log_stack seen by memory.watch_trail().
+        self.peak_depth = 0
+        self.peak_trail = 0
+        # The objective value of the best solution found by minimize().
+        self.incumbent = None
 
     def depth(self):
         return len(self.log_stack)
@@ -39,6 +76,8 @@ class State(object):
         if self.verbose:
             print "pop",
         if len(self.log_stack) > 1:
+            if self.tracker is not None:
+                self.tracker.popped(len(self.log_stack) - 1)
             for var, value_to_restore in reversed(self.log_stack.pop()):
                 if self.verbose:
                     print "reset", var, value_to_restore
@@ -55,11 +94,42 @@ class State(object):
                 print "done."
             return False
 
+    def reset(self):
+        """
+        Undo everything on the stack, including the bottom level, so the
+        vars are as they were when the problem was set up and the state
+        can be searched again.  Also clears a cancel().
+        """
+        while self.log_stack:
+            for var, value_to_restore in reversed(self.log_stack.pop()):
+                var.raw_set(value_to_restore)
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Ask a running generate_leaves() (or generate_projected()) to stop.
+        It can be called from another thread, or from a timer.  The
+        generator notices before its next step, resets the state, and
+        finishes as if the search were over.
+        """
+        self.cancelled = True
+
     def check_all(self):
         self.maybe_vars = set(var for var in self.vars if var.value == Maybe)
+        self.maybe_vars.update(var for var in self.int_vars
+                               if var.value == Maybe)
         for constraint in self.constraints:
             constraint.check()
 
+    def conflict_reasons(self):
+        """
+        Return a list of (constraint, reason) for the constraints that are
+        conflicted now, reason being a string.
+        """
+        return [(constraint, getattr(constraint, "reason", None)
+                             or "%r is conflicted" % constraint)
+                for constraint in self.conflicted_constraints]
+
     def consistent(self):
         return not self.conflicted_constraints
 
@@ -70,7 +140,15 @@ class State(object):
         if not self.consistent():
             return False
         
-        while self.eager_constraints:
+        while self.eager_constraints or self.eager_propagators:
+            if not self.eager_constraints:
+                # Propagators are usually slower, so they only run when
+                # the constraints have done all they can.
+                if not self.eager_propagators.pop().propagate():
+                    return False
+
+                continue
+
             for constraint in list(self.eager_constraints):
                 if not constraint.propagate():
                     return False
@@ -79,9 +157,23 @@ class State(object):
         # We should have caught any contradictions by now.            
         return True
 
+    def materialize(self):
+        """
+        Called by the searches at each point where propagation is done,
+        before checking for a solution or guessing.  A lazy model, one
+        that makes vars and constraints only as the search needs them,
+        replaces this (state.materialize = ..., as portfolio.py replaces
+        guess) with a function that adds some and returns True, so the
+        search propagates again, or returns False when the vars it has
+        made are enough here.  (See LazySomaModel in examples/soma.py.)
+        New vars start out Maybe, and stay when the search backs up.
+        """
+        return False
+
     def guess(self, default_guess=None):
         """
-        Return a guess: (var, value), where value is True or False.
+        Return a guess: (var, value), where value is True or False, or
+        for an IntVar a smaller domain (see IntVar.guess_value()).
         var.value must be Maybe at the time you guess.
         This is the default guesser; by default it guesses that an arbitrary
         Maybe is False.  (Or True if default_guess == True.)
@@ -90,65 +182,658 @@ class State(object):
         Sometimes the "principle of least committment" strategy, to make the 
         safest, most likely guess, seems to be fastest.
         Other times it seems to go fastest to make a seeming brash guess.
+
+        If there are IntVars with more than one value left, the one with
+        the fewest is chosen, since its constraints are the likeliest to
+        infer something from the guess.
         """
         if default_guess == None:
             default_guess = False
-        var = self.maybe_vars.pop()
-        self.maybe_vars.add(var)
-        return var, default_guess
+        open_ints = [var for var in self.int_vars if var.value == Maybe]
+        if open_ints:
+            var = min(open_ints, key=lambda var: var.size())
+        else:
+            var = self.maybe_vars.pop()
+            self.maybe_vars.add(var)
+        return var, var.guess_value(default_guess)
+
+    def guesses_left(self):
+        """
+        The most guesses a path down from here can still take: one for
+        each Maybe BoolVar, and for each IntVar, whose guess_value()
+        halves its domain, log2 of its size, rounded up.
+        """
+        # Not hasattr(var, "size"): a BoolVar's metadata might have one.
+        return sum(1 if isinstance(var, BoolVar)
+                   else (var.size() - 1).bit_length()
+                   for var in self.maybe_vars)
+
+    def enable_hashing(self, seed=0):
+        """
+        Start keeping self.hash, a 64-bit Zobrist hash of the residual
+        problem: which vars are still Maybe, plus how many of each
+        BoolConstraint's vars are True, plus each IntVar's domain.  Two
+        points in the search with the same residual problem have the
+        same solutions below them (as far as the Maybe vars go) even if
+        different vars got them there, say the same bloxels filled by
+        different placements.
+
+        A constraint says how it goes into the hash with its hash_by
+        attribute: "count" (BoolConstraint) for its count of True vars,
+        None if it's redundant (it only rules out what the others would
+        eventually), or "values" (the default) meaning its vars' True and
+        False values are hashed too.
+
+        Vars and constraints made since the last call get keys too, so
+        it's safe to call again.
+        """
+        if self.hash_keys is None:
+            self.hash_keys = []
+            self.hash_random = random.Random(seed)
+        rand = self.hash_random.getrandbits
+        for var in self.vars[len(self.hash_keys):]:
+            if all(getattr(constraint, "hash_by", "values") != "values"
+                   for constraint in var.constraints):
+                self.hash_keys.append( (rand(64), 0, 0) )
+            else:
+                self.hash_keys.append( (rand(64), rand(64), rand(64)) )
+        self.hash = 0
+        for var in self.vars:
+            self.hash ^= self.hash_keys[var.id][hash_index(var.value)]
+        for constraint in self.constraints:
+            if getattr(constraint, "hash_by", "values") == "count":
+                if getattr(constraint, "hash_base", None) is None:
+                    constraint.hash_base = rand(64)
+                self.hash ^= constraint.count_key(len(constraint[True]))
+        for var in self.int_vars:
+            if var.hash_keys is None:
+                var.hash_keys = [rand(64) for value in var.values]
+            self.hash ^= var.domain_key(var.domain)
 
-    def generate_leaves(self, verbose=False, default_guess=None):
+    def generate_leaves(self, verbose=False, default_guess=None,
+                        transpositions=None, mode="dfs"):
         """
         Search for solutions.  Yield False when I'm at a dead end,
-        and True when I'm at a solution.
+        and True when I'm at a solution.  When the search is over (or
+        cancelled) the state is reset().
+
+        If transpositions (a TranspositionTable, see transpositions.py) is
+        given, the number of solutions under each finished subtree is
+        stored there by the hash (see enable_hashing()) at its top, and a
+        subtree already known to have none is skipped, with one False.
+
+        mode is the order of the search (see SEARCH_MODES).  Modes other
+        than "dfs" don't use transpositions.
+        """
+        if mode == "dfs":
+            return self._search(verbose, default_guess, transpositions, False)
+
+        assert mode in SEARCH_MODES, "Unknown search mode %r" % mode
+        return self._search_discrepancies(mode, verbose, default_guess)
+
+    def _search_discrepancies(self, mode, verbose, default_guess):
+        """
+        The search loop for the modes that go by discrepancies--taking
+        the other value than the one guess() prefers.  Each iteration
+        searches the part of the tree its mode allows, trying the
+        preferred value first, until an iteration finds that there's no
+        more tree.  Every solution is yielded once, but dead ends may be
+        visited (and yielded) in more than one iteration.
+
+        For the iterations to fit together, the guess at a point of the
+        search has to depend only on the assignment there, so if guess()
+        isn't overridden (in a subclass or on this State) the
+        lowest-numbered Maybe var is chosen.  materialize() is called as
+        in _search(), but vars it makes stay from one iteration to the
+        next, so a model that makes vars mid-search can't use these modes.
+        """
+        if type(self).guess == State.guess and "guess" not in vars(self):
+            def guess():
+                # IntVars are numbered apart from BoolVars.
+                var = min(self.maybe_vars,
+                          key=lambda var: (var.id, type(var).__name__))
+                return var, var.guess_value(bool(default_guess))
+        else:
+            guess = lambda: self.guess(default_guess=default_guess)
+        self.check_all()
+        self.push()
+        iteration = 0
+        # The deepest guess seen so far, in any iteration.
+        deepest = -1
+        while not self.cancelled:
+            if verbose: print "Iteration", iteration, "of", mode
+            more = False  # Whether some part of the tree was left out.
+            # One entry per guess on the current path: [var, list of
+            # (value, discrepancies, depth of the last discrepancy) still
+            # to try, depth].  Each try is one stack level.
+            stack = []
+            depth = 0
+            discrepancies = 0
+            last = -1
+            while not self.cancelled:
+                if not self.propagate():
+                    if verbose: print "Conflict:", self.conflicted_constraints
+                    yield False
+
+                elif self.materialize():
+                    continue
+
+                elif self.is_solved():
+                    # Only solutions this iteration hasn't seen before:
+                    if mode == "dds" and last == iteration - 1 \
+                            or mode != "dds" and discrepancies == iteration:
+                        yield True
+
+                else:
+                    var, value = guess()
+                    deepest = max(deepest, depth)
+                    tries = [(value, discrepancies, last),
+                             (var.opposite(value), discrepancies + 1, depth)]
+                    if mode == "lds":
+                        # At most iteration discrepancies.
+                        if discrepancies >= iteration:
+                            more = True
+                            tries = tries[:1]
+                    elif mode == "ilds":
+                        # Exactly iteration discrepancies.  There can be
+                        # as many more as guesses left after this one.
+                        left = self.guesses_left() - 1
+                        tries = [try_ for try_ in tries
+                                 if try_[1] <= iteration
+                                 and try_[1] + left >= iteration]
+                    else:
+                        # "dds": the last discrepancy is at depth
+                        # iteration - 1.  Above that, anything goes;
+                        # below, only preferred values.
+                        if depth == iteration - 1:
+                            tries = tries[1:]
+                        elif depth >= iteration:
+                            tries = tries[:1]
+                    if tries:
+                        stack.append([var, tries, depth])
+                        self.push()
+                        value, discrepancies, last = tries.pop(0)
+                        depth += 1
+                        if self.verbose:
+                            print "guess", var, value
+                        var.set(value)
+                        continue
+
+                # Back up to the next thing to try.
+                while stack and not stack[-1][1]:
+                    stack.pop()
+                    self.pop()
+                if not stack:
+                    break
+
+                var, tries, depth = stack[-1]
+                self.pop()
+                self.push()
+                value, discrepancies, last = tries.pop(0)
+                depth += 1
+                if self.verbose:
+                    print "guess", var, value
+                var.set(value)
+
+            if self.cancelled:
+                break
+
+            while self.pop():
+                pass
+            iteration += 1
+            if mode == "lds" and not more \
+                    or mode == "ilds" and iteration > deepest + 1 \
+                    or mode == "dds" and iteration > deepest + 1:
+                break
+
+        self.reset()
+
+    def count_solutions(self, transpositions=None, verbose=False,
+                        default_guess=None):
+        """
+        Search the whole tree and return (n_solutions, n_deadends).
+        With a TranspositionTable, any subtree whose residual problem has
+        been seen before is skipped and its stored count added in, so
+        repeated subproblems are only searched once.
+        """
+        n_solutions = 0
+        n_deadends = 0
+        for leaf in self._search(verbose, default_guess, transpositions, True):
+            if leaf is False:
+                n_deadends += 1
+            else:
+                n_solutions += leaf
+        return n_solutions, n_deadends
+
+    def _search(self, verbose, default_guess, transpositions, skip_counted):
+        """
+        The search loop for generate_leaves() and count_solutions().
+        Yields True, False, or (if skip_counted) the number of solutions
+        in a subtree that was skipped because transpositions knew it.
         """
         self.check_all()
+        if transpositions is not None:
+            self.enable_hashing()
+        # Parallel to log_stack: for each stack level, the (hash,
+        # n_found-at-the-time) of the nodes that branched in that level.
+        # Their subtrees are finished when the level is popped.
+        open_nodes = [[]]
+        n_found = 0
         self.push()
         while True:
+            if self.cancelled:
+                break
+
             if not self.propagate():
                 if verbose: print "Conflict:", self.conflicted_constraints
                 yield False
                 # ...then fall down to the pop below.
 
+            elif self.materialize():
+                continue
+
             elif self.is_solved():
+                n_found += 1
                 yield True
                 # ...then fall down to the pop below.
 
             else:
-                var, value = self.guess(default_guess=default_guess)
-                if self.verbose:
-                    print "guess", var, value
-                assert var.value == Maybe, "You can only guess about Maybies."
-                assert value != Maybe, "Must guess True or False, not Maybe."
-                # This set() pushes the Maybe and sets the alternative.
-                # Pop through here untakes both alternatives and their context.
-                var.set(not value)
-                self.push()  # -------- the stack frame boundary --------
-                # This set() pushes the alternative and sets the guess.
-                # Pop through here tries the alternative.
-                var.set(value)
+                count = None
+                if transpositions is not None:
+                    count = transpositions.get(self.hash)
+                if count == 0:
+                    if verbose: print "Known dead end:", self.hash
+                    yield False
+                elif count is not None and skip_counted:
+                    n_found += count
+                    yield count
+                else:
+                    if transpositions is not None:
+                        open_nodes[-1].append( (self.hash, n_found) )
+                    self.branch(*self.guess(default_guess=default_guess))
+                    open_nodes.append([])
+                    continue
+
+            if not self.pop():
+                break
+
+            for hash, n_before in open_nodes.pop():
+                transpositions.put(hash, n_found - n_before)
+
+        self.reset()
+
+    def branch(self, var, value):
+        """
+        Make a search-tree branch on a guess: var is set to value now,
+        and popping back through the new stack level leaves var set to
+        the alternative, var.opposite(value)--(not value), or for an
+        IntVar the rest of its domain.
+        """
+        if self.verbose:
+            print "guess", var, value
+        assert var.value == Maybe, "You can only guess about Maybies."
+        assert value != Maybe, "Must guess True or False, not Maybe."
+        if self.tracker is not None:
+            self.tracker.branched(len(self.log_stack) - 1)
+        # This set() pushes the Maybe and sets the alternative.
+        # Pop through here untakes both alternatives and their context.
+        var.set(var.opposite(value))
+        self.push()  # -------- the stack frame boundary --------
+        # This set() pushes the alternative and sets the guess.
+        # Pop through here tries the alternative.
+        var.set(value)
+
+    def generate_projected(self, vars, verbose=False, default_guess=None):
+        """
+        Search for the distinct solutions "projected" onto vars, that is,
+        the distinct combinations of values of vars that are part of some
+        solution.  Yield True once for each (with the state at one full
+        solution that has that combination), and False at dead ends.
+
+        It guesses about vars first.  Once none of vars are Maybe, every
+        solution below that point has the same projection, so after the
+        first one is found the rest of that subtree is skipped.
+        """
+        if default_guess == None:
+            default_guess = False
+        vars = list(vars)
+        # The stack depth where the projection became complete, if it is.
+        projected_depth = None
+        self.check_all()
+        self.push()
+        while True:
+            if self.cancelled:
+                break
+
+            if not self.propagate():
+                if verbose: print "Conflict:", self.conflicted_constraints
+                yield False
+                # ...then fall down to the pop below.
+
+            elif self.materialize():
                 continue
 
+            else:
+                blanks = [var for var in vars if var.value == Maybe]
+                if blanks:
+                    self.branch(blanks[0], blanks[0].guess_value(default_guess))
+                    continue
+
+                if projected_depth is None:
+                    projected_depth = self.depth()
+                if self.is_solved():
+                    yield True
+                    # Skip the other completions of this projection:
+                    # pop down to where it was complete, then the pop
+                    # below pops out of it.
+                    while self.depth() > projected_depth:
+                        self.pop()
+                    # ...then fall down to the pop below.
+
+                else:
+                    self.branch(*self.guess(default_guess=default_guess))
+                    continue
+
             if not self.pop():
                 break
-        
-    
+
+            if projected_depth is not None and self.depth() < projected_depth:
+                projected_depth = None
+
+        self.reset()
+
+    def minimize(self, vars, weights=None, verbose=False, default_guess=None,
+                 mode="dfs"):
+        """
+        Search for solutions with the smallest sum of the weights (all 1
+        if not given) of the True vars.  Yield False at dead ends, and
+        True at each solution better than the ones before it, with its
+        sum in self.incumbent.  The last one is optimal.  Subtrees that
+        can't do better than the incumbent are pruned.  mode is as for
+        generate_leaves(); a mode other than "dfs" is followed by a
+        depth-first pass with the final bound.  See optimize.py.
+        """
+        from optimize import minimize
+        return minimize(self, vars, weights, verbose, default_guess, mode)
+
+    def unsat_core(self, constraints=None, max_leaves=None, verbose=False):
+        """
+        If there are no solutions, return a list of some of constraints
+        (by default, all that can be relaxed) that has none by itself,
+        and is minimal: without any one of them there'd be a solution.
+        Return None if there is a solution.  Each of the searches this
+        takes can be held to max_leaves leaves; a search that runs out
+        counts as finding a solution, so the core may not be minimal, and
+        None may only mean that the first search ran out.  See core.py.
+        """
+        from core import unsat_core
+        return unsat_core(self, constraints, max_leaves, verbose)
+
+    def memory_report(self):
+        """
+        Return a MemoryReport (see memory.py) of the bytes used by vars,
+        constraints, constraint membership, metadata, hashing and the
+        trail.  print it for a table.
+        """
+        from memory import memory_report
+        return memory_report(self)
+
+    def snapshot(self):
+        """
+        Return the True set of the current assignment as a packed bitset:
+        a string of (len(self.vars) + 7) / 8 bytes, where bit (id % 8) of
+        byte (id / 8) is set if self.vars[id] is True.
+        See constrainer/solutions.py for saving and reading these.
+        """
+        bits = bytearray((len(self.vars) + 7) >> 3)
+        for var in self.vars:
+            if var.value == True:
+                bits[var.id >> 3] |= 1 << (var.id & 7)
+        return str(bits)
+
+    def new_vars(self, n, **columns):
+        """
+        Create n BoolVars at once and return them as a list.
+        Each keyword argument is a sequence of n values, one per var,
+        so new_vars(2, x=[3, 4]) is like [BoolVar(state, x=3),
+        BoolVar(state, x=4)].
+        """
+        for name, column in columns.iteritems():
+            assert len(column) == n, \
+                   "Column %r has %d values for %d vars." % (name, len(column), n)
+
+        first_id = len(self.vars)
+        new = [object.__new__(BoolVar) for i in xrange(n)]
+        for id, var in enumerate(new, first_id):
+            var.state = self
+            var.id = id
+            var.value = Maybe
+            var.constraints = ()
+        self.vars.extend(new)
+        self.maybe_vars.update(new)
+        self.metadata.add_columns(first_id, n, columns)
+        return new
+
+    def new_constraints(self, n, min_True, max_True, **columns):
+        """
+        Create n BoolConstraints without vars, and return them as a list.
+        min_True and max_True are each either a number or a sequence of
+        n numbers.  Each keyword argument is a sequence of n label values.
+        """
+        mins = [min_True] * n if isinstance(min_True, (int, long)) \
+               else list(min_True)
+        maxes = [max_True] * n if isinstance(max_True, (int, long)) \
+                else list(max_True)
+        assert len(mins) == n and len(maxes) == n
+        names = columns.keys()
+        new = []
+        for i in xrange(n):
+            kwargs = dict((name, columns[name][i]) for name in names)
+            new.append(BoolConstraint(self, min_True=mins[i],
+                                      max_True=maxes[i], **kwargs))
+        return new
+
+    def constrain_incidence(self, constraints, vars,
+                            constraint_indices, var_indices):
+        """
+        Add vars to BoolConstraints in bulk.  constraint_indices and
+        var_indices are parallel sequences (lists, arrays, numpy arrays):
+        the k'th pair says vars[var_indices[k]] is constrained by
+        constraints[constraint_indices[k]].  It's an error to list a
+        pair twice or to add a var to a constraint that already has it.
+        This does the same accounting as BoolConstraint.constrain(), but
+        without the per-call overhead.  Uses numpy if it's installed.
+        """
+        assert len(constraint_indices) == len(var_indices)
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is not None:
+            by_constraint, by_var = _group_incidence_numpy(
+                numpy, constraints, vars, constraint_indices, var_indices)
+        else:
+            by_constraint, by_var = _group_incidence(
+                constraints, vars, constraint_indices, var_indices)
+
+        for constraint, new_vars in by_constraint:
+            n_before = len(constraint.vars)
+            constraint.vars.update(new_vars)
+            assert len(constraint.vars) == n_before + len(new_vars), \
+                   "Adding a var to %s twice." % constraint
+            for var in new_vars:
+                constraint.var_categories[var.value].add(var)
+        for var, new_constraints in by_var:
+            var.constraints += tuple(new_constraints)
+
+    def constrain_matrix(self, constraints, vars, matrix):
+        """
+        Like constrain_incidence(), but given a SciPy-style sparse matrix
+        (anything with a tocoo() method) with a row for each constraint
+        and a column for each var.  Nonzero entries are memberships.
+        """
+        coo = matrix.tocoo()
+        self.constrain_incidence(constraints, vars, coo.row, coo.col)
+
+
+def hash_index(value):
+    """ Index of value in a var's (Maybe, False, True) hash keys. """
+    if value == Maybe:
+        return 0
+
+    return 2 if value == True else 1
+
+
+def mix64(x):
+    """ Scramble the bits of an integer into a 64-bit hash (splitmix64). """
+    x &= 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _group_incidence(constraints, vars, constraint_indices, var_indices):
+    """
+    Pure-Python half of State.constrain_incidence().  Return lists of
+    (constraint, [vars...]) and (var, [constraints...]).
+    """
+    pairs = zip(constraint_indices, var_indices)
+    assert len(set(pairs)) == len(pairs), "Duplicate (constraint, var) pairs."
+
+    constraint_vars = {}
+    var_constraints = {}
+    for ci, vi in pairs:
+        constraint_vars.setdefault(ci, []).append(vars[vi])
+        var_constraints.setdefault(vi, []).append(constraints[ci])
+    return [(constraints[ci], vs) for ci, vs in constraint_vars.iteritems()], \
+           [(vars[vi], cs) for vi, cs in var_constraints.iteritems()]
+
+
+def _group_incidence_numpy(numpy, constraints, vars,
+                           constraint_indices, var_indices):
+    """
+    numpy half of State.constrain_incidence(): the duplicate check
+    and the grouping are done with sorts instead of Python loops.
+    """
+    ci = numpy.asarray(constraint_indices, dtype=numpy.int64)
+    vi = numpy.asarray(var_indices, dtype=numpy.int64)
+    keys = ci * len(vars) + vi
+    assert len(numpy.unique(keys)) == len(keys), \
+           "Duplicate (constraint, var) pairs."
+
+    var_objects = numpy.empty(len(vars), dtype=object)
+    var_objects[:] = vars
+    constraint_objects = numpy.empty(len(constraints), dtype=object)
+    constraint_objects[:] = constraints
+    return (_group_sorted(numpy, ci, var_objects[vi], constraints),
+            _group_sorted(numpy, vi, constraint_objects[ci], vars))
+
+
+def _group_sorted(numpy, keys, values, key_objects):
+    """ Return [(key_objects[key], [values with that key...]), ...]. """
+    if len(keys) == 0:
+        return []
+
+    order = numpy.argsort(keys, kind="mergesort")
+    keys = keys[order]
+    values = values[order]
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(keys)) + 1))
+    stops = numpy.concatenate((starts[1:], [len(keys)]))
+    return [(key_objects[keys[start]], values[start:stop].tolist())
+            for start, stop in zip(starts.tolist(), stops.tolist())]
+
+
+class VarMetadata(object):
+    """
+    The keyword arguments given to BoolVars, stored column-wise:
+    one list per keyword, indexed by var.id.  A var that wasn't given
+    a keyword has _missing in that column (or is past the column's end).
+    Shared values, like the same piece object for many vars, cost only
+    a list slot per var.
+    """
+    _missing = object()
+
+    def __init__(self):
+        self.columns = {}
+        self.names = []  # Column names in the order they first appeared.
+
+    def add(self, id, kwargs):
+        for name, value in kwargs.iteritems():
+            self.set(id, name, value)
+
+    def add_columns(self, first_id, n, columns):
+        """ Set values for vars first_id...first_id + n - 1 at once. """
+        for name, values in columns.iteritems():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = []
+                self.names.append(name)
+            if len(column) < first_id:
+                column.extend([VarMetadata._missing] * (first_id - len(column)))
+            column[first_id : first_id + n] = values
+
+    def set(self, id, name, value):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = []
+            self.names.append(name)
+        if len(column) <= id:
+            column.extend([VarMetadata._missing] * (id + 1 - len(column)))
+        column[id] = value
+
+    def get(self, id, name):
+        """ Raise KeyError if var #id has no value under name. """
+        column = self.columns[name]
+        if id < len(column) and column[id] is not VarMetadata._missing:
+            return column[id]
+
+        raise KeyError(name)
+
+    def items(self, id):
+        """ Return a list of (name, value) pairs for var #id. """
+        result = []
+        for name in self.names:
+            try:
+                result.append( (name, self.get(id, name)) )
+            except KeyError:
+                pass
+        return result
+
+
 class BoolVar(object):
     """
     A True/False/Maybe variable or slot, constrained by constraints.
+    Keyword arguments become read-only attributes, but are kept in
+    state.metadata rather than in the var, to keep vars small.
     """
+    __slots__ = ("state", "id", "value", "constraints")
+
     def __init__(self, state, **kwargs):
         self.state = state
-        self.__kws = kws = kwargs.keys()
-        for kw in kws:
-            self.__dict__[kw] = kwargs[kw]
+        self.id = len(state.vars)
         self.value = Maybe
-        state.vars.add(self)
+        # A tuple, since most vars have only a few constraints and the
+        # empty tuple is shared.
+        self.constraints = ()
+        state.vars.append(self)
         state.maybe_vars.add(self)
-        self.constraints = set()
+        if kwargs:
+            state.metadata.add(self.id, kwargs)
+
+    def __getattr__(self, name):
+        """ Only called for names that aren't slots: look in metadata. """
+        if name in BoolVar.__slots__:
+            # Not initialized yet; don't go looking in self.state.
+            raise AttributeError(name)
+
+        try:
+            return self.state.metadata.get(self.id, name)
+        except KeyError:
+            raise AttributeError("%r has no attribute %r" % (self, name))
 
     def __repr__(self):
-        kw_args = [(kw, self.__dict__[kw]) for kw in self.__kws]
+        kw_args = self.state.metadata.items(self.id)
         return "BoolVar(" + ", ".join("%s=%r" % ka for ka in kw_args) + ")"
 
     def be_constrained_by(self, constraint):
@@ -156,7 +841,7 @@ class BoolVar(object):
         assert constraint not in self.constraints, \
                "Adding a constraint to a var twice."
         
-        self.constraints.add(constraint)
+        self.constraints += (constraint,)
 
     def set(self, value):
         """ Push, then set.  Return False if a contradiction results. """
@@ -170,6 +855,10 @@ class BoolVar(object):
         """
         prev_value = self.value
         self.value = value
+        keys = self.state.hash_keys
+        if keys is not None:
+            self.state.hash ^= keys[self.id][hash_index(prev_value)] \
+                             ^ keys[self.id][hash_index(value)]
         if value == Maybe:
             self.state.maybe_vars.add(self)
         else:
@@ -181,6 +870,14 @@ class BoolVar(object):
             constraint.notice_change(self, prev_value, value)
         return self.state.consistent()
 
+    def guess_value(self, default_guess=False):
+        """ A guess for State.branch(). """
+        return default_guess
+
+    def opposite(self, value):
+        """ The other value, when value is wrong. """
+        return not value
+
     def __nonzero__(self):
         """ bool(self) does this.  If value==Maybe, TypeError is raised. """
         return bool(self.value)
@@ -188,6 +885,12 @@ class BoolVar(object):
 
 class BoolConstraint(object):
     """ An object that manages a constraint over some vars. """
+    # See State.enable_hashing().
+    hash_by = "count"
+    hash_base = None
+    # (min_True, max_True) while relax()ed.
+    relaxed = None
+
     def __init__(self, state, *vars, **kwargs ):
         self.min_True = 0
         self.max_True = None
@@ -223,8 +926,17 @@ class BoolConstraint(object):
     def notice_change(self, var, prev_value, new_value):
         self[prev_value].discard(var)
         self[new_value].add(var)
+        if self.hash_base is not None \
+                and (prev_value == True) != (new_value == True):
+            n_True = len(self[True])
+            self.state.hash ^= self.count_key(n_True) \
+                ^ self.count_key(n_True + (1 if prev_value == True else -1))
         return self.check()
 
+    def count_key(self, n_True):
+        """ My part of State.hash when n_True of my vars are True. """
+        return mix64(self.hash_base + n_True)
+
     def check(self):
         """
         Become "eager" if there are Maybes whose values can be inferred.
@@ -287,6 +999,34 @@ class BoolConstraint(object):
 
         return self.check()
 
+    def relax(self):
+        """
+        Stop constraining--any number of my vars can be True--until
+        unrelax().  unsat_core() (see core.py) uses this to try the
+        problem without me.  Return False if a contradiction remains.
+        """
+        if self.relaxed is None:
+            self.relaxed = (self.min_True, self.max_True)
+            self.min_True, self.max_True = 0, len(self.vars)
+        return self.check()
+
+    def unrelax(self):
+        """ Constrain again after relax(). """
+        if self.relaxed is not None:
+            self.min_True, self.max_True = self.relaxed
+            self.relaxed = None
+        return self.check()
+
+    @property
+    def reason(self):
+        """ Why I'm conflicted, or None if I'm not. """
+        if self not in self.state.conflicted_constraints:
+            return None
+
+        return "%r has %d True, %d Maybe; needs %s to %s True" \
+               % (self, len(self[True]), len(self[Maybe]),
+                  self.min_True, self.max_True)
+
     def Maybes_must_be_True(self):
         return self[Maybe] \
            and len(self[True]) + len(self[Maybe]) == self.min_True
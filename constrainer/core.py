@@ -0,0 +1,96 @@
+"""
+constrainer/core.py -- Unsatisfiable cores: when a problem has no
+solutions, find a small set of its constraints that has none by itself.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    core = state.unsat_core(constraints)
+    if core is not None:
+        print "No solutions, because of:", core
+
+A search that finds no solutions only says "no."  unsat_core() first
+does that search, noting which constraints were conflicted at each dead
+end.  Then it shrinks the set, in the same State: it relax()es a
+constraint (so it stops constraining; its bookkeeping keeps up) and
+searches again.  If there are still no solutions, the constraint isn't
+needed and stays relaxed; otherwise it's unrelax()ed and kept.  The
+constraints that never showed up in a conflict are tried all at once
+first, then the rest one at a time, least conflicted first.  The result
+is minimal: relaxing any one constraint in it allows a solution.
+
+Each try is a search, so a try can be given a budget of leaves; a try
+that runs out keeps its constraint, and the core is only small, not
+minimal.
+
+Only constraints with relax() (BoolConstraints and the logic.py
+constraints) can be in the set.  Constraints not in the set always
+constrain.  A Propagator that assumes the relaxed constraints, such as
+soma's DeadRegionPropagator, which assumes every bloxel gets covered,
+would prove things that aren't so; leave it out of the model.
+"""
+
+
+def _try(state, max_leaves, conflicts):
+    """
+    Search for a solution.  Return True if one is found, False if
+    there's none, or None if max_leaves leaves go by first.  Count the
+    conflicted constraints at the dead ends in conflicts, if given.
+    """
+    result = False
+    n_leaves = 0
+    leaves = state.generate_leaves()
+    for is_solution in leaves:
+        if is_solution:
+            result = True
+            break
+
+        if conflicts is not None:
+            for constraint in state.conflicted_constraints:
+                conflicts[constraint] = conflicts.get(constraint, 0) + 1
+        n_leaves += 1
+        if max_leaves is not None and n_leaves >= max_leaves:
+            result = None
+            break
+    leaves.close()
+    state.reset()
+    return result
+
+
+def unsat_core(state, constraints=None, max_leaves=None, verbose=False):
+    """ See State.unsat_core(). """
+    if constraints is None:
+        constraints = [constraint for constraint in state.constraints
+                       if hasattr(constraint, "relax")]
+    conflicts = {}
+    if _try(state, max_leaves, conflicts) is not False:
+        return None
+
+    core = list(constraints)
+    idle = [constraint for constraint in core if constraint not in conflicts]
+    if idle:
+        for constraint in idle:
+            constraint.relax()
+        if _try(state, max_leaves, None) is False:
+            core = [constraint for constraint in core
+                    if constraint in conflicts]
+            if verbose: print len(idle), "never conflicted, dropped."
+        else:
+            for constraint in idle:
+                constraint.unrelax()
+
+    for constraint in sorted(core, key=lambda constraint:
+                                       conflicts.get(constraint, 0)):
+        constraint.relax()
+        if _try(state, max_leaves, None) is False:
+            core.remove(constraint)
+            if verbose: print "Dropped", constraint
+        else:
+            constraint.unrelax()
+            if verbose: print "Kept", constraint
+
+    for constraint in constraints:
+        if constraint not in core:
+            constraint.unrelax()
+    return core
@@ -0,0 +1,495 @@
+"""
+constrainer/formats.py -- Reading and writing problems as DIMACS CNF and
+OPB (pseudo-Boolean) files.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    state, vars = read_dimacs("problem.cnf")
+    state, vars, objective = read_opb("problem.opb")
+    write_dimacs(state, "copy.cnf")
+    write_opb(state, "copy.opb")
+
+In vars, vars[i] is the file's variable i + 1.  Readers go through the
+file a line at a time and make each constraint as soon as it's read, so
+a big file is never all in memory at once as Python objects.
+
+A negative literal (-3 in DIMACS, ~x3 in OPB) becomes a "negation" var,
+made the first time it's needed, with a BoolConstraint saying exactly one
+of x3 and its negation is True.  So a clause is a BoolConstraint with
+min_True=1 over its literals' vars.
+
+The writers handle BoolConstraints and the constraints in logic.py, plus
+any var that is already True or False.  In OPB, a BoolConstraint is one
+or two cardinality lines.  In CNF, min_True=1 is one clause, and other
+bounds use the sequential counter encoding (Sinz 2005), which takes
+about n * k extra variables and clauses, instead of the C(n, k + 1)
+clauses of the plain encoding.  The logic constraints become their
+Tseitin clauses (a chain of helper variables for Xor).  Constraints
+that say they're redundant (hash_by = None) are skipped.  Others, such
+as custom Propagators, can't be written.
+"""
+
+import os
+import shutil
+import tempfile
+
+from constrainer import *
+from logic import Implies, And, Or, Xor
+
+# Bigger OPB coefficients than this are not handled.  A coefficient of a
+# is done with a copies of the literal, so this keeps models from blowing up.
+MAX_COEFFICIENT = 16
+
+
+class Literals(object):
+    """
+    Turns file literals (nonzero ints, negative meaning "not") into vars,
+    making negation vars as needed.
+    """
+    def __init__(self, state, n_vars):
+        self.state = state
+        self.vars = state.new_vars(n_vars, number=range(1, n_vars + 1))
+        self.negations = {}
+
+    def var(self, literal):
+        number = abs(literal)
+        while number > len(self.vars):
+            # More variables than the header said.
+            self.vars.append(BoolVar(self.state, number=len(self.vars) + 1))
+        var = self.vars[number - 1]
+        if literal > 0:
+            return var
+
+        if var not in self.negations:
+            negation = BoolVar(self.state, negation_of=var)
+            BoolConstraint(self.state, var, negation, min_True=1, max_True=1)
+            self.negations[var] = negation
+        return self.negations[var]
+
+    def clause(self, literals, **kwargs):
+        """
+        Make a BoolConstraint saying at least one of literals (a list of
+        ints) is True, or return None if one literal is the negation of
+        another, so the clause is always satisfied.
+        """
+        literals = set(literals)
+        if any(-literal in literals for literal in literals):
+            return None
+
+        vars = [self.var(literal) for literal in literals]
+        return BoolConstraint(self.state, *vars, min_True=1,
+                              max_True=len(vars), **kwargs)
+
+    def count(self, literals, min_True, max_True, **kwargs):
+        """
+        Make a BoolConstraint on how many of literals are True.  A literal
+        that appears more than once counts each time, by way of copy vars.
+        """
+        vars = []
+        seen = set()
+        for literal in literals:
+            var = self.var(literal)
+            if var in seen:
+                copy = BoolVar(self.state, copy_of=var)
+                BoolConstraint(self.state, self.var(-literal), copy,
+                               min_True=1, max_True=1)
+                var = copy
+            seen.add(var)
+            vars.append(var)
+        return BoolConstraint(self.state, *vars, min_True=max(min_True, 0),
+                              max_True=min(max_True, len(vars)), **kwargs)
+
+
+def _open(source, mode="r"):
+    """ Return (stream, whether I opened it). """
+    if isinstance(source, basestring):
+        return open(source, mode), True
+
+    return source, False
+
+
+def read_dimacs(source, state=None, verbose=False):
+    """
+    Read a DIMACS CNF file (a filename or an open file) into state (or a
+    new State).  Return (state, vars).
+    """
+    if state is None:
+        state = State(verbose=verbose)
+    stream, opened = _open(source)
+    literals = None
+    clause = []
+    n_clauses = 0
+    try:
+        for line in stream:
+            line = line.strip()
+            if line.startswith("%"):
+                # The SATLIB benchmark files end with "%" and "0" lines.
+                break
+
+            if not line or line[0] == "c":
+                continue
+
+            if line[0] == "p":
+                words = line.split()
+                assert words[1] == "cnf", "Not a CNF file: %r" % line
+                literals = Literals(state, int(words[2]))
+                continue
+
+            if literals is None:
+                literals = Literals(state, 0)
+            for word in line.split():
+                literal = int(word)
+                if literal:
+                    clause.append(literal)
+                    continue
+
+                n_clauses += 1
+                literals.clause(clause, clause=n_clauses)
+                clause = []
+    finally:
+        if opened:
+            stream.close()
+    assert not clause, "The last clause doesn't end with 0."
+    if literals is None:
+        literals = Literals(state, 0)
+    return state, literals.vars
+
+
+def _parse_opb_terms(words):
+    """
+    Turn OPB words like "+2", "x3", "-1", "~x4" into a list of
+    (coefficient, literal) with positive coefficients, and the amount
+    that has to be added to the other side of the relation to make up
+    for flipping negative coefficients.
+    """
+    terms = []
+    shift = 0
+    coefficient = None
+    for word in words:
+        if word[0] in "+-" or word[0].isdigit():
+            coefficient = int(word)
+            continue
+
+        if word[0] == "~":
+            literal = -int(word[2:])
+        else:
+            assert word[0] == "x", "Unknown OPB term %r" % word
+            literal = int(word[1:])
+        if coefficient is None:
+            coefficient = 1
+        if coefficient < 0:
+            # -a*x == a*(not x) - a
+            coefficient, literal = -coefficient, -literal
+            shift += coefficient
+        terms.append( (coefficient, literal) )
+        coefficient = None
+    return terms, shift
+
+
+def read_opb(source, state=None, verbose=False):
+    """
+    Read an OPB file (a filename or an open file) of linear pseudo-
+    Boolean constraints into state (or a new State).  Return (state,
+    vars, objective), objective being a list of (coefficient, var) from
+    the "min:" line, or None.
+
+    Constraints with all coefficients equal are cardinality constraints,
+    which is what a BoolConstraint is.  Other coefficients (up to
+    MAX_COEFFICIENT) are done by counting copies of the var.
+    """
+    if state is None:
+        state = State(verbose=verbose)
+    stream, opened = _open(source)
+    literals = None
+    objective = None
+    statement = []
+    n_constraints = 0
+    try:
+        for line in stream:
+            line = line.strip()
+            if line.startswith("*"):
+                if literals is None and "#variable=" in line:
+                    words = line.split()
+                    n_vars = int(words[words.index("#variable=") + 1])
+                    literals = Literals(state, n_vars)
+                continue
+
+            statement += line.split()
+            if not statement or statement[-1][-1] != ";":
+                continue
+
+            if literals is None:
+                literals = Literals(state, 0)
+            statement[-1] = statement[-1][:-1]
+            if not statement[-1]:
+                statement.pop()
+            if statement[0] == "min:":
+                terms, shift = _parse_opb_terms(statement[1:])
+                objective = [(coefficient, literals.var(literal))
+                             for coefficient, literal in terms]
+            else:
+                n_constraints += 1
+                _read_opb_constraint(literals, statement, n_constraints)
+            statement = []
+    finally:
+        if opened:
+            stream.close()
+    assert not statement, "The last OPB statement doesn't end with ;"
+    if literals is None:
+        literals = Literals(state, 0)
+    return state, literals.vars, objective
+
+
+def _read_opb_constraint(literals, words, number):
+    for i, word in enumerate(words):
+        if word in (">=", "<=", "="):
+            relation = word
+            terms, shift = _parse_opb_terms(words[:i])
+            bound = int(words[i + 1]) + shift
+            break
+    else:
+        raise Exception("OPB constraint #%d has no >=, <= or =." % number)
+
+    coefficients = set(coefficient for coefficient, literal in terms)
+    if len(coefficients) == 1:
+        # Divide through by the common coefficient.
+        a = coefficients.pop()
+        if a == 0:
+            # The sum is 0 whatever the vars are.
+            met = {">=": 0 >= bound, "<=": 0 <= bound, "=": 0 == bound}
+            terms = []
+            low, high = (0, 0) if met[relation] else (1, 0)
+            relation = "="
+        else:
+            terms = [(1, literal) for coefficient, literal in terms]
+            low = -(-bound // a)  # Round up for >=
+            high = bound // a     # ...and down for <=.
+        if relation == "=" and low != high:
+            low, high = 1, 0  # Can't be met.
+        bound = None
+    for coefficient, literal in terms:
+        if coefficient > MAX_COEFFICIENT:
+            raise Exception("OPB constraint #%d has coefficient %d, over "
+                            "MAX_COEFFICIENT." % (number, coefficient))
+
+    expanded = [literal for coefficient, literal in terms
+                for i in range(coefficient)]
+    if bound is not None:
+        low = high = bound
+    min_True = low if relation in (">=", "=") else 0
+    max_True = high if relation in ("<=", "=") else len(expanded)
+    literals.count(expanded, min_True, max_True, opb=number)
+
+
+def _write_through_temp(target, write_body, write_header):
+    """
+    Write the body to a temporary file first, since the header needs
+    counts that are only known afterwards.
+    """
+    stream, opened = _open(target, "w")
+    body = tempfile.TemporaryFile()
+    try:
+        counts = write_body(body)
+        write_header(stream, *counts)
+        body.seek(0)
+        shutil.copyfileobj(body, stream)
+    finally:
+        body.close()
+        if opened:
+            stream.close()
+
+
+def _exported_constraints(state):
+    """ Yield the constraints to write, checking they can be written. """
+    if state.int_vars:
+        raise Exception("Can't write IntVars to a file.")
+
+    for constraint in state.constraints:
+        if isinstance(constraint, (BoolConstraint, Implies, And, Or, Xor)):
+            yield constraint
+        elif getattr(constraint, "hash_by", "values") is not None:
+            raise Exception("Can't write %r to a file." % constraint)
+
+
+def _literal(var, value=True):
+    return var.id + 1 if value else -(var.id + 1)
+
+
+class _Numbers(object):
+    """ Hands out helper variable numbers after the state's vars. """
+    def __init__(self, state):
+        self.last = len(state.vars)
+
+    def new(self):
+        self.last += 1
+        return self.last
+
+
+def _at_most(literals, k, numbers):
+    """
+    Yield the clauses of the sequential counter encoding of "at most k of
+    literals are true."  s[i][j] is a helper meaning "at least j + 1 of
+    the first i + 1 literals are true."
+    """
+    n = len(literals)
+    if k >= n:
+        return
+
+    if k == 0:
+        for x in literals:
+            yield [-x]
+        return
+
+    s = [[numbers.new() for j in range(k)] for i in range(n - 1)]
+    yield [-literals[0], s[0][0]]
+    for j in range(1, k):
+        yield [-s[0][j]]
+    for i in range(1, n - 1):
+        x = literals[i]
+        yield [-x, s[i][0]]
+        yield [-s[i - 1][0], s[i][0]]
+        for j in range(1, k):
+            yield [-x, -s[i - 1][j - 1], s[i][j]]
+            yield [-s[i - 1][j], s[i][j]]
+        yield [-x, -s[i - 1][k - 1]]
+    yield [-literals[n - 1], -s[n - 2][k - 1]]
+
+
+def _logic_clauses(constraint, numbers):
+    """ Yield the Tseitin clauses of a logic.py constraint. """
+    if isinstance(constraint, Implies):
+        yield [-_literal(constraint.a), _literal(constraint.b)]
+    elif isinstance(constraint, (And, Or)):
+        # For Or, swap the roles of True and False: out = or(inputs) is
+        # not-out = and(not-inputs).
+        sign = 1 if isinstance(constraint, And) else -1
+        out = sign * _literal(constraint.out)
+        inputs = [sign * _literal(var) for var in constraint.inputs]
+        for x in inputs:
+            yield [-out, x]
+        yield [out] + [-x for x in inputs]
+    else:
+        # Xor: a chain of helpers, each the parity so far.
+        xs = [_literal(var) for var in constraint.vars]
+        if not xs:
+            # The parity of nothing is even.
+            if constraint.parity:
+                yield []
+            return
+
+        parity = xs[0]
+        for x in xs[1:]:
+            y = numbers.new()
+            # y = parity xor x
+            yield [-y, parity, x]
+            yield [-y, -parity, -x]
+            yield [y, -parity, x]
+            yield [y, parity, -x]
+            parity = y
+        yield [parity if constraint.parity else -parity]
+
+
+def _clauses(state, numbers):
+    """ Yield the CNF clauses of state, as lists of int literals. """
+    for var in state.vars:
+        if var.value != Maybe:
+            yield [_literal(var, var.value)]
+    for constraint in _exported_constraints(state):
+        if not isinstance(constraint, BoolConstraint):
+            for clause in _logic_clauses(constraint, numbers):
+                yield clause
+            continue
+
+        xs = sorted(_literal(var) for var in constraint.vars)
+        n = len(xs)
+        if constraint.min_True > n:
+            yield []
+            continue
+
+        if constraint.min_True == 1:
+            yield xs
+        elif constraint.min_True > 1:
+            # At least k are true == at most n - k are false.
+            for clause in _at_most([-x for x in xs], n - constraint.min_True,
+                                   numbers):
+                yield clause
+        if constraint.max_True is not None:
+            for clause in _at_most(xs, constraint.max_True, numbers):
+                yield clause
+
+
+def write_dimacs(state, target):
+    """ Write state as a DIMACS CNF file (a filename or an open file). """
+    numbers = _Numbers(state)
+
+    def write_body(body):
+        n_clauses = 0
+        for clause in _clauses(state, numbers):
+            body.write(" ".join(str(x) for x in clause) + " 0\n")
+            n_clauses += 1
+        return numbers.last, n_clauses
+
+    def write_header(stream, n_vars, n_clauses):
+        stream.write("c written by constrainer\n")
+        stream.write("p cnf %d %d\n" % (n_vars, n_clauses))
+
+    _write_through_temp(target, write_body, write_header)
+
+
+def _opb_term(literal, coefficient=1):
+    x = "x%d" % abs(literal) if literal > 0 else "~x%d" % abs(literal)
+    return "%+d %s" % (coefficient, x)
+
+
+def write_opb(state, target, objective=None):
+    """
+    Write state as an OPB file (a filename or an open file).
+    objective, if given, is a list of (coefficient, var) to minimize.
+    """
+    numbers = _Numbers(state)
+
+    def write_body(body):
+        n_constraints = 0
+        if objective:
+            body.write("min: " + " ".join(_opb_term(_literal(var), coefficient)
+                                          for coefficient, var in objective)
+                       + " ;\n")
+        for var in state.vars:
+            if var.value != Maybe:
+                body.write("%s >= 1 ;\n" % _opb_term(_literal(var, var.value)))
+                n_constraints += 1
+        for constraint in _exported_constraints(state):
+            if not isinstance(constraint, BoolConstraint):
+                for clause in _logic_clauses(constraint, numbers):
+                    body.write(" ".join(_opb_term(x) for x in clause)
+                               + " >= 1 ;\n")
+                    n_constraints += 1
+                continue
+
+            terms = " ".join(_opb_term(_literal(var))
+                             for var in sorted(constraint.vars,
+                                               key=lambda var: var.id))
+            n = len(constraint.vars)
+            low = constraint.min_True
+            high = n if constraint.max_True is None else constraint.max_True
+            if low == high:
+                body.write("%s = %d ;\n" % (terms, low))
+                n_constraints += 1
+                continue
+
+            if low > 0:
+                body.write("%s >= %d ;\n" % (terms, low))
+                n_constraints += 1
+            if high < n:
+                body.write("%s >= %d ;\n" % (terms.replace("+1", "-1"), -high))
+                n_constraints += 1
+        return numbers.last, n_constraints
+
+    def write_header(stream, n_vars, n_constraints):
+        stream.write("* #variable= %d #constraint= %d\n"
+                     % (n_vars, n_constraints))
+        stream.write("* written by constrainer\n")
+
+    _write_through_temp(target, write_body, write_header)
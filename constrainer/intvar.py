@@ -0,0 +1,212 @@
+"""
+constrainer/intvar.py -- Finite-domain variables, with bitset domains.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+The usual way to choose one of several values is a BoolVar per value
+and a BoolConstraint that exactly one of them is True (see "Small
+Numbers, Sets, Enums" in the README).  An IntVar is the whole choice in
+one object: its domain is an int with bit i set while values[i] is
+still possible.
+
+    die = IntVar(state, ["a", "b", "e", "unused"], die=die)
+
+BoolConstraints count an IntVar through Among views: die.among(["e"])
+is True once the die can only be "e", False once it can't be, and Maybe
+in between, and BoolConstraints treat it like a BoolVar:
+
+    BoolConstraint(state, *[die.among(["e"]) for die in dice],
+                   min_True=3, max_True=3, letter="e")
+
+When a BoolConstraint sets an Among True or False, that takes the other
+values (or its own) out of the IntVar's domain, which updates the
+IntVar's other Amongs, which tell their constraints--the same accounting
+a BoolVar does, but only for the Amongs whose values changed.
+
+Changes go on the log_stack as (intvar, previous domain), so the search
+undoes them like BoolVar changes.  An IntVar is in state.maybe_vars
+while it has more than one value left, so State.generate_leaves() guesses
+about it, by splitting its domain in half (see guess_value()), and
+State.guess() picks the IntVar with the fewest values left.  An empty
+domain is a conflict.
+
+IntVars work with State's searches.  Model, BitSearchState and the file
+writers only know BoolVars.
+"""
+
+from maybies import *
+
+
+def _bits(x):
+    """ Yield the positions of x's 1 bits, lowest first. """
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+class IntVar(object):
+    """
+    A var whose value is one of values, or Maybe while more than one is
+    possible.  Keyword arguments become attributes, as for constraints.
+    """
+    def __init__(self, state, values, **kwargs):
+        self.label = dict(kwargs)
+        self.__dict__.update(kwargs)
+
+        self.state = state
+        self.values = list(values)
+        self.index = dict((value, i) for i, value in enumerate(self.values))
+        assert len(self.index) == len(self.values), "Repeated values."
+        self.domain = (1 << len(self.values)) - 1
+        # Numbered apart from the BoolVars; see State.int_vars.
+        self.id = len(state.int_vars)
+        state.int_vars.append(self)
+        self.amongs = []
+        # A random 64-bit key per value, for State.hash; see domain_key().
+        self.hash_keys = None
+        self.reason = None
+        if self.value == Maybe:
+            state.maybe_vars.add(self)
+
+    def __repr__(self):
+        return "IntVar(" + str(self.label) + ")"
+
+    @property
+    def value(self):
+        """ The one value left in the domain, or Maybe. """
+        domain = self.domain
+        if domain and not domain & (domain - 1):
+            return self.values[domain.bit_length() - 1]
+
+        return Maybe
+
+    def size(self):
+        """ The number of values left in the domain. """
+        return bin(self.domain).count("1")
+
+    def possible(self):
+        """ The list of values still in the domain. """
+        return [self.values[i] for i in _bits(self.domain)]
+
+    def mask(self, values):
+        """ The domain bits of values. """
+        mask = 0
+        for value in values:
+            mask |= 1 << self.index[value]
+        return mask
+
+    def among(self, values):
+        """ Return an Among: a BoolVar-like view of "my value is in values". """
+        return Among(self, self.mask(values))
+
+    def set(self, domain):
+        """ Push, then set.  Return False if a contradiction results. """
+        self.state.log_stack[-1].append( (self, self.domain) )
+        return self.raw_set(domain)
+
+    def raw_set(self, domain):
+        """
+        Set without push, and update my Amongs.  Used after both push
+        and pop.  Return False if a contradiction results.
+        """
+        state = self.state
+        if state.hash_keys is not None:
+            state.hash ^= self.domain_key(self.domain ^ domain)
+        self.domain = domain
+        if self.value == Maybe:
+            state.maybe_vars.add(self)
+        else:
+            state.maybe_vars.discard(self)
+        if not domain:
+            self.reason = "%r has no values left" % self
+            state.conflicted_constraints.add(self)
+        elif self.reason is not None:
+            self.reason = None
+            state.conflicted_constraints.discard(self)
+        for among in self.amongs:
+            among.update(domain)
+        return state.consistent()
+
+    def domain_key(self, domain):
+        """
+        My part of State.hash with domain: the XOR of the keys of the
+        values in it.  (So the change from one domain to another is the
+        domain_key() of their XOR.)
+        """
+        key = 0
+        for i in _bits(domain):
+            key ^= self.hash_keys[i]
+        return key
+
+    def guess_value(self, default_guess=False):
+        """
+        A guess for State.branch(): the lower-numbered half of the
+        domain, or with default_guess the higher half.
+        """
+        bits = list(_bits(self.domain))
+        low = sum(1 << bit for bit in bits[:len(bits) // 2])
+        return self.domain & ~low if default_guess else low
+
+    def opposite(self, guess):
+        """ The rest of the domain, when guess (a domain) is wrong. """
+        return self.domain & ~guess
+
+
+class Among(object):
+    """
+    "intvar's value is one of the values in mask," as a True, False or
+    Maybe value that BoolConstraints can count.  Made by IntVar.among().
+    """
+    __slots__ = ("intvar", "mask", "value", "constraints")
+
+    def __init__(self, intvar, mask):
+        self.intvar = intvar
+        self.mask = mask
+        self.value = self.value_with(intvar.domain)
+        self.constraints = ()
+        intvar.amongs.append(self)
+
+    def __repr__(self):
+        return "Among(%r, %r)" % (self.intvar,
+            [self.intvar.values[i] for i in _bits(self.mask)])
+
+    def value_with(self, domain):
+        """ What my value is when intvar's domain is domain. """
+        if not domain & self.mask:
+            return False
+
+        if not domain & ~self.mask:
+            return True
+
+        return Maybe
+
+    def be_constrained_by(self, constraint):
+        """ Not meant to be called by the user. """
+        assert constraint not in self.constraints, \
+               "Adding a constraint to a var twice."
+
+        self.constraints += (constraint,)
+
+    def set(self, value):
+        """
+        Narrow intvar's domain to the values in (or, if value is False,
+        not in) my mask.  Return False if a contradiction results.
+        """
+        domain = self.intvar.domain
+        return self.intvar.set(domain & self.mask if value
+                               else domain & ~self.mask)
+
+    def update(self, domain):
+        """ Called by intvar.raw_set(): tell my constraints if I changed. """
+        prev_value = self.value
+        value = self.value_with(domain)
+        if value is not prev_value:
+            self.value = value
+            for constraint in self.constraints:
+                constraint.notice_change(self, prev_value, value)
+
+    def __nonzero__(self):
+        return bool(self.value)
@@ -0,0 +1,295 @@
+"""
+constrainer/logic.py -- Native Boolean-logic constraints.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Implies, And, Or and Xor do the same jobs as the BoolConstraint recipes
+under "Boolean Operations" in the README, but each is one constraint with
+no helper variables.  Instead of keeping sets of True, Maybe and False vars
+the way BoolConstraint does, they keep a couple of counters, updated in
+constant time by notice_change(), plus the sum of the positions of their
+Maybe inputs.  When only one input is still Maybe, that sum *is* its
+position, so even the "the last blank must be..." inferences don't have
+to scan the inputs.
+"""
+
+from maybies import *
+
+
+class LogicConstraint(object):
+    """
+    Common plumbing for the logic constraints.  Subclasses supply
+    is_conflicted(), is_eager() and inferences().
+    """
+    # True while relax()ed.
+    relaxed = False
+
+    def __init__(self, state, vars, **kwargs):
+        self.label = dict(kwargs)
+        self.__dict__.update(kwargs)
+
+        self.state = state
+        state.constraints.add(self)
+        self.vars = list(vars)
+        self.position = {}
+        for i, var in enumerate(self.vars):
+            assert var not in self.position, \
+                   "Adding %s to %s twice." % (var, self)
+            self.position[var] = i
+            var.be_constrained_by(self)
+
+    def __getitem__(self, value):
+        """
+        self[value], where value is in {True, Maybe, False},
+        is the set of my vars that are currently set to value.
+        Unlike BoolConstraint's, these sets are made fresh on each call.
+        """
+        return set(var for var in self.vars if var.value == value)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + str(self.label) + ")"
+
+    def check(self):
+        """
+        Become "eager" if there are Maybes whose values can be inferred,
+        and note whether I am conflicted, as BoolConstraint.check() does.
+        Return False if there's a contradiction noticed in *any* constraint.
+        """
+        conflicted = not self.relaxed and self.is_conflicted()
+        if not conflicted and not self.relaxed and self.is_eager():
+            self.state.eager_constraints.add(self)
+        else:
+            self.state.eager_constraints.discard(self)
+        if conflicted != (self in self.state.conflicted_constraints):
+            if conflicted:
+                if self.state.verbose: print self, "is conflicted."
+                self.state.conflicted_constraints.add(self)
+            else:
+                if self.state.verbose: print self, "is not conflicted."
+                self.state.conflicted_constraints.discard(self)
+        return self.state.consistent()
+
+    def relax(self):
+        """
+        Stop constraining until unrelax(), as BoolConstraint.relax() does.
+        The counters keep up in the meantime.
+        """
+        self.relaxed = True
+        return self.check()
+
+    def unrelax(self):
+        """ Constrain again after relax(). """
+        self.relaxed = False
+        return self.check()
+
+    def propagate(self):
+        """
+        Set the vars whose values follow from my rule.
+        Return False if a contradiction is found in self or elsewhere.
+        (See BoolConstraint.propagate() for the ground rules.)
+        """
+        if not self.check():
+            return False
+
+        if self.relaxed:
+            return True
+
+        for var, value in list(self.inferences()):
+            if var.value != Maybe:
+                # An earlier inference in this loop already took care of it.
+                continue
+
+            if self.state.verbose:
+                print "    infer", str(var), value
+            if not var.set(value):
+                return False
+
+        return self.check()
+
+
+class Implies(LogicConstraint):
+    """
+    A implies B: A can't be True while B is False.
+        Implies(state, A, B)
+    is the same relation as BoolConstraint(state, not(A), B, min_True=1,...)
+    but without needing a not(A) variable.
+    """
+    def __init__(self, state, a, b, **kwargs):
+        self.a = a
+        self.b = b
+        super(Implies, self).__init__(state, [a, b], **kwargs)
+
+    def notice_change(self, var, prev_value, new_value):
+        return self.check()
+
+    def is_conflicted(self):
+        return self.a.value == True and self.b.value == False
+
+    def is_eager(self):
+        return (self.a.value == True and self.b.value == Maybe) \
+            or (self.b.value == False and self.a.value == Maybe)
+
+    def inferences(self):
+        if self.a.value == True and self.b.value == Maybe:
+            yield self.b, True
+        elif self.b.value == False and self.a.value == Maybe:
+            yield self.a, False
+
+
+class Gate(LogicConstraint):
+    """
+    An output var tied to a function of some input vars.
+    Keeps counts of True and False inputs, and the sum of the positions
+    (in self.inputs) of the Maybe inputs.
+    """
+    def __init__(self, state, out, *inputs, **kwargs):
+        assert out not in inputs, "A gate's output can't be its own input."
+        self.out = out
+        self.inputs = inputs
+        self.n_True = sum(1 for var in inputs if var.value == True)
+        self.n_False = sum(1 for var in inputs if var.value == False)
+        self.maybe_position_sum = sum(i for i, var in enumerate(inputs)
+                                      if var.value == Maybe)
+        super(Gate, self).__init__(state, (out,) + inputs, **kwargs)
+
+    def n_Maybe(self):
+        return len(self.inputs) - self.n_True - self.n_False
+
+    def lone_Maybe(self):
+        """ Return the one Maybe input.  Only call when n_Maybe() == 1. """
+        return self.inputs[self.maybe_position_sum]
+
+    def notice_change(self, var, prev_value, new_value):
+        if var is not self.out:
+            # Input positions are offset by one because out is vars[0].
+            i = self.position[var] - 1
+            if prev_value == True:
+                self.n_True -= 1
+            elif prev_value == False:
+                self.n_False -= 1
+            else:
+                self.maybe_position_sum -= i
+            if new_value == True:
+                self.n_True += 1
+            elif new_value == False:
+                self.n_False += 1
+            else:
+                self.maybe_position_sum += i
+        return self.check()
+
+
+class And(Gate):
+    """
+    out = A and B and ...
+        And(state, out, A, B, ...)
+    If out is True, all inputs are True.  If out is False, at least one
+    input is False.
+    """
+    def is_conflicted(self):
+        out = self.out.value
+        return (out == True and self.n_False > 0) \
+            or (out == False and self.n_True == len(self.inputs))
+
+    def is_eager(self):
+        out = self.out.value
+        if out == Maybe:
+            return self.n_False > 0 or self.n_True == len(self.inputs)
+        elif out == True:
+            return self.n_Maybe() > 0
+        else:
+            return self.n_Maybe() == 1 and self.n_False == 0
+
+    def inferences(self):
+        out = self.out.value
+        if out == Maybe:
+            if self.n_False > 0:
+                yield self.out, False
+            elif self.n_True == len(self.inputs):
+                yield self.out, True
+        elif out == True:
+            for var in self.inputs:
+                if var.value == Maybe:
+                    yield var, True
+        elif self.n_Maybe() == 1 and self.n_False == 0:
+            yield self.lone_Maybe(), False
+
+
+class Or(Gate):
+    """
+    out = A or B or ...
+        Or(state, out, A, B, ...)
+    If out is False, all inputs are False.  If out is True, at least one
+    input is True.
+    """
+    def is_conflicted(self):
+        out = self.out.value
+        return (out == False and self.n_True > 0) \
+            or (out == True and self.n_False == len(self.inputs))
+
+    def is_eager(self):
+        out = self.out.value
+        if out == Maybe:
+            return self.n_True > 0 or self.n_False == len(self.inputs)
+        elif out == False:
+            return self.n_Maybe() > 0
+        else:
+            return self.n_Maybe() == 1 and self.n_True == 0
+
+    def inferences(self):
+        out = self.out.value
+        if out == Maybe:
+            if self.n_True > 0:
+                yield self.out, True
+            elif self.n_False == len(self.inputs):
+                yield self.out, False
+        elif out == False:
+            for var in self.inputs:
+                if var.value == Maybe:
+                    yield var, False
+        elif self.n_Maybe() == 1 and self.n_True == 0:
+            yield self.lone_Maybe(), True
+
+
+class Xor(LogicConstraint):
+    """
+    The parity of a set of vars:
+        Xor(state, A, B, C, ...)
+    means an odd number of A, B, C... are True.
+        Xor(state, A, B, C, ..., parity=False)
+    means an even number are True.  So Xor(state, A, B) is "A = not(B)"
+    and Xor(state, A, B, parity=False) is "A = B".
+    """
+    def __init__(self, state, *vars, **kwargs):
+        self.parity = bool(kwargs.pop("parity", True))
+        self.n_True = sum(1 for var in vars if var.value == True)
+        self.n_Maybe = sum(1 for var in vars if var.value == Maybe)
+        self.maybe_position_sum = sum(i for i, var in enumerate(vars)
+                                      if var.value == Maybe)
+        super(Xor, self).__init__(state, vars, **kwargs)
+
+    def notice_change(self, var, prev_value, new_value):
+        i = self.position[var]
+        if prev_value == True:
+            self.n_True -= 1
+        elif prev_value == Maybe:
+            self.n_Maybe -= 1
+            self.maybe_position_sum -= i
+        if new_value == True:
+            self.n_True += 1
+        elif new_value == Maybe:
+            self.n_Maybe += 1
+            self.maybe_position_sum += i
+        return self.check()
+
+    def is_conflicted(self):
+        return self.n_Maybe == 0 and (self.n_True % 2 == 1) != self.parity
+
+    def is_eager(self):
+        return self.n_Maybe == 1
+
+    def inferences(self):
+        if self.n_Maybe == 1:
+            yield self.vars[self.maybe_position_sum], \
+                  (self.n_True % 2 == 1) != self.parity
@@ -0,0 +1,200 @@
+"""
+constrainer/memory.py -- Where a model's memory goes.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    print state.memory_report()
+    for is_solution in watch_trail(state, state.generate_leaves()):
+        ...
+    print state.memory_report()   # now with the trail's high-water mark
+
+The report breaks the bytes down by what they're for:
+
+    vars          the BoolVar objects, their tuples of constraints, and
+                  the State's lists and sets of them; IntVars, with
+                  their values and Amongs (see intvar.py)
+    constraints   the constraint objects and their attributes
+    membership    the sets (and lists and dicts) in constraints that say
+                  which vars they count, in which category
+    metadata      the keyword arguments given to vars (VarMetadata)
+    hashing       Zobrist keys, if State.enable_hashing() was called
+    trail         the log_stack right now
+    trail peak    the log_stack at its biggest, while watched
+
+Sizes come from sys.getsizeof() of each object, following lists, tuples,
+sets and dicts into what they hold, but not into other objects: a var is
+counted once under vars, not again in each constraint.  Shared values
+(the same label string in a thousand vars) are counted once.  So the
+numbers are what the model itself costs, not counting Python's
+allocator overhead, and the total will be somewhat less than the growth
+of the process.
+
+The trail only gets shorter by popping, so looking at it just before
+each pop finds its high-water mark exactly, including the pops between
+leaves in the discrepancy search modes.  Only the top level of the
+log_stack grows, so watch_trail() keeps the number of entries below it
+as levels are pushed, and each look takes the same time however long
+the trail is.
+"""
+
+from collections import OrderedDict
+import struct
+import sys
+
+from maybies import *
+
+POINTER_BYTES = struct.calcsize("P")
+_CONTAINERS = (list, tuple, set, frozenset, dict)
+_SCALARS = (int, long, float, complex, str, unicode, bool, type(None))
+
+
+def _size(x, seen, follow_objects=False):
+    """
+    The size of x and the containers and scalars it holds, skipping
+    anything whose id is in seen (and adding what's counted to seen).
+    Other objects are counted (by getsizeof) only if follow_objects.
+    """
+    if id(x) in seen:
+        return 0
+
+    if not isinstance(x, _CONTAINERS + _SCALARS):
+        if not follow_objects:
+            return 0
+
+        seen.add(id(x))
+        return sys.getsizeof(x)
+
+    seen.add(id(x))
+    total = sys.getsizeof(x)
+    if isinstance(x, dict):
+        for key, value in x.iteritems():
+            total += _size(key, seen, follow_objects)
+            total += _size(value, seen, follow_objects)
+    elif isinstance(x, _CONTAINERS):
+        for item in x:
+            total += _size(item, seen, follow_objects)
+    return total
+
+
+class MemoryReport(object):
+    """
+    Bytes by component, in components (an OrderedDict), plus the peak
+    depth and number of entries of the trail seen by watch_trail().
+    """
+    def __init__(self, components, peak_depth, peak_trail):
+        self.components = components
+        self.peak_depth = peak_depth
+        self.peak_trail = peak_trail
+
+    def total(self):
+        """ The bytes of everything but the trail peak. """
+        return sum(n_bytes for name, n_bytes in self.components.iteritems()
+                   if name != "trail peak")
+
+    def __str__(self):
+        lines = ["%-12s %12s" % ("component", "bytes")]
+        for name, n_bytes in self.components.iteritems():
+            lines.append("%-12s %12d" % (name, n_bytes))
+        lines.append("%-12s %12d" % ("total", self.total()))
+        if self.peak_depth:
+            lines.append("trail peak: depth %d, %d entries"
+                         % (self.peak_depth, self.peak_trail))
+        return "\n".join(lines)
+
+
+def trail_bytes(depth, n_entries):
+    """ About how many bytes a log_stack of depth lists and n_entries takes. """
+    return depth * sys.getsizeof([]) \
+           + n_entries * (sys.getsizeof( (None, None) ) + POINTER_BYTES)
+
+
+def memory_report(state):
+    """ Return a MemoryReport of state.  See State.memory_report(). """
+    components = OrderedDict()
+    seen = set([id(Maybe), id(True), id(False), id(None)])
+
+    n_bytes = sys.getsizeof(state.vars) + sys.getsizeof(state.maybe_vars)
+    for var in state.vars:
+        n_bytes += sys.getsizeof(var)
+        if var.constraints:
+            n_bytes += sys.getsizeof(var.constraints)
+    n_bytes += sys.getsizeof(state.int_vars)
+    for var in state.int_vars:
+        n_bytes += sys.getsizeof(var) + _size(var.__dict__, seen)
+        for among in var.amongs:
+            n_bytes += sys.getsizeof(among) + sys.getsizeof(among.constraints)
+    components["vars"] = n_bytes
+
+    objects = sys.getsizeof(state.constraints)
+    membership = 0
+    for constraint in state.constraints:
+        objects += sys.getsizeof(constraint)
+        attributes = getattr(constraint, "__dict__", {})
+        objects += sys.getsizeof(attributes)
+        for name, value in attributes.iteritems():
+            if isinstance(value, _CONTAINERS) and name != "label":
+                membership += _size(value, seen)
+            else:
+                objects += _size(value, seen)
+    components["constraints"] = objects
+    components["membership"] = membership
+
+    metadata = state.metadata
+    components["metadata"] = sys.getsizeof(metadata) \
+        + _size(metadata.names, seen) \
+        + _size(metadata.columns, seen, follow_objects=True)
+
+    components["hashing"] = _size(state.hash_keys, seen) \
+                            if state.hash_keys is not None else 0
+
+    components["trail"] = sys.getsizeof(state.log_stack) \
+        + sum(sys.getsizeof(frame) + len(frame) * sys.getsizeof( (None, None) )
+              for frame in state.log_stack)
+    components["trail peak"] = trail_bytes(state.peak_depth, state.peak_trail)
+    return MemoryReport(components, state.peak_depth, state.peak_trail)
+
+
+def watch_trail(state, leaves):
+    """
+    Pass through what leaves (a generator of leaves from state) yields,
+    keeping state.peak_depth and state.peak_trail (the most entries in
+    the log_stack) up to date.  While it runs, state.push and state.pop
+    are wrapped to do the looking.
+    """
+    # below[i]: the entries in the levels under log_stack[i].
+    below = [0]
+    for level in state.log_stack[:-1]:
+        below.append(below[-1] + len(level))
+
+    def look():
+        depth = len(state.log_stack)
+        if depth > state.peak_depth:
+            state.peak_depth = depth
+        if depth:
+            n_entries = below[depth - 1] + len(state.log_stack[-1])
+            if n_entries > state.peak_trail:
+                state.peak_trail = n_entries
+
+    push, pop = state.push, state.pop
+
+    def watched_push():
+        if state.log_stack:
+            below.append(below[-1] + len(state.log_stack[-1]))
+        push()
+
+    def watched_pop():
+        look()
+        if len(state.log_stack) > 1:
+            below.pop()
+        return pop()
+
+    state.push, state.pop = watched_push, watched_pop
+    try:
+        for leaf in leaves:
+            yield leaf
+    finally:
+        # If the search stopped early, it's never popped; look once more.
+        look()
+        del state.push, state.pop
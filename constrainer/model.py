@@ -0,0 +1,279 @@
+"""
+constrainer/model.py -- An immutable Model of a problem, and SearchStates
+that search it.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+A State is both the problem and one search of it: the values live in the
+BoolVars, the counts in the BoolConstraints, and the undo log in the
+State, so one State can only be searched by one thread at a time.  Model
+takes the problem out of a State into tuples of ids and numbers that never
+change after it's made.  A SearchState keeps everything one search changes
+--values, per-constraint counts, the trail--in its own arrays, so any
+number of them can search one Model at once, in threads or in processes
+forked after the Model is made, with different assumptions or guesses:
+
+    model = Model.from_state(state)
+    search = SearchState(model, assumptions={some_var: True})
+    for is_solution in search.generate_leaves():
+        if is_solution:
+            print search.true_vars()
+
+The search is the same as State.generate_leaves(), so the solutions come
+out the same (possibly in a different order).
+"""
+
+from array import array
+
+from maybies import *
+
+# Values in SearchState.values:
+FALSE, TRUE, MAYBE = 0, 1, 2
+_to_value = {FALSE: False, TRUE: True, MAYBE: Maybe}
+
+
+def _code(value):
+    if value == Maybe:
+        return MAYBE
+
+    return TRUE if value == True else FALSE
+
+
+class Model(object):
+    """
+    The problem only: which vars each constraint counts, and the bounds.
+    Var and constraint numbers are positions in state.vars and in
+    self.constraints.
+    """
+    def __init__(self, n_vars, constraint_vars, mins, maxes,
+                 initial_values=None, state=None, constraints=None):
+        self.n_vars = n_vars
+        self.constraint_vars = tuple(tuple(ids) for ids in constraint_vars)
+        self.mins = tuple(mins)
+        self.maxes = tuple(maxes)
+        var_constraints = [[] for i in xrange(n_vars)]
+        for c, ids in enumerate(self.constraint_vars):
+            for id in ids:
+                var_constraints[id].append(c)
+        self.var_constraints = tuple(tuple(cs) for cs in var_constraints)
+        if initial_values is None:
+            initial_values = [MAYBE] * n_vars
+        self.initial_values = array("b", initial_values)
+        # For turning numbers back into the original objects:
+        self.state = state
+        self.constraints = tuple(constraints or ())
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Make a Model of state's vars and BoolConstraints, with the vars'
+        current values as the starting point.  Constraints that say they
+        are redundant (hash_by = None, see State.enable_hashing()) are
+        left out; any other kind of constraint is an error.
+        """
+        if state.int_vars:
+            raise Exception("Model can't represent IntVars.")
+
+        constraints = []
+        for constraint in state.constraints:
+            hash_by = getattr(constraint, "hash_by", "values")
+            if hash_by == "count":
+                constraints.append(constraint)
+            elif hash_by is not None:
+                raise Exception("Model can't represent %r." % constraint)
+        return cls(len(state.vars),
+                   [sorted(var.id for var in constraint.vars)
+                    for constraint in constraints],
+                   [constraint.min_True for constraint in constraints],
+                   [constraint.max_True for constraint in constraints],
+                   [_code(var.value) for var in state.vars],
+                   state, constraints)
+
+    def var(self, id):
+        return self.state.vars[id]
+
+
+class SearchState(object):
+    """
+    One search of a Model.  assumptions is a dict of {var or var id:
+    True or False} to fix before the search.
+    """
+    def __init__(self, model, assumptions=None, verbose=False):
+        self.model = model
+        self.verbose = verbose
+        self.values = array("b", model.initial_values)
+        n_constraints = len(model.mins)
+        self.n_True = array("i", [0] * n_constraints)
+        self.n_Maybe = array("i", [0] * n_constraints)
+        for c, ids in enumerate(model.constraint_vars):
+            for id in ids:
+                if self.values[id] == TRUE:
+                    self.n_True[c] += 1
+                elif self.values[id] == MAYBE:
+                    self.n_Maybe[c] += 1
+        self.maybe_ids = set(id for id in xrange(model.n_vars)
+                             if self.values[id] == MAYBE)
+        # Constraints to look at in the next propagate().
+        self.dirty = set(xrange(n_constraints))
+        # The trail: (id, prev_value) for every change, and where each
+        # level of the search starts in it.
+        self.trail = []
+        self.frames = []
+        self.assumptions = {}
+        for var, value in (assumptions or {}).iteritems():
+            self.assumptions[getattr(var, "id", var)] = value
+        self.cancelled = False
+
+    def value(self, var):
+        """ The value of a var (or var id) in this search. """
+        return _to_value[self.values[getattr(var, "id", var)]]
+
+    def true_ids(self):
+        return [id for id in xrange(self.model.n_vars)
+                if self.values[id] == TRUE]
+
+    def true_vars(self):
+        return [self.model.var(id) for id in self.true_ids()]
+
+    def depth(self):
+        return len(self.frames)
+
+    def set(self, id, code):
+        """ Record the old value on the trail, and set. """
+        old = self.values[id]
+        self.trail.append( (id, old) )
+        self._change(id, old, code)
+
+    def _change(self, id, old, code):
+        self.values[id] = code
+        if code == MAYBE:
+            self.maybe_ids.add(id)
+        else:
+            self.maybe_ids.discard(id)
+        n_True = self.n_True
+        n_Maybe = self.n_Maybe
+        for c in self.model.var_constraints[id]:
+            if old == TRUE:
+                n_True[c] -= 1
+            elif old == MAYBE:
+                n_Maybe[c] -= 1
+            if code == TRUE:
+                n_True[c] += 1
+            elif code == MAYBE:
+                n_Maybe[c] += 1
+            self.dirty.add(c)
+
+    def push(self):
+        self.frames.append(len(self.trail))
+
+    def pop(self):
+        """
+        Undo one level and return True, or return False at the bottom.
+        """
+        if len(self.frames) <= 1:
+            return False
+
+        self._undo_to(self.frames.pop())
+        return True
+
+    def _undo_to(self, mark):
+        trail = self.trail
+        while len(trail) > mark:
+            id, old = trail.pop()
+            self._change(id, self.values[id], old)
+
+    def reset(self):
+        """ Undo everything, as State.reset() does. """
+        self._undo_to(0)
+        del self.frames[:]
+        self.dirty = set(xrange(len(self.model.mins)))
+        self.cancelled = False
+
+    def cancel(self):
+        """ Ask generate_leaves() to stop, as State.cancel() does. """
+        self.cancelled = True
+
+    def propagate(self):
+        """
+        Make the inferences the BoolConstraints would.  Return False on a
+        contradiction.
+        """
+        model = self.model
+        values = self.values
+        while self.dirty:
+            c = self.dirty.pop()
+            n_True = self.n_True[c]
+            n_Maybe = self.n_Maybe[c]
+            if n_True > model.maxes[c] or n_True + n_Maybe < model.mins[c]:
+                if self.verbose:
+                    print "Conflict:", model.constraints[c]
+                self.dirty.clear()
+                return False
+
+            if not n_Maybe:
+                continue
+
+            if n_True + n_Maybe == model.mins[c]:
+                code = TRUE
+            elif n_True == model.maxes[c]:
+                code = FALSE
+            else:
+                continue
+
+            for id in model.constraint_vars[c]:
+                if values[id] == MAYBE:
+                    self.set(id, code)
+        return True
+
+    def guess(self, default_guess=None):
+        """ Return (var id, value), the way State.guess() does. """
+        if default_guess == None:
+            default_guess = False
+        id = self.maybe_ids.pop()
+        self.maybe_ids.add(id)
+        return id, default_guess
+
+    def branch(self, id, value):
+        """ Like State.branch(), for var #id. """
+        if self.verbose:
+            print "guess", self.model.var(id), value
+        assert self.values[id] == MAYBE, "You can only guess about Maybies."
+        self.set(id, _code(not value))
+        self.push()  # -------- the stack frame boundary --------
+        self.set(id, _code(value))
+
+    def generate_leaves(self, verbose=False, default_guess=None):
+        """
+        Search for solutions.  Yield False at dead ends and True at
+        solutions, like State.generate_leaves().
+        """
+        self.push()
+        for id, value in self.assumptions.iteritems():
+            if self.values[id] == MAYBE:
+                self.set(id, _code(value))
+            elif self.values[id] != _code(value):
+                # The assumption contradicts the model.
+                self.reset()
+                return
+
+        while True:
+            if self.cancelled:
+                break
+
+            if not self.propagate():
+                if verbose: print "Conflict at depth", self.depth()
+                yield False
+
+            elif not self.maybe_ids:
+                yield True
+
+            else:
+                self.branch(*self.guess(default_guess=default_guess))
+                continue
+
+            if not self.pop():
+                break
+
+        self.reset()
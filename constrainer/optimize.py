@@ -0,0 +1,192 @@
+"""
+constrainer/optimize.py -- Branch-and-bound: search for solutions that
+minimize a weighted sum of vars.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    for is_solution in state.minimize(vars, weights):
+        if is_solution:
+            best = state.incumbent, [var for var in vars if var.value]
+
+State.minimize() adds a WeightedSum constraint on the objective, with no
+bound, and runs generate_leaves().  At each solution, the objective's
+total becomes state.incumbent and the bound: from then on the total must
+be less than the incumbent, so every solution found after that is an
+improvement, and the last one found is optimal.
+
+The bound prunes.  WeightedSum keeps the lowest total the Maybe vars
+could still give (the True vars' weights plus the negative weights of
+the Maybes), so a subtree that can't beat the incumbent is a dead end as
+soon as the search enters it, and a Maybe var whose weight would push the
+total to the incumbent is set the other way, which may set off other
+inferences.
+
+The discrepancy search modes (see SEARCH_MODES) need the tree to stay
+the same from one iteration to the next, and a tighter bound changes it:
+a var the bound sets no longer counts as a guess, so a better solution
+can turn up in a part of the tree an earlier iteration has already
+covered, and be skipped.  So with one of those modes, minimize() uses it
+to find good solutions early, then goes over the tree again depth-first
+with the bound it ended with, to find any better ones and show that the
+last is optimal.
+
+WeightedSum doesn't go into the hash (hash_by is "values"), and Models
+don't handle it.
+"""
+
+from maybies import *
+from logic import LogicConstraint
+
+
+class WeightedSum(LogicConstraint):
+    """
+    The sum of the weights of the True vars is less than bound (or
+    anything, if bound is None):
+        WeightedSum(state, vars, weights, bound=None)
+    Weights can be any numbers, negative too.
+    """
+    def __init__(self, state, vars, weights, bound=None, **kwargs):
+        vars = list(vars)
+        weights = list(weights)
+        assert len(vars) == len(weights), "One weight per var, please."
+        self.bound = bound
+        self.weights = weights
+        self.sum_True = 0
+        self.sum_Maybe_negative = 0
+        for var, weight in zip(vars, weights):
+            self.account(var.value, weight, 1)
+        super(WeightedSum, self).__init__(state, vars, **kwargs)
+        # Positions, heaviest first, for finding the Maybes that can't
+        # take the value that adds to the total.
+        self.heaviest = sorted(range(len(vars)), key=lambda i: -abs(weights[i]))
+        # {position: its place in heaviest}, and the place of the heaviest
+        # Maybe var (len(vars) if there's none), kept up to date in
+        # notice_change() as vars are set and unset.
+        self.rank = dict((i, r) for r, i in enumerate(self.heaviest))
+        self.first_Maybe = len(vars)
+        self.find_first_Maybe(0)
+
+    def account(self, value, weight, sign):
+        if value == True:
+            self.sum_True += sign * weight
+        elif value == Maybe and weight < 0:
+            self.sum_Maybe_negative += sign * weight
+
+    def notice_change(self, var, prev_value, new_value):
+        i = self.position[var]
+        weight = self.weights[i]
+        self.account(prev_value, weight, -1)
+        self.account(new_value, weight, 1)
+        if new_value == Maybe:
+            self.first_Maybe = min(self.first_Maybe, self.rank[i])
+        elif prev_value == Maybe and self.rank[i] == self.first_Maybe:
+            self.find_first_Maybe(self.first_Maybe + 1)
+        return self.check()
+
+    def find_first_Maybe(self, start):
+        """ Set first_Maybe to the first place from start with a Maybe. """
+        heaviest = self.heaviest
+        r = start
+        while r < len(heaviest) and self.vars[heaviest[r]].value != Maybe:
+            r += 1
+        self.first_Maybe = r
+
+    def lowest(self):
+        """ The lowest total the Maybe vars could still give. """
+        return self.sum_True + self.sum_Maybe_negative
+
+    def total(self):
+        """ The sum of the weights of the True vars. """
+        return self.sum_True
+
+    def tighten(self, bound):
+        """
+        Require the total to be less than bound from now on.  The bound
+        isn't undone when the search backs up.
+        """
+        self.bound = bound
+        return self.check()
+
+    def remove(self):
+        """ Take me out of the state and my vars. """
+        self.state.constraints.discard(self)
+        self.state.eager_constraints.discard(self)
+        self.state.conflicted_constraints.discard(self)
+        for var in self.vars:
+            var.constraints = tuple(constraint
+                                    for constraint in var.constraints
+                                    if constraint is not self)
+
+    def is_conflicted(self):
+        return self.bound is not None and self.lowest() >= self.bound
+
+    def is_eager(self):
+        if self.bound is None or self.first_Maybe == len(self.vars):
+            return False
+
+        weight = self.weights[self.heaviest[self.first_Maybe]]
+        return weight != 0 and abs(weight) >= self.bound - self.lowest()
+
+    def inferences(self):
+        """
+        A Maybe var with a positive weight at least the slack must be
+        False, and one with a negative weight at least the slack (in
+        size) must be True.
+        """
+        if self.bound is None:
+            return
+
+        slack = self.bound - self.lowest()
+        for r in xrange(self.first_Maybe, len(self.heaviest)):
+            i = self.heaviest[r]
+            weight = self.weights[i]
+            if abs(weight) < slack or weight == 0:
+                break
+
+            var = self.vars[i]
+            if var.value == Maybe:
+                yield var, weight < 0
+
+    @property
+    def reason(self):
+        """ Why I'm conflicted, or None if I'm not. """
+        if not self.is_conflicted():
+            return None
+
+        return "%r can't total less than %s (at best %s)" \
+               % (self, self.bound, self.lowest())
+
+
+def minimize(state, vars, weights=None, verbose=False, default_guess=None,
+             mode="dfs"):
+    """ See State.minimize(). """
+    if weights is None:
+        weights = [1] * len(vars)
+    objective = WeightedSum(state, vars, weights, label="objective")
+    state.incumbent = None
+    leaves = None
+    try:
+        for pass_mode in [mode] if mode == "dfs" else [mode, "dfs"]:
+            if verbose and pass_mode != mode: print "Checking depth-first."
+            leaves = state.generate_leaves(verbose,
+                                           default_guess=default_guess,
+                                           mode=pass_mode)
+            # generate_leaves() clears a cancel() when it stops.
+            cancelled = False
+            for is_solution in leaves:
+                cancelled = cancelled or state.cancelled
+                if is_solution:
+                    state.incumbent = objective.total()
+                    if verbose: print "Incumbent:", state.incumbent
+                    yield True
+                    objective.tighten(state.incumbent)
+                else:
+                    yield False
+            if cancelled:
+                break
+    finally:
+        if leaves is not None:
+            leaves.close()
+        objective.remove()
@@ -0,0 +1,197 @@
+"""
+constrainer/portfolio.py -- Search one model several ways at once, in
+worker processes, and take the first answer.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Which default_guess or search mode is fastest depends on the puzzle, and
+there's no telling ahead of time.  A portfolio runs them all:
+
+    configs = [dict(default_guess=False), dict(default_guess=True),
+               dict(default_guess=False, mode="lds"),
+               dict(default_guess=False, seed=1)]
+    winner, runs = run_portfolio(state, configs, timeout=60,
+                                 record="runs.jsonl", label="cube")
+    if winner and winner["status"] == "solution":
+        apply_solution(state, winner["solution"])
+        ...
+        state.reset()
+
+Each config is a dict of
+    default_guess   passed to generate_leaves()
+    mode            passed to generate_leaves() (see SEARCH_MODES)
+    seed            if given, guesses are about a random Maybe var,
+                    chosen with random.Random(seed), instead of whichever
+                    one the default guess() picks.  Ignored when mode isn't
+                    "dfs", since those modes need guesses that depend only
+                    on the assignment.
+
+Each config gets a process, forked with the state as it is, so the model
+is built once.  The first worker to find a solution or to finish its
+search without one wins; the rest are told to stop, and report what they
+did so far.  A run is a dict of its config plus
+
+    index       the config's position in configs
+    status      "solution", "no solution", "cancelled" (another run won
+                or time ran out), "killed" (didn't answer in time), or
+                "error" (the worker died without answering)
+    seconds     how long it ran
+    n_deadends  dead ends it saw
+    solution    ids of the True vars, for "solution"
+    exitcode    the dead worker's exit code, for "error"
+
+run_portfolio() returns (the winning run or None, all the runs in config
+order).  With record, each run is appended to that file as a line of
+JSON, with label, so it can be seen which configs win on which puzzles.
+"""
+
+import json
+import multiprocessing
+import Queue
+import random
+import time
+
+from maybies import *
+
+
+# Seconds between checks on whether the workers are still alive.
+POLL = 0.5
+
+def random_guesser(state, seed):
+    """
+    Return a function to use as state.guess: it picks the Maybe var
+    that's first in a random order of all the vars.
+    """
+    rng = random.Random(seed)
+    rank = range(len(state.vars))
+    rng.shuffle(rank)
+
+    def guess(default_guess=None):
+        var = min(state.maybe_vars, key=lambda var: rank[var.id])
+        return var, var.guess_value(bool(default_guess))
+
+    return guess
+
+
+def _run(state, index, config, results, stop):
+    """ The work of one worker process. """
+    run = dict(config, index=index, n_deadends=0)
+    mode = config.get("mode", "dfs")
+    if config.get("seed") is not None and mode == "dfs":
+        state.guess = random_guesser(state, config["seed"])
+    start = time.time()
+    status = "no solution"
+    for is_solution in state.generate_leaves(
+            default_guess=config.get("default_guess"), mode=mode):
+        if stop.is_set():
+            status = "cancelled"
+            break
+
+        if is_solution:
+            status = "solution"
+            run["solution"] = [var.id for var in state.vars
+                               if var.value == True]
+            break
+
+        run["n_deadends"] += 1
+    run["status"] = status
+    run["seconds"] = time.time() - start
+    results.put(run)
+
+
+def run_portfolio(state, configs, timeout=None, grace=5.0, record=None,
+                  label=None, verbose=False):
+    """
+    Search state once per config, in parallel, until one run answers.
+    timeout (seconds) stops them all if none does.  Workers that don't
+    report within grace seconds of being told to stop are killed.  A
+    worker that dies without reporting (an exception, out of memory) is
+    noticed within a couple of POLLs, even with no timeout.
+    Return (winner or None, runs).  See the top of this file.
+    """
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_run,
+                                       args=(state, i, config, results, stop))
+               for i, config in enumerate(configs)]
+    start = time.time()
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    runs = [None] * len(configs)
+    winner = None
+    deadline = None if timeout is None else start + timeout
+    n_reported = 0
+    # Workers found dead at the last poll, whose reports might still have
+    # been on the way.
+    dead = set()
+    while n_reported < len(configs):
+        now = time.time()
+        if deadline is not None and now >= deadline:
+            if stop.is_set():
+                break  # Out of grace.
+
+            if verbose: print "Portfolio: out of time."
+            stop.set()
+            deadline = now + grace
+            continue
+
+        wait = POLL if deadline is None else min(POLL, deadline - now)
+        try:
+            run = results.get(timeout=wait)
+        except Queue.Empty:
+            for i, worker in enumerate(workers):
+                if runs[i] is not None or worker.is_alive():
+                    continue
+                if i in dead:
+                    n_reported += 1
+                    runs[i] = dict(configs[i], index=i, status="error",
+                                   exitcode=worker.exitcode,
+                                   seconds=time.time() - start)
+                    if verbose: print "Portfolio run:", runs[i]
+                else:
+                    dead.add(i)
+            continue
+
+        if runs[run["index"]] is None:
+            n_reported += 1
+        # else it was recorded as an "error" while its report was still on
+        # the way, and counted then.
+        runs[run["index"]] = run
+        if verbose: print "Portfolio run:", run
+        if winner is None and run["status"] in ("solution", "no solution"):
+            winner = run
+            stop.set()
+            deadline = time.time() + grace
+
+    for i, worker in enumerate(workers):
+        if runs[i] is None:
+            worker.terminate()
+            runs[i] = dict(configs[i], index=i, status="killed",
+                           seconds=time.time() - start)
+        worker.join()
+
+    if record:
+        with open(record, "a") as stream:
+            for run in runs:
+                entry = dict((key, value) for key, value in run.iteritems()
+                             if key != "solution")
+                entry["label"] = label
+                entry["won"] = run is winner
+                stream.write(json.dumps(entry, sort_keys=True) + "\n")
+    return winner, runs
+
+
+def apply_solution(state, true_ids):
+    """
+    Set state's vars to a solution from run_portfolio(): the vars with
+    ids in true_ids True, the rest False.  state.reset() undoes it.
+    """
+    true_ids = set(true_ids)
+    state.push()
+    for var in state.vars:
+        if var.value == Maybe:
+            var.set(var.id in true_ids)
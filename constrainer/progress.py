@@ -0,0 +1,183 @@
+"""
+constrainer/progress.py -- Reports on how a long search is going, and a
+guess at how long it will take.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    progress = Progress(state, interval=10)
+    for is_solution in progress.leaves(state.generate_leaves()):
+        ...
+
+Every interval seconds, at the next leaf, a line like
+
+    progress: 0:01:40 41230 leaves (96 solutions) 412/sec. depth 17
+        8.2% done, ~503000 leaves, ETA 0:18:40
+
+goes to stderr (all on one line).
+
+The "done" fraction is a "fraction explored" estimate (Kilby, Slaney,
+Thiebaux and Walsh, 2006) from where the search is in the tree: being
+in the second branch of the first guess means the first branch is done,
+and so on down the path.  What the first branch is worth depends on how
+the tree splits.  Taking every guess as a 50/50 split is useless here:
+with default_guess=False, the first branch of a guess (leaving a piece
+out of one place) is nearly the whole problem again, and a path is
+hundreds of guesses long.  So the split is measured instead: each time
+a stack level is popped, the guesses made at that level are finished,
+and their first and second branches' leaf counts are added to the
+totals for that level.  A level with no finished guesses yet uses the
+totals of all levels.  The estimate starts rough, gets better as the
+search goes along, and is right at the end.  The estimated tree size is
+leaves so far / fraction done, and the ETA is the time so far scaled the
+same way.
+
+Only searches that guess with State.branch()--generate_leaves() mode
+"dfs", and generate_projected()--give an estimate; in the other modes
+there are just the counts and rates.
+
+The bookkeeping happens at guesses and pops, only while a Progress is
+watching, and the estimate is only worked out for a report.  The clock
+is looked at once per leaf.
+"""
+
+from sys import stderr
+import time
+
+
+def hms(seconds):
+    """ Format seconds as h:mm:ss. """
+    seconds = int(round(seconds))
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class Progress(object):
+    """
+    Watches the leaves coming out of a search of state, and reports
+    every interval seconds to stream.  While leaves() runs, it is
+    state.tracker, and is told about each branch and pop.
+    """
+    def __init__(self, state, interval=10.0, stream=stderr):
+        self.state = state
+        self.interval = interval
+        self.stream = stream
+        self.n_leaves = 0
+        self.n_solutions = 0
+        self.start = None
+        self.next_report = None
+        # nodes[level] is a list of [leaves before, leaves at the end of
+        # the first branch or None] for each guess made at that level.
+        self.nodes = [[]]
+        # For each level, [leaves in first branches, leaves in both] of
+        # the finished guesses there; totals has the same for all levels.
+        self.splits = []
+        self.totals = [0, 0]
+
+    def branched(self, level):
+        """ Called by State.branch() at stack level level. """
+        nodes = self.nodes
+        # Levels past level were popped; any there are already counted.
+        del nodes[level + 1:]
+        while len(nodes) <= level:
+            nodes.append([])
+        nodes[level].append([self.n_leaves, None])
+        nodes.append([])
+
+    def popped(self, level):
+        """ Called by State.pop() before popping stack level level. """
+        nodes = self.nodes
+        if level >= len(nodes):
+            return
+
+        # Everything guessed at level is finished now.
+        n = self.n_leaves
+        while len(self.splits) <= level:
+            self.splits.append([0, 0])
+        split = self.splits[level]
+        for before, first_done in nodes[level]:
+            split[0] += first_done - before
+            split[1] += n - before
+            self.totals[0] += first_done - before
+            self.totals[1] += n - before
+        del nodes[level:]
+        # ...and the guess that made this level has done its first branch.
+        if level > 0 and nodes[level - 1]:
+            nodes[level - 1][-1][1] = n
+
+    def first_share(self, level):
+        """ The fraction of a guess's leaves expected in its first branch. """
+        if level < len(self.splits) and self.splits[level][1]:
+            first, both = self.splits[level]
+        else:
+            first, both = self.totals
+        if not both:
+            return 0.5
+
+        return float(first) / both
+
+    def fraction_done(self):
+        """
+        At a leaf, the estimated fraction of the tree done, counting the
+        leaf, or None if nothing has been guessed.
+        """
+        if not self.nodes[0]:
+            return None
+
+        weight = 1.0
+        done = 0.0
+        for level, nodes in enumerate(self.nodes[:self.state.depth()]):
+            share = self.first_share(level)
+            for before, first_done in nodes:
+                if first_done is None:
+                    # In this guess's first branch, on the next level.
+                    weight *= share
+                else:
+                    done += weight * share
+                    weight *= 1 - share
+        return min(done + weight, 1.0)
+
+    def leaves(self, leaves):
+        """
+        Pass through what leaves (from generate_leaves() or
+        generate_projected()) yields, reporting along the way, and once
+        more at the end.
+        """
+        state = self.state
+        state.tracker = self
+        self.start = time.time()
+        self.next_report = self.start + self.interval
+        finished = False
+        try:
+            for leaf in leaves:
+                self.n_leaves += 1
+                if leaf:
+                    self.n_solutions += 1
+                if time.time() >= self.next_report:
+                    self.report()
+                yield leaf
+
+            finished = True
+        finally:
+            self.report(end="finished" if finished else "stopped")
+            state.tracker = None
+
+    def report(self, end=None):
+        now = time.time()
+        elapsed = now - self.start
+        self.next_report = now + self.interval
+        words = ["progress:", hms(elapsed), "%d leaves" % self.n_leaves,
+                 "(%d solutions)" % self.n_solutions]
+        if elapsed > 0:
+            words.append("%.0f/sec." % (self.n_leaves / elapsed))
+        if end:
+            words.append(end)
+        else:
+            words.append("depth %d" % self.state.depth())
+            fraction = self.fraction_done()
+            if fraction:
+                words.append("%.1f%% done, ~%d leaves, ETA %s"
+                             % (100 * fraction, self.n_leaves / fraction,
+                                hms(elapsed * (1 - fraction) / fraction)))
+        print >>self.stream, " ".join(words)
+        self.stream.flush()
@@ -0,0 +1,152 @@
+"""
+constrainer/propagator.py -- Base class for custom inference rules.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+A Propagator brings knowledge about a problem into the search that
+BoolConstraints can't express, for instance "this empty pocket is too
+small for any piece that's left."  To write one, subclass Propagator and
+override infer():
+
+    class NoLonelyTrue(Propagator):
+        def infer(self):
+            ...look at self.vars, or anything else...
+            if hopeless:
+                return self.conflict("why it's hopeless")
+            for var in vars_that_must_be_False:
+                if not self.force(var, False):
+                    return False
+            return True
+
+    NoLonelyTrue(state, *vars_to_watch, label="whatever")
+
+How it fits into the search:
+
+ o  The propagator watches the vars given to it (or to watch()).  Every
+    change to one of them, including the undoing of a change when the
+    search backs up, calls notice_change(), which by default "wakes" the
+    propagator.
+ o  State.propagate() runs woken propagators' infer() methods, but only
+    after the BoolConstraints (and other constraints) have inferred all
+    they can, since propagators are usually slower.
+ o  infer() sets vars with force() and reports a dead end with
+    conflict(reason).  The conflict, and self.reason, are cleared the
+    next time a watched var changes.  State.conflict_reasons() collects
+    the reasons.
+ o  Vars set with force() are undone by the search like any others.  If
+    the propagator keeps other information that has to be undone when the
+    search backs up, it can call save(value) before changing it, and
+    override restore(value) to put it back.
+ o  infer() may run again right after it forces vars (that wakes it), so
+    it should be harmless to run twice.
+"""
+
+from maybies import *
+
+
+class Propagator(object):
+    # How I go into State.hash (see State.enable_hashing()).  A propagator
+    # that only rules out what the other constraints would rule out
+    # eventually can set this to None.
+    hash_by = "values"
+
+    def __init__(self, state, *vars, **kwargs):
+        self.label = dict(kwargs)
+        self.__dict__.update(kwargs)
+
+        self.state = state
+        state.constraints.add(self)
+        self.vars = []
+        self.reason = None
+        self.watch(*vars)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + str(self.label) + ")"
+
+    def watch(self, *vars):
+        """ Subscribe to changes of vars. """
+        for var in vars:
+            self.vars.append(var)
+            var.be_constrained_by(self)
+
+    def wake(self):
+        """ Ask to have infer() called during the next propagate(). """
+        self.state.eager_propagators.add(self)
+
+    def notice_change(self, var, prev_value, new_value):
+        """
+        Called by every change of a watched var.  Override this to keep
+        incremental information about the vars, but call this version
+        (or do what it does) too.
+        """
+        self.clear_conflict()
+        self.wake()
+        return self.state.consistent()
+
+    def check(self):
+        """ Called when the search starts. """
+        self.clear_conflict()
+        self.wake()
+        return self.state.consistent()
+
+    def propagate(self):
+        """ Called by State.propagate(); calls infer(). """
+        self.state.eager_propagators.discard(self)
+        if not self.state.consistent():
+            return False
+
+        return self.infer()
+
+    def infer(self):
+        """
+        Override this: force() the vars that follow from the current
+        situation, and return True, or return conflict(reason).
+        """
+        return True
+
+    def force(self, var, value):
+        """
+        Set var to value from inside infer(), if it isn't already.
+        Return False if that's a contradiction.
+        """
+        if var.value == value:
+            return True
+
+        if var.value != Maybe:
+            return self.conflict("%s can't be %s" % (var, value))
+
+        if self.state.verbose:
+            print "    infer", str(var), value, "by", self
+        return var.set(value)
+
+    def conflict(self, reason):
+        """ Report that the current situation is a dead end, and return False. """
+        self.reason = reason
+        if self.state.verbose:
+            print self, "is conflicted:", reason
+        self.state.conflicted_constraints.add(self)
+        return False
+
+    def clear_conflict(self):
+        if self.reason is not None:
+            self.reason = None
+            self.state.conflicted_constraints.discard(self)
+
+    def save(self, value):
+        """
+        Put value on the search's undo log.  When the search backs up
+        through this point, restore(value) will be called.
+        """
+        self.state.log_stack[-1].append( (self, value) )
+
+    def restore(self, value):
+        """ Override this to undo changes recorded with save(). """
+        pass
+
+    def raw_set(self, value):
+        """ State.pop() undoes every log entry with raw_set(). """
+        self.restore(value)
+        self.clear_conflict()
+        self.wake()
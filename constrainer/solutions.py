@@ -0,0 +1,146 @@
+"""
+constrainer/solutions.py -- Saving solution snapshots to a file, and
+reading them back.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+A snapshot (from State.snapshot()) is a packed bitset of the ids of the
+vars that are True.  A solution file is a small header followed by
+snapshots as fixed-size records, so it can be appended to while the search
+runs, and read back through mmap without loading it:
+
+    with SolutionWriter("cube.sol", len(state.vars), dedup=True) as writer:
+        for is_solution in state.generate_leaves():
+            if is_solution:
+                writer.write(state.snapshot())
+
+    solutions = SolutionFile("cube.sol")
+    for snapshot in solutions:
+        print [state.vars[id] for id in snapshot_true_ids(snapshot)]
+"""
+
+import hashlib
+import mmap
+import struct
+
+MAGIC = "CSOL"
+VERSION = 1
+# magic, version, number of vars, bytes per record.
+HEADER = struct.Struct("<4sIQQ")
+
+
+def snapshot_true_ids(snapshot):
+    """ Return the list of var ids whose bits are set in snapshot. """
+    ids = []
+    for i, byte in enumerate(bytearray(snapshot)):
+        while byte:
+            low_bit = byte & -byte
+            ids.append(i * 8 + low_bit.bit_length() - 1)
+            byte ^= low_bit
+    return ids
+
+
+class SolutionWriter(object):
+    """
+    Appends snapshots to a solution file.  With dedup=True, a snapshot
+    that was already written (by this writer) is skipped; only a digest
+    of each snapshot is kept in memory for that.
+    """
+    def __init__(self, filename, n_vars, dedup=False):
+        self.n_vars = n_vars
+        self.record_size = (n_vars + 7) >> 3
+        self.n_written = 0
+        self.n_duplicates = 0
+        self.digests = set() if dedup else None
+        self.stream = open(filename, "wb")
+        self.stream.write(HEADER.pack(MAGIC, VERSION, n_vars,
+                                      self.record_size))
+
+    def write(self, snapshot):
+        """ Append snapshot.  Return False if it was a skipped duplicate. """
+        assert len(snapshot) == self.record_size, \
+               "Snapshot is %d bytes, not %d." % (len(snapshot),
+                                                   self.record_size)
+        if self.digests is not None:
+            digest = hashlib.sha1(snapshot).digest()
+            if digest in self.digests:
+                self.n_duplicates += 1
+                return False
+
+            self.digests.add(digest)
+        self.stream.write(snapshot)
+        self.n_written += 1
+        return True
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SolutionFile(object):
+    """
+    Read-only, memory-mapped access to a solution file.
+    len(f) is the number of snapshots, f[i] is the i'th snapshot,
+    and iterating gives the snapshots in order.
+    """
+    def __init__(self, filename):
+        self.stream = open(filename, "rb")
+        header = self.stream.read(HEADER.size)
+        magic, version, self.n_vars, self.record_size = HEADER.unpack(header)
+        assert magic == MAGIC, "%s is not a solution file." % filename
+        assert version == VERSION, \
+               "%s is solution file version %d, not %d." \
+               % (filename, version, VERSION)
+
+        self.stream.seek(0, 2)
+        size = self.stream.tell()
+        if size > HEADER.size:
+            self.map = mmap.mmap(self.stream.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        else:
+            # mmap can't map an empty range.
+            self.map = ""
+        # A record cut short by a crash mid-write isn't counted.
+        self.n_solutions = (size - HEADER.size) / self.record_size \
+                           if self.record_size else 0
+
+    def __len__(self):
+        return self.n_solutions
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n_solutions
+        if not 0 <= i < self.n_solutions:
+            raise IndexError("solution index out of range")
+
+        start = HEADER.size + i * self.record_size
+        return self.map[start : start + self.record_size]
+
+    def __iter__(self):
+        for i in xrange(self.n_solutions):
+            yield self[i]
+
+    def true_ids(self, i):
+        """ The ids of the vars that are True in the i'th solution. """
+        return snapshot_true_ids(self[i])
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
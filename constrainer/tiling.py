@@ -0,0 +1,295 @@
+"""
+constrainer/tiling.py -- Polyomino and polycube tiling as exact cover.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+A shape is a sequence of cells, each a 2- or 3-tuple of ints.
+A Board numbers the cells of its bounding box so that a set of cells is
+an integer bitmask and moving a shape is a shift: one step in x is a
+shift of 1, one step in y is a shift of the box's width, and so on.
+So a placement (a rotated, reflected and/or moved piece) fits the
+target when its mask has no bits outside the target's mask, and two
+placements that cover the same cells have equal masks.
+
+    tiling = Tiling(target, {"A": shape_a, "B": shape_b, ...})
+    for is_solution in tiling.state.generate_leaves():
+        if is_solution:
+            print tiling.solution_cell_labels()
+"""
+
+import itertools
+
+from constrainer import *
+
+
+def popcount(mask):
+    """ The number of 1 bits in mask. """
+    return bin(mask).count("1")
+
+
+def normalize(shape):
+    """
+    Return shape as a sorted tuple of cells with the minimum of each
+    coordinate moved to zero.
+    """
+    n_dims = len(shape[0])
+    mins = [min(cell[d] for cell in shape) for d in range(n_dims)]
+    return tuple(sorted(tuple(cell[d] - mins[d] for d in range(n_dims))
+                        for cell in shape))
+
+
+def transforms(n_dims, reflections=False):
+    """
+    Yield the rotations (and, if reflections, the reflections) of
+    n_dims-space that map the grid to itself, as (permutation, signs):
+    new_cell[d] = signs[d] * cell[permutation[d]].
+    There are 4 or 8 of these in 2D and 24 or 48 in 3D.
+    """
+    for permutation in itertools.permutations(range(n_dims)):
+        # The parity of the permutation, from its number of inversions.
+        inversions = sum(1 for i in range(n_dims) for j in range(i)
+                         if permutation[j] > permutation[i])
+        for signs in itertools.product((1, -1), repeat=n_dims):
+            n_flips = inversions + signs.count(-1)
+            if reflections or n_flips % 2 == 0:
+                yield permutation, signs
+
+
+def orientations(shape, reflections=False):
+    """
+    Return the distinct normalized rotations (and reflections, if
+    reflections) of shape, as a list.
+    """
+    n_dims = len(shape[0])
+    seen = set()
+    results = []
+    for permutation, signs in transforms(n_dims, reflections):
+        new = normalize([tuple(signs[d] * cell[permutation[d]]
+                               for d in range(n_dims))
+                         for cell in shape])
+        if new not in seen:
+            seen.add(new)
+            results.append(new)
+    return results
+
+
+class Board(object):
+    """ A target shape, with its bounding box numbered for bitmasks. """
+    def __init__(self, cells):
+        cells = [tuple(cell) for cell in cells]
+        self.n_dims = n_dims = len(cells[0])
+        self.origin = tuple(min(cell[d] for cell in cells)
+                            for d in range(n_dims))
+        self.sizes = tuple(max(cell[d] for cell in cells) - self.origin[d] + 1
+                           for d in range(n_dims))
+        self.strides = []
+        stride = 1
+        for size in self.sizes:
+            self.strides.append(stride)
+            stride *= size
+        self.bits = sorted(self.index(cell) for cell in cells)
+        self.mask = sum(1 << bit for bit in self.bits)
+        # The cells of the bounding box that aren't in the target.
+        box = (1 << stride) - 1
+        self.holes = box & ~self.mask
+        # For each dimension, the masks of the bounding box's cells with
+        # the lowest and with the highest coordinate in that dimension.
+        self.low_faces = []
+        self.high_faces = []
+        for d in range(n_dims):
+            face = 0
+            for bit in range(stride):
+                if bit / self.strides[d] % self.sizes[d] == 0:
+                    face |= 1 << bit
+            self.low_faces.append(face)
+            self.high_faces.append(face << (self.strides[d]
+                                            * (self.sizes[d] - 1)))
+
+    def index(self, cell):
+        """ The bit number of a cell. """
+        return sum((cell[d] - self.origin[d]) * self.strides[d]
+                   for d in range(self.n_dims))
+
+    def cell(self, bit):
+        """ The cell of a bit number. """
+        cell = []
+        for d in range(self.n_dims):
+            bit, offset = divmod(bit, self.sizes[d])
+            cell.append(self.origin[d] + offset)
+        return tuple(cell)
+
+    def mask_cells(self, mask):
+        """ Return the list of cells in mask. """
+        cells = []
+        while mask:
+            low_bit = mask & -mask
+            cells.append(self.cell(low_bit.bit_length() - 1))
+            mask ^= low_bit
+        return cells
+
+    def neighbors(self, mask):
+        """
+        Return the mask of the cells of the bounding box that share a face
+        with a cell in mask (including cells in mask, if they do).
+        """
+        result = 0
+        for d in range(self.n_dims):
+            stride = self.strides[d]
+            result |= (mask & ~self.high_faces[d]) << stride
+            result |= (mask & ~self.low_faces[d]) >> stride
+        return result
+
+    def components(self, mask):
+        """ Return the face-connected parts of mask as a list of masks. """
+        parts = []
+        while mask:
+            part = mask & -mask
+            while True:
+                grown = (part | self.neighbors(part)) & mask
+                if grown == part:
+                    break
+
+                part = grown
+            parts.append(part)
+            mask &= ~part
+        return parts
+
+    def placements(self, shape, reflections=False):
+        """
+        Return every way shape fits in the target, rotated (and reflected,
+        if reflections) and moved, as a list of (mask, bits) with bits the
+        list of bit numbers of the cells.  Placements that cover the same
+        cells, as happens with symmetrical shapes, are only listed once.
+        """
+        seen = set()
+        results = []
+        for oriented in orientations(shape, reflections):
+            extents = [max(cell[d] for cell in oriented) + 1
+                       for d in range(self.n_dims)]
+            if any(extent > size for extent, size in zip(extents, self.sizes)):
+                continue
+
+            base_bits = [sum(cell[d] * self.strides[d]
+                             for d in range(self.n_dims))
+                         for cell in oriented]
+            base_mask = sum(1 << bit for bit in base_bits)
+            for offset in itertools.product(*[range(size - extent + 1)
+                                              for size, extent
+                                              in zip(self.sizes, extents)]):
+                shift = sum(offset[d] * self.strides[d]
+                            for d in range(self.n_dims))
+                mask = base_mask << shift
+                if mask & self.holes or mask in seen:
+                    continue
+
+                seen.add(mask)
+                results.append( (mask, [bit + shift for bit in base_bits]) )
+        return results
+
+    def placements_covering(self, oriented_shapes, bit):
+        """
+        Return the ways that shapes in oriented_shapes (a list such as
+        orientations() returns) fit in the target and cover the cell
+        number bit, as placements() does, but without generating the
+        placements elsewhere.
+        """
+        cell = self.cell(bit)
+        seen = set()
+        results = []
+        for oriented in oriented_shapes:
+            for anchor in oriented:
+                cells = [tuple(other[d] - anchor[d] + cell[d]
+                               for d in range(self.n_dims))
+                         for other in oriented]
+                if any(not 0 <= other[d] - self.origin[d] < self.sizes[d]
+                       for other in cells for d in range(self.n_dims)):
+                    continue
+
+                bits = [self.index(other) for other in cells]
+                mask = sum(1 << other_bit for other_bit in bits)
+                if mask & self.holes or mask in seen:
+                    continue
+
+                seen.add(mask)
+                results.append( (mask, bits) )
+        return results
+
+
+class Tiling(object):
+    """
+    The exact-cover problem of filling target with pieces, as a State:
+    a BoolVar for each placement of each piece, a BoolConstraint for each
+    target cell that exactly one placement covers it, and a BoolConstraint
+    for each piece that it's placed exactly once.
+
+    pieces is a dict of {label: shape}.  If optional is True, each piece
+    also gets an "unused" var, so pieces can be left out.  If reflections
+    is True, pieces may be flipped over as well as rotated.
+
+    Placement vars have attributes piece (the label) and mask; unused vars
+    have piece and label="unused".
+    """
+    def __init__(self, target, pieces, reflections=False, optional=False,
+                 verbose=False):
+        self.board = board = Board(target)
+        self.labels = labels = list(pieces)
+        self.state = state = State(verbose=verbose)
+
+        cell_number = dict((bit, i) for i, bit in enumerate(board.bits))
+        self.cell_constraints = state.new_constraints(len(board.bits), 1, 1,
+            cell=[board.cell(bit) for bit in board.bits])
+        self.piece_constraints = state.new_constraints(len(labels), 1, 1,
+                                                       piece=labels)
+
+        placement_labels = []
+        masks = []
+        constraint_indices = []
+        var_indices = []
+        for piece_number, label in enumerate(labels):
+            for mask, bits in board.placements(pieces[label], reflections):
+                var_index = len(masks)
+                placement_labels.append(label)
+                masks.append(mask)
+                constraint_indices.append(len(board.bits) + piece_number)
+                var_indices.append(var_index)
+                for bit in bits:
+                    constraint_indices.append(cell_number[bit])
+                    var_indices.append(var_index)
+        vars = state.new_vars(len(masks), piece=placement_labels, mask=masks)
+        self.placement_vars = dict((label, []) for label in labels)
+        for var, label in zip(vars, placement_labels):
+            self.placement_vars[label].append(var)
+
+        self.unused_vars = {}
+        if optional:
+            unused = state.new_vars(len(labels), piece=labels,
+                                    label=["unused"] * len(labels))
+            self.unused_vars = dict(zip(labels, unused))
+            for piece_number, var in enumerate(unused):
+                constraint_indices.append(len(board.bits) + piece_number)
+                var_indices.append(len(vars) + piece_number)
+            vars += unused
+
+        state.constrain_incidence(self.cell_constraints + self.piece_constraints,
+                                  vars, constraint_indices, var_indices)
+
+    def solution_placements(self):
+        """
+        At a solution, return a dict of {label: mask} for the pieces
+        that are used.
+        """
+        placements = {}
+        for constraint in self.cell_constraints:
+            for var in constraint[True]:
+                placements[var.piece] = var.mask
+        return placements
+
+    def solution_cell_labels(self):
+        """ At a solution, return a dict of {cell: label of piece there}. """
+        cell_labels = {}
+        for label, mask in self.solution_placements().iteritems():
+            for cell in self.board.mask_cells(mask):
+                cell_labels[cell] = label
+        return cell_labels
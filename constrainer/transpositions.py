@@ -0,0 +1,75 @@
+"""
+constrainer/transpositions.py -- A bounded table of what's known about
+subtrees of the search, by the hash of the assignment at their tops.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Guessing in different orders often gets the search to the same partial
+assignment--the same pieces in the same places, put there in a different
+order--and everything below it is searched again.  With a table,
+
+    table = TranspositionTable(max_entries=1000000)
+    n_solutions, n_deadends = state.count_solutions(table)
+
+each finished subtree's solution count is stored under State.hash, a
+hash of the residual problem (see State.enable_hashing()), and a subtree
+seen before is skipped.  generate_leaves(transpositions=table) can only
+use the entries that say "no solutions here," since it has to visit the
+solutions it yields.
+
+This is only right if each constraint's hash_by attribute tells the
+truth, and if a Propagator's inferences depend only on var values.  Two
+different residual problems with the same 64-bit hash would be
+confused, but that's very unlikely.
+"""
+
+from collections import OrderedDict
+
+
+class TranspositionTable(object):
+    """
+    A dict of {hash: number of solutions} holding at most max_entries.
+    Each entry costs roughly 150 bytes.  When it's full, the entry used
+    least recently (policy="lru") or stored first (policy="fifo") is
+    forgotten to make room.
+    """
+    def __init__(self, max_entries=1000000, policy="lru"):
+        assert policy in ("lru", "fifo"), "Unknown policy %r" % policy
+        self.max_entries = max_entries
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, hash):
+        """ Return the stored count for hash, or None. """
+        count = self.entries.get(hash)
+        if count is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self.policy == "lru":
+            del self.entries[hash]
+            self.entries[hash] = count
+        return count
+
+    def put(self, hash, count):
+        if self.max_entries <= 0:
+            return
+
+        if hash in self.entries:
+            del self.entries[hash]
+        self.entries[hash] = count
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
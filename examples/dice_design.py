@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+examples/dice_design.py -- Search for a set of letter dice that can spell
+as many of a list of phrases as possible.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Starting from a set of dice (a file like kitchen_dice.sort), this tries
+swapping a face of one die with a face of another, keeps the swaps that
+let the set spell more of the phrases (or as many, to get across flat
+spots), and prints the best set found when the time is up.
+
+Whether a set of dice can spell a phrase depends only on the phrase's
+letters and how many of each, so phrases are grouped by that multiset
+(spelled as its sorted letters) and checked with spell_dice's model.
+Only the dice's faces with the multiset's letters on them matter, so
+results are cached by the multiset and those faces, and different sets
+of dice share results.  A swap of letter x for letter y can only change
+the results of multisets with an x or a y in them, so a candidate set
+inherits the rest from the set it was made from.  The checks for a
+round's candidates run in a pool of processes.
+"""
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+from spell_dice import Die, SpellIntModel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dice", metavar="file",
+        type=str, default="kitchen_dice.sort",
+        help="file of descriptions of the dice to start from")
+    parser.add_argument("--phrases", metavar="file",
+        type=str, default="spell_dice_phrases",
+        help="file of phrases to spell, one per line")
+    parser.add_argument("--seconds", metavar="sec",
+        type=float, default=60.0,
+        help="time budget for the search")
+    parser.add_argument("--candidates", metavar="N",
+        type=int, default=16,
+        help="face swaps to try in each round")
+    parser.add_argument("--workers", metavar="N",
+        type=int, default=multiprocessing.cpu_count(),
+        help="processes checking candidates")
+    parser.add_argument("--seed", metavar="N",
+        type=int, default=None,
+        help="random seed for choosing swaps")
+    parser.add_argument("--verbose", "-v",
+        action="store_true",
+        help="show each improvement")
+    return parser.parse_args()
+
+
+def multiset(phrase):
+    """ A phrase's letters, sorted, as a string. """
+    return "".join(sorted(c for c in phrase.lower() if c.isalpha()))
+
+
+def spellable(faces, letters):
+    """ Whether dice with faces (a list of strings) can spell letters. """
+    if len(letters) > len(faces):
+        return False
+
+    try:
+        model = SpellIntModel(letters, [Die(die_faces) for die_faces in faces])
+    except Exception:
+        # Not enough usable dice.
+        return False
+
+    leaves = model.state.generate_leaves()
+    for is_solution in leaves:
+        if is_solution:
+            leaves.close()
+            return True
+    return False
+
+
+def check(job):
+    """ Pool worker: return [(multiset, spellable)] for job's multisets. """
+    faces, multisets = job
+    return [(letters, spellable(faces, letters)) for letters in multisets]
+
+
+class Design(object):
+    """ The local search, keeping the feasibility cache. """
+    def __init__(self, phrases, pool, candidates=16, seed=None,
+                 verbose=False):
+        self.weights = {}
+        for phrase in phrases:
+            letters = multiset(phrase)
+            if letters:
+                self.weights[letters] = self.weights.get(letters, 0) + 1
+        self.pool = pool
+        self.candidates = candidates
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        # {(multiset, dice key): spellable}
+        self.cache = {}
+        self.n_solved = 0
+        self.n_cached = 0
+        self.n_inherited = 0
+
+    def key(self, faces, letters):
+        """
+        The cache key for whether faces can spell letters: letters, and
+        the dice's faces that are among letters.
+        """
+        relevant = set(letters)
+        return letters, tuple(sorted(
+            filter(None, ("".join(sorted(relevant.intersection(die_faces)))
+                          for die_faces in faces))))
+
+    def evaluate(self, jobs):
+        """
+        jobs is a list of (faces, parent results or None, letters swapped
+        or None).  Return each one's results: a dict of {multiset:
+        spellable}.  Multisets without a swapped letter are taken from
+        the parent's results; the rest come from the cache or from the
+        pool.
+        """
+        all_results = []
+        to_check = []
+        for faces, parent, swapped in jobs:
+            results = {}
+            unknown = []
+            for letters in self.weights:
+                if parent is not None \
+                        and not any(c in letters for c in swapped):
+                    results[letters] = parent[letters]
+                    self.n_inherited += 1
+                elif self.key(faces, letters) in self.cache:
+                    results[letters] = self.cache[self.key(faces, letters)]
+                    self.n_cached += 1
+                else:
+                    unknown.append(letters)
+            all_results.append(results)
+            if unknown:
+                to_check.append( (len(all_results) - 1, faces, unknown) )
+
+        answers = self.pool.map(check, [(faces, unknown)
+                                        for i, faces, unknown in to_check])
+        for (i, faces, unknown), answer in zip(to_check, answers):
+            for letters, ok in answer:
+                self.cache[self.key(faces, letters)] = ok
+                all_results[i][letters] = ok
+                self.n_solved += 1
+        return all_results
+
+    def coverage(self, results):
+        """ How many phrases results say can be spelled. """
+        return sum(self.weights[letters]
+                   for letters, ok in results.iteritems() if ok)
+
+    def swap(self, faces):
+        """
+        Return (new faces, the two letters swapped), swapping a face of
+        one die for a different letter on another die, or None if no
+        two dice have different letters to swap.
+        """
+        positions = [(i, a) for i, die_faces in enumerate(faces)
+                     for a in range(len(die_faces))]
+        self.random.shuffle(positions)
+        for i, a in positions:
+            x = faces[i][a]
+            others = [(j, b) for j, b in positions
+                      if j != i and faces[j][b] != x]
+            if others:
+                j, b = self.random.choice(others)
+                y = faces[j][b]
+                break
+        else:
+            return None
+
+        new = list(faces)
+        new[i] = "".join(sorted(faces[i][:a] + y + faces[i][a + 1:]))
+        new[j] = "".join(sorted(faces[j][:b] + x + faces[j][b + 1:]))
+        return new, x + y
+
+    def search(self, faces, seconds):
+        """
+        Hill-climb from faces for up to seconds.  Return (best faces,
+        their coverage, their results).
+        """
+        deadline = time.time() + seconds
+        results = self.evaluate([(faces, None, None)])[0]
+        score = self.coverage(results)
+        best = (faces, score, results)
+        n_phrases = sum(self.weights.values())
+        if self.verbose:
+            print "start: %d of %d phrases" % (score, n_phrases)
+        n_rounds = 0
+        while time.time() < deadline and score < n_phrases:
+            n_rounds += 1
+            swaps = [self.swap(faces) for i in range(self.candidates)]
+            swaps = [swap for swap in swaps if swap]
+            if not swaps:
+                break  # Nothing can change.
+            evaluated = self.evaluate([(new, results, swapped)
+                                       for new, swapped in swaps])
+            scores = [self.coverage(new_results) for new_results in evaluated]
+            top = max(scores)
+            if top < score:
+                continue
+
+            # Among the best candidates, pick one at random, so that
+            # sideways moves wander the flat spots.
+            k = self.random.choice([k for k, s in enumerate(scores)
+                                    if s == top])
+            faces, swapped = swaps[k]
+            results, score = evaluated[k], top
+            if score > best[1]:
+                best = (faces, score, results)
+                if self.verbose:
+                    print "round %d: %d phrases, swapped %s for %s" \
+                        % (n_rounds, score, swapped[0], swapped[1])
+                    sys.stdout.flush()
+        if self.verbose:
+            print n_rounds, "rounds,", self.n_solved, "solved,", \
+                self.n_cached, "cached,", self.n_inherited, "inherited"
+        return best
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    dice = [Die(line) for line in open(args.dice) if line.strip()]
+    phrases = [line.strip() for line in open(args.phrases) if line.strip()]
+    pool = multiprocessing.Pool(args.workers)
+    design = Design(phrases, pool, args.candidates, args.seed, args.verbose)
+    faces, score, results = design.search([die.faces for die in dice],
+                                          args.seconds)
+    pool.close()
+    pool.join()
+    for die_faces, die in sorted(zip(faces, dice)):
+        print die_faces, die.comment
+    print score, "of", len(phrases), "phrases."
+    for phrase in phrases:
+        if not results.get(multiset(phrase), True):
+            print "can't spell", phrase
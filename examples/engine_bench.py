@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+examples/engine_bench.py -- Time the search engines against each other on
+soma and spell_dice problems.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+The engines:
+
+    state   State.generate_leaves(), on the vars and constraints objects
+    arrays  SearchState (constrainer/model.py), on arrays of codes and counts
+    bits    BitSearchState (constrainer/bitsearch.py), on integer bitsets
+
+Each problem is built once (soma without the dead-region pruning, which
+the Model engines can't use, so all three search the same constraints)
+and each engine searches it until it has seen --leaves leaves or the
+search is over.  The engines guess in different orders, so their trees
+differ; leaves per second is the fairer comparison when the search is cut
+off, and the time when it isn't.
+"""
+
+import argparse
+import time
+
+from constrainer.model import Model, SearchState
+from constrainer.bitsearch import BitSearchState
+from soma import read_labels_shapes, SomaModel, PIECES_FILE
+from spell_dice import Die, SpellModel
+
+ENGINES = ["state", "arrays", "bits"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--soma", metavar="puzzle", nargs="*",
+        type=str, default=["soma_puzzles/tower.spz",
+                           "soma_puzzles/cube.spz"],
+        help="soma puzzle files")
+    parser.add_argument("--words", metavar="word", nargs="*",
+        type=str, default=["nerdshallinherit", "constrainer"],
+        help="words to spell with --dice")
+    parser.add_argument("--dice", metavar="file",
+        type=str, default="kitchen_dice.sort",
+        help="file of descriptions of dice")
+    parser.add_argument("--leaves", metavar="N",
+        type=int, default=5000,
+        help="stop each search after N leaves (0 for no limit)")
+    parser.add_argument("--engines", metavar="engine", nargs="*",
+        type=str, default=ENGINES, choices=ENGINES,
+        help="engines to compare")
+    return parser.parse_args()
+
+
+def time_search(leaves, max_leaves):
+    """ Return (n_solutions, n_leaves, seconds, finished). """
+    n_solutions = 0
+    n_leaves = 0
+    finished = True
+    start = time.time()
+    for is_solution in leaves:
+        n_leaves += 1
+        n_solutions += is_solution
+        if max_leaves and n_leaves >= max_leaves:
+            finished = False
+            break
+
+    return n_solutions, n_leaves, time.time() - start, finished
+
+
+def bench(name, state, engines, max_leaves):
+    model = Model.from_state(state)
+    for engine in engines:
+        if engine == "state":
+            search = state
+        elif engine == "arrays":
+            search = SearchState(model)
+        else:
+            search = BitSearchState(model)
+        leaves = search.generate_leaves()
+        n_solutions, n_leaves, seconds, finished = \
+            time_search(leaves, max_leaves)
+        leaves.close()
+        search.reset()
+        print "%-28s %-7s %8d solutions %8d leaves %8.3f sec. %8.0f/sec.%s" \
+            % (name, engine, n_solutions, n_leaves, seconds,
+               n_leaves / max(seconds, 1e-9), "" if finished else " (cut off)")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pieces = dict(read_labels_shapes(PIECES_FILE))
+    for puzzle in args.soma:
+        target = read_labels_shapes(puzzle)[0][1]
+        model = SomaModel(target, pieces, prune=False)
+        print puzzle, len(model.state.vars), "vars"
+        bench(puzzle, model.state, args.engines, args.leaves)
+    dice = [Die(line) for line in open(args.dice)]
+    for word in args.words:
+        model = SpellModel(word, dice)
+        print word, len(model.state.vars), "vars"
+        bench(word, model.state, args.engines, args.leaves)
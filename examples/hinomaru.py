@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+"""
+examples/hinomaru.py -- Solver for Curtis Pavel's Hinomaru puzzle, and
+others like it: make a picture out of two-sided domino-like tiles.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+The flag is a grid of white (0) and red (1) spots.  Each tile has two
+faces, each an h x 2h grid of spots, and the tiles cover the flag in
+h x h "squares", each tile across or down two squares, with one face
+showing.  hinomaru.ipynb explains the model; this is the same model made
+importable, for any flag and tiles:
+
+    model = HinomaruModel(flag, tiles)
+    for is_solution in model.state.generate_leaves():
+        if is_solution:
+            print model.solution_tile_placements()
+
+Matching faces to places is done for all places at once: the places are
+a strided sliding-window view of the flag, compared against a stack of
+the faces (and their 180-degree turns).
+
+A flag file is lines of 0/1 (or ./#) characters.  A tiles file is faces
+as blocks of h lines, separated by blank lines; each two faces in a row
+are the two sides of a tile.
+"""
+
+from sys import stdout, stderr, exit
+import argparse
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from constrainer import *
+from constrainer.tiling import Board
+from constrainer.progress import Progress
+from constrainer.transpositions import TranspositionTable
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flag", metavar="file",
+        type=str, default=None,
+        help="file with the picture to make (default: the Japanese flag)")
+    parser.add_argument("--tiles", metavar="file",
+        type=str, default=None,
+        help="file with the faces of the tiles (default: Hinomaru's)")
+    parser.add_argument("--many", "--multi", "-m",
+        action="store_true",
+        help="generate as many solutions as possible, not just one")
+    parser.add_argument("--count", "-c",
+        action="store_true",
+        help="just output a count of the number of solutions found")
+    parser.add_argument("--transpositions", metavar="N",
+        type=int, default=0,
+        help="with --count, remember the solution counts of up to N "
+             "subproblems so repeats aren't searched again")
+    parser.add_argument("--search", metavar="mode",
+        type=str, default="dfs", choices=sorted(SEARCH_MODES),
+        help="order of search: "
+             + "; ".join("%s = %s" % mode_help
+                         for mode_help in sorted(SEARCH_MODES.items())))
+    parser.add_argument("--progress", metavar="sec",
+        type=float, nargs="?", const=10.0, default=0,
+        help="every sec seconds (default 10), report leaves per second "
+             "and estimate the size of the search and the time left")
+    parser.add_argument("--verbose", "-v",
+        action="store_true",
+        help="show search progress")
+    return parser.parse_args()
+
+
+# Data by John Bohannon, from http://puzzles.bostonpython.com/hinomaru.html
+
+FLAG = [
+    (0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0),
+    (0,0,0,0,0,0,0,1,1,1,1,0,0,0,0,0,0,0),
+    (0,0,0,0,0,1,1,1,1,1,1,1,1,0,0,0,0,0),
+    (0,0,0,0,0,1,1,1,1,1,1,1,1,0,0,0,0,0),
+    (0,0,0,0,1,1,1,1,1,1,1,1,1,1,0,0,0,0),
+    (0,0,0,0,1,1,1,1,1,1,1,1,1,1,0,0,0,0),
+    (0,0,0,0,1,1,1,1,1,1,1,1,1,1,0,0,0,0),
+    (0,0,0,0,1,1,1,1,1,1,1,1,1,1,0,0,0,0),
+    (0,0,0,0,0,1,1,1,1,1,1,1,1,0,0,0,0,0),
+    (0,0,0,0,0,1,1,1,1,1,1,1,1,0,0,0,0,0),
+    (0,0,0,0,0,0,0,1,1,1,1,0,0,0,0,0,0,0),
+    (0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0),
+]
+
+TILES = [
+    (
+        ((1,1,1,1,1,1), (1,1,1,1,1,1), (1,1,1,1,1,1)),
+        ((0,1,1,1,1,1), (0,1,1,1,1,1), (0,0,1,1,1,1)),
+    ),
+    (
+        ((1,1,1,1,1,1), (1,1,1,1,1,1), (1,1,1,1,1,1)),
+        ((1,1,0,0,0,0), (1,1,0,0,0,0), (1,0,0,0,0,0)),
+    ),
+    (
+        ((1,1,1,1,1,1), (1,1,1,1,1,1), (1,1,1,1,1,1)),
+        ((0,0,0,0,0,0), (1,1,0,0,0,0), (1,1,1,1,0,0)),
+    ),
+    (
+        ((1,1,1,1,1,1), (0,1,1,1,1,0), (0,0,0,0,0,0)),
+        ((1,1,1,1,0,0), (1,1,0,0,0,0), (0,0,0,0,0,0)),
+    ),
+    (
+        ((1,1,1,1,1,1), (0,1,1,1,1,0), (0,0,0,0,0,0)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,0)),
+    ),
+    (
+        ((1,1,1,1,1,0), (1,1,1,1,1,0), (1,1,1,1,0,0)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (1,0,0,0,0,0)),
+    ),
+    (
+        ((1,1,1,1,0,0), (1,1,1,1,1,0), (1,1,1,1,1,0)),
+        ((0,0,1,1,1,1), (0,0,0,0,1,1), (0,0,0,0,0,0)),
+    ),
+    (
+        ((0,0,0,0,0,0), (0,0,0,0,1,1), (0,0,1,1,1,1)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,0)),
+    ),
+    (
+        ((0,0,1,1,1,1), (0,0,0,0,1,1), (0,0,0,0,0,0)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,1)),
+    ),
+    (
+        ((0,0,0,0,1,1), (0,0,0,0,1,1), (0,0,0,0,0,1)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,0)),
+    ),
+    (
+        ((0,0,0,0,0,1), (0,0,0,0,1,1), (0,0,0,0,1,1)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,1)),
+    ),
+    (
+        ((0,0,0,0,0,1), (0,0,0,0,0,0), (0,0,0,0,0,0)),
+        ((0,0,0,0,0,0), (0,0,0,0,0,0), (0,0,0,0,0,0)),
+    ),
+]
+
+
+def read_grid_lines(lines):
+    """ Turn lines of 0/1 or ./# characters into a tuple of tuples. """
+    rows = []
+    for line in lines:
+        row = tuple(1 if c in "1#" else 0
+                    for c in line.strip() if c in "01.#")
+        rows.append(row)
+    assert len(set(len(row) for row in rows)) == 1, \
+        "All rows of a grid must be the same length.  %r" % lines
+    return tuple(rows)
+
+
+def read_flag(filename):
+    with open(filename) as stream:
+        return read_grid_lines([line for line in stream if line.strip()])
+
+
+def read_tiles(filename):
+    """ Return a list of tiles, each a pair of faces. """
+    faces = []
+    block = []
+    with open(filename) as stream:
+        for line in list(stream) + [""]:
+            if line.strip():
+                block.append(line)
+            elif block:
+                faces.append(read_grid_lines(block))
+                block = []
+    assert len(faces) % 2 == 0, "Tiles file has an odd number of faces."
+    return [(faces[i], faces[i + 1]) for i in range(0, len(faces), 2)]
+
+
+def canonical_face(face):
+    """
+    A face and its 180-degree turn are the same face.  Return the one
+    of the two (as a tuple of tuples) that Python considers less.
+    """
+    turned = tuple(tuple(reversed(row)) for row in reversed(face))
+    return min(tuple(tuple(row) for row in face), turned)
+
+
+def sliding_windows(grid, height, width, step):
+    """
+    Return a read-only view of grid with shape (rows, cols, height,
+    width): the height x width windows whose top-left corners are at
+    multiples of step.  No data is copied.
+    """
+    rows = (grid.shape[0] - height) // step + 1
+    cols = (grid.shape[1] - width) // step + 1
+    s0, s1 = grid.strides
+    return as_strided(grid, shape=(rows, cols, height, width),
+                      strides=(s0 * step, s1 * step, s0, s1),
+                      writeable=False)
+
+
+def match_faces(flag, faces, h):
+    """
+    flag is an array, faces a list of canonical h x 2h faces.
+    Return (across, down): arrays of face numbers, across[row, col]
+    for the place starting at square (row, col) going across and
+    down[row, col] for the one going down, or -1 where no face fits.
+    """
+    stack = np.array(faces, dtype=np.int8).reshape(len(faces), -1)
+    turned = np.array(faces, dtype=np.int8)[:, ::-1, ::-1]
+    stack = np.concatenate([stack, turned.reshape(len(faces), -1)])
+    results = []
+    for windows in (sliding_windows(flag, h, 2 * h, h),
+                    # Down places, turned 90 degrees (like np.rot90) to
+                    # be across:
+                    sliding_windows(flag, 2 * h, h, h)[..., ::-1]
+                        .swapaxes(-1, -2)):
+        rows, cols = windows.shape[:2]
+        spots = windows.reshape(rows * cols, 1, -1)
+        hits = (spots == stack[np.newaxis]).all(axis=2)
+        hits = hits[:, :len(faces)] | hits[:, len(faces):]
+        face_of = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+        results.append(face_of.reshape(rows, cols))
+    return results
+
+
+class HinomaruModel(object):
+    """
+    The constraint problem for covering flag with tiles:
+     o  a var for each side of each tile: is it showing?  Exactly one
+        side of each tile shows.
+     o  a var for each place (two squares, across or down) that some face
+        fits.  Each square is in exactly one used place.
+     o  for each face, as many tiles show it as places use it.
+
+    The last one is the notebook's constrain_same_n_true(), but needing
+    no extra vars: "side A shows" is the same as "side B doesn't."
+    """
+    def __init__(self, flag, tiles, verbose=False):
+        self.flag = flag = np.array(flag, dtype=np.int8)
+        h = len(tiles[0][0])
+        self.h = h
+        assert flag.shape[0] % h == 0 and flag.shape[1] % h == 0, \
+            "The flag's size must be a multiple of the square size %d." % h
+        n_rows, n_cols = flag.shape[0] // h, flag.shape[1] // h
+        if n_rows * n_cols != 2 * len(tiles):
+            raise Exception("%d tiles can't cover %d squares."
+                            % (len(tiles), n_rows * n_cols))
+
+        self.tiles = tiles = [(canonical_face(a), canonical_face(b))
+                              for a, b in tiles]
+        self.faces = faces = sorted(set(face for tile in tiles
+                                        for face in tile))
+        face_number = dict((face, i) for i, face in enumerate(faces))
+        across, down = match_faces(flag, faces, h)
+
+        # The domino places, as placements on a Board of squares.
+        self.board = board = Board([(row, col) for row in range(n_rows)
+                                    for col in range(n_cols)])
+        places = []
+        place_faces = []
+        place_bits = []
+        for mask, bits in board.placements([(0, 0), (0, 1)]):
+            squares = sorted(board.cell(bit) for bit in bits)
+            (row, col), (row2, col2) = squares
+            orientation = "across" if row == row2 else "down"
+            face = (across if orientation == "across" else down) [row, col]
+            if face < 0:
+                continue
+
+            places.append( ((row, col), orientation) )
+            place_faces.append(int(face))
+            place_bits.append(bits)
+
+        self.state = state = State(verbose=verbose)
+        n_tiles = len(tiles)
+        self.side_vars = state.new_vars(2 * n_tiles,
+            tile=[tile for tile in tiles for side in (0, 1)],
+            side=[0, 1] * n_tiles)
+        self.place_vars = state.new_vars(len(places), place=places,
+            face=[faces[face] for face in place_faces])
+        vars = self.side_vars + self.place_vars
+
+        # For each face, showing it on k tiles and using it in k places:
+        # sum(other sides of tiles with it on one side) + sum(places)
+        #   == (tiles with it on one side) + (tiles with it on both).
+        n_needed = [0] * len(faces)
+        for tile in tiles:
+            for face in set(tile):
+                n_needed[face_number[face]] += 1
+        self.shows_one_side = state.new_constraints(n_tiles, 1, 1,
+                                                    tile=tiles)
+        self.under_one_tile = state.new_constraints(len(board.bits), 1, 1,
+            square=[board.cell(bit) for bit in board.bits])
+        self.shows_eq_places = state.new_constraints(len(faces),
+            n_needed, n_needed, face=faces)
+        constraints = self.shows_one_side + self.under_one_tile \
+                      + self.shows_eq_places
+        square_number = dict((bit, len(tiles) + i)
+                             for i, bit in enumerate(board.bits))
+        face_constraint = len(tiles) + len(board.bits)
+        constraint_indices = []
+        var_indices = []
+        for i, (a, b) in enumerate(tiles):
+            for side in (0, 1):
+                constraint_indices.append(i)
+                var_indices.append(2 * i + side)
+            if a != b:
+                # Side 1 not showing means side 0, face a, shows.
+                constraint_indices += [face_constraint + face_number[a],
+                                       face_constraint + face_number[b]]
+                var_indices += [2 * i + 1, 2 * i]
+        for j, bits in enumerate(place_bits):
+            var_index = 2 * n_tiles + j
+            for bit in bits:
+                constraint_indices.append(square_number[bit])
+                var_indices.append(var_index)
+            constraint_indices.append(face_constraint + place_faces[j])
+            var_indices.append(var_index)
+        state.constrain_incidence(constraints, vars,
+                                  constraint_indices, var_indices)
+
+    def solution_square_places(self):
+        """ At a solution, return a dict of {square: place}. """
+        square_places = {}
+        for constraint in self.under_one_tile:
+            for var in constraint[True]:
+                square_places[constraint.square] = var.place
+        return square_places
+
+    def solution_tile_placements(self):
+        """
+        At a solution, return a dict of {tile number: (side, place)}.
+        Tiles showing the same face go to its places in arbitrary order.
+        """
+        places_of = {}
+        for var in self.place_vars:
+            if var.value == True:
+                places_of.setdefault(var.face, []).append(var.place)
+        placements = {}
+        for var in self.side_vars:
+            if var.value == True:
+                i = self.side_vars.index(var) // 2
+                placements[i] = (var.side,
+                                 places_of[var.tile[var.side]].pop())
+        return placements
+
+
+def board_pic(flag, h, square_places):
+    """
+    Return a typewriter picture (a list of lines) of the flag with the
+    outlines of the tiles.
+    """
+    n_rows, n_cols = flag.shape[0] // h, flag.shape[1] // h
+    lines = []
+    for row in range(n_rows + 1):
+        line = "+"
+        for col in range(n_cols):
+            edge = row in (0, n_rows) or square_places[(row - 1, col)] \
+                                         != square_places[(row, col)]
+            line += ("--" if edge else "  ") * h + "+"
+        lines.append(line)
+        if row == n_rows:
+            break
+
+        for y in range(row * h, (row + 1) * h):
+            line = "|"
+            for col in range(n_cols):
+                line += "".join("##" if flag[y, x] else "  "
+                                for x in range(col * h, (col + 1) * h))
+                edge = col == n_cols - 1 or square_places[(row, col)] \
+                                            != square_places[(row, col + 1)]
+                line += "|" if edge else " "
+            lines.append(line)
+    return lines
+
+
+def solve(model, multi=False, just_count=False, verbose=False,
+          n_transpositions=0, mode="dfs", progress=0):
+    state = model.state
+    if just_count and n_transpositions:
+        table = TranspositionTable(n_transpositions)
+        n_solutions, n_deadends = state.count_solutions(table, verbose)
+        print len(table), "subproblems stored,", table.hits, "repeats skipped."
+        return n_solutions, n_deadends
+
+    n_solutions = 0
+    n_deadends = 0
+    leaves = state.generate_leaves(verbose, mode=mode)
+    if progress:
+        leaves = Progress(state, progress).leaves(leaves)
+    for is_solution in leaves:
+        if not is_solution:
+            n_deadends += 1
+            continue
+
+        n_solutions += 1
+        if just_count:
+            continue
+
+        print "==== solution", n_solutions, "depth", "%d," % state.depth(),
+        print n_deadends, "dead ends ===="
+        print "\n".join(board_pic(model.flag, model.h,
+                                  model.solution_square_places()))
+        placements = model.solution_tile_placements()
+        for i in sorted(placements):
+            side, ((row, col), orientation) = placements[i]
+            print "tile %d side %d: row %d col %d %s" \
+                % (i + 1, side + 1, row + 1, col + 1, orientation)
+        print
+        stdout.flush()
+        if not multi:
+            break
+
+    return n_solutions, n_deadends
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    flag = read_flag(args.flag) if args.flag else FLAG
+    tiles = read_tiles(args.tiles) if args.tiles else TILES
+    start = time.clock()
+    model = HinomaruModel(flag, tiles, verbose=args.verbose)
+    print len(model.place_vars), "places fit faces,", \
+          time.clock() - start, "sec. to set up."
+    n_solutions, n_deadends = solve(model, args.many, args.count,
+                                    args.verbose, args.transpositions,
+                                    args.search, args.progress)
+    if args.count or args.many:
+        print n_solutions, "solutions."
+    if n_solutions == 0:
+        if not args.count:
+            print >>stderr, "No solutions."
+    print n_deadends, "dead ends", time.clock() - start, "sec."
+    if n_solutions == 0:
+        exit(1)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+examples/intvar_compare.py -- Compare the BoolVar and IntVar models of
+soma and spell_dice problems: objects made and their bytes, and
+constraint wake-ups and time for a full count of the solutions.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+The BoolVar models are SomaModel (without pruning) and SpellModel, with
+a BoolVar per placement of a piece or per letter of a die.  The IntVar
+models are SomaIntModel and SpellIntModel, with an IntVar per piece or
+die, and Among views of them in the constraints (see
+constrainer/intvar.py).
+
+A wake-up is a call to a constraint's notice_change() (a var in it
+changed) or propagate() (it had inferences to make).
+
+With --modes, each model's solutions are also counted with every search
+mode (see SEARCH_MODES), as a check that they all agree.  With --hashes,
+each IntVar is fixed to each of its values in turn, as a check that
+they all give different State.hash values.
+"""
+
+import argparse
+import time
+
+from constrainer import *
+from soma import read_labels_shapes, SomaModel, SomaIntModel, PIECES_FILE
+from spell_dice import Die, SpellModel, SpellIntModel
+
+_wakeups = [0]
+
+
+def _counted(method):
+    def wrapper(*args):
+        _wakeups[0] += 1
+        return method(*args)
+    return wrapper
+
+BoolConstraint.notice_change = _counted(BoolConstraint.notice_change)
+BoolConstraint.propagate = _counted(BoolConstraint.propagate)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--soma", metavar="puzzle", nargs="*",
+        type=str, default=["soma_puzzles/tower.spz"],
+        help="soma puzzle files")
+    parser.add_argument("--words", metavar="word", nargs="*",
+        type=str, default=["nerdshallinherit", "constrainer"],
+        help="words to spell with --dice")
+    parser.add_argument("--dice", metavar="file",
+        type=str, default="kitchen_dice.sort",
+        help="file of descriptions of dice")
+    parser.add_argument("--modes",
+        action="store_true",
+        help="also count the solutions with each search mode, and "
+             "report if the counts differ")
+    parser.add_argument("--hashes",
+        action="store_true",
+        help="also check that fixing an IntVar to different values "
+             "gives different hashes")
+    return parser.parse_args()
+
+
+def n_objects(state):
+    """ Return (n vars, n Amongs, n constraints) of state. """
+    n_amongs = sum(len(var.amongs) for var in state.int_vars)
+    return len(state.vars) + len(state.int_vars), n_amongs, \
+           len(state.constraints)
+
+
+def check_modes(name, kind, state):
+    """
+    Count state's solutions with each search mode.  Return True if
+    the counts agree.
+    """
+    counts = dict((mode, sum(state.generate_leaves(mode=mode)))
+                  for mode in sorted(SEARCH_MODES))
+    agree = len(set(counts.values())) == 1
+    print "%-24s %-4s" % (name, kind),
+    print " ".join("%s %d" % item for item in sorted(counts.items())),
+    print "" if agree else "MISMATCH"
+    return agree
+
+
+def check_hashes(name, kind, state):
+    """
+    Fix each of state's IntVars to each of its values in turn, without
+    propagating.  Return True if the values of each var all give
+    different hashes.
+    """
+    state.enable_hashing()
+    n_collisions = 0
+    for var in state.int_vars:
+        hashes = set()
+        for i in range(len(var.values)):
+            state.push()
+            var.set(1 << i)
+            hashes.add(state.hash)
+            state.pop()
+        n_collisions += len(var.values) - len(hashes)
+    print "%-24s %-4s %d IntVars, %d hash collisions" \
+        % (name, kind, len(state.int_vars), n_collisions)
+    return n_collisions == 0
+
+
+def compare(name, models, modes=False, hashes=False):
+    for kind, model in models:
+        n_vars, n_amongs, n_constraints = n_objects(model.state)
+        n_bytes = model.state.memory_report().total()
+        _wakeups[0] = 0
+        start = time.time()
+        n_solutions = 0
+        n_leaves = 0
+        for is_solution in model.state.generate_leaves():
+            n_leaves += 1
+            n_solutions += is_solution
+        print "%-24s %-4s %5d vars %5d amongs %4d constraints %7d bytes " \
+              "%7d solutions %7d leaves %9d wake-ups %7.2f sec." \
+            % (name, kind, n_vars, n_amongs, n_constraints, n_bytes,
+               n_solutions, n_leaves, _wakeups[0], time.time() - start)
+        if modes:
+            check_modes(name, kind, model.state)
+        if hashes and model.state.int_vars:
+            check_hashes(name, kind, model.state)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pieces = dict(read_labels_shapes(PIECES_FILE))
+    for puzzle in args.soma:
+        target = read_labels_shapes(puzzle)[0][1]
+        compare(puzzle, [("bool", SomaModel(target, pieces, prune=False)),
+                         ("int", SomaIntModel(target, pieces))],
+                args.modes, args.hashes)
+    dice = [Die(line) for line in open(args.dice)]
+    for word in args.words:
+        compare(word, [("bool", SpellModel(word, dice)),
+                       ("int", SpellIntModel(word, dice))],
+                args.modes, args.hashes)
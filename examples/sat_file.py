@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+examples/sat_file.py -- Solve or count the solutions of a DIMACS CNF or
+OPB file, or convert between the two.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+    sat_file.py problem.cnf              # print one solution
+    sat_file.py problem.opb --count      # count them
+    sat_file.py problem.opb --write problem.cnf
+
+Files ending in .opb are read as OPB, anything else as CNF.  A solution
+is printed as DIMACS prints them: "v" lines of literals, ending in 0.
+Only the file's own variables are printed or counted, so negation vars
+and the like don't make one solution look like several.  A file written
+by write_dimacs() has helper variables of its own, after the problem's;
+use --vars N to print and count only the first N.
+"""
+
+from sys import stdout, exit
+import argparse
+import time
+
+from constrainer import *
+from constrainer.formats import read_dimacs, read_opb, \
+                                write_dimacs, write_opb
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file",
+        type=str,
+        help="the .cnf or .opb file to read")
+    parser.add_argument("--write", metavar="file",
+        type=str, default=None,
+        help="write the problem to file (.cnf or .opb) instead of solving")
+    parser.add_argument("--vars", metavar="N",
+        type=int, default=None,
+        help="print and count only the first N variables of solutions")
+    parser.add_argument("--many", "--multi", "-m",
+        action="store_true",
+        help="generate as many solutions as possible, not just one")
+    parser.add_argument("--count", "-c",
+        action="store_true",
+        help="just output a count of the number of solutions found")
+    parser.add_argument("--verbose", "-v",
+        action="store_true",
+        help="show search progress")
+    return parser.parse_args()
+
+
+def read_file(filename):
+    """ Return (state, vars) from a .opb or .cnf file. """
+    if filename.endswith(".opb"):
+        return read_opb(filename)[:2]
+
+    return read_dimacs(filename)
+
+
+def solve(state, vars, multi=False, just_count=False, verbose=False):
+    # Different values of helper vars can make the same solution, so
+    # the search is projected onto vars: each combination of their
+    # values that's part of a solution comes up once.
+    n_solutions = 0
+    n_deadends = 0
+    for is_solution in state.generate_projected(vars, verbose):
+        if not is_solution:
+            n_deadends += 1
+            continue
+
+        n_solutions += 1
+        if just_count:
+            continue
+
+        values = [var.value for var in vars]
+        print "c solution", n_solutions, "depth", "%d," % state.depth(),
+        print n_deadends, "dead ends"
+        print "v", " ".join(str(i + 1 if value else -(i + 1))
+                            for i, value in enumerate(values)), 0
+        stdout.flush()
+        if not multi:
+            break
+
+    return n_solutions, n_deadends
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    start = time.clock()
+    state, vars = read_file(args.file)
+    vars = vars[:args.vars]
+    print "c", len(vars), "variables,", len(state.vars), "vars,", \
+          len(state.constraints), "constraints,", \
+          time.clock() - start, "sec. to read."
+    if args.write:
+        write = write_opb if args.write.endswith(".opb") else write_dimacs
+        write(state, args.write)
+        print "c wrote", args.write, time.clock() - start, "sec."
+        exit(0)
+
+    n_solutions, n_deadends = solve(state, vars, args.many, args.count,
+                                    args.verbose)
+    if args.count or args.many:
+        print "c", n_solutions, "solutions."
+    if n_solutions == 0:
+        print "s UNSATISFIABLE"
+    elif not args.many and not args.count:
+        print "s SATISFIABLE"
+    print "c", n_deadends, "dead ends", time.clock() - start, "sec."
+    if n_solutions == 0:
+        exit(20)
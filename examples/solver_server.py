@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+"""
+examples/solver_server.py -- A long-running server for soma and spell_dice
+requests, keeping parsed files and built models warm between requests.
+
+    Copyright (c) 2013 Steve Witham All rights reserved.
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Requests and responses are JSON objects, one per line, on stdin/stdout
+or (with --socket) on connections to a Unix socket.  Requests:
+
+    {"id": 1, "op": "solve", "problem": "soma",
+     "puzzle": "soma_puzzles/cube.spz", "pieces": "soma_puzzles/soma_pieces.spc",
+     "default_guess": false, "max_solutions": 1, "deadline": 10.0,
+     "engine": "bits"}
+    {"id": 2, "op": "count", "problem": "spell_dice",
+     "word": "nerdshallinherit", "dice": "kitchen_dice.sort"}
+    {"id": 3, "op": "cancel", "request": 2}
+    {"id": 4, "op": "stats"}
+
+"pieces", "dice", "default_guess", "max_solutions" (for solve; 0 means
+all), "deadline" (seconds) and "engine" are optional.  "engine" is
+"arrays" (SearchState, the default) or "bits" (BitSearchState, see
+constrainer/bitsearch.py), which is faster on problems this size.  Every request gets one
+response with the same id and a "status" of "ok", "cancelled",
+"timeout" or "error".  A solve or count needs an "id" (a number or a
+string) that no other queued or running request has; it's how cancel
+finds it.  Its deadline counts from when it arrives, time in the queue
+included.
+
+Requests run concurrently on a pool of worker threads.  (Threads share
+one interpreter, so this is about latency--a quick request doesn't wait
+behind a long one--not about using more cores.)  Each problem is built
+once, as a Model (see constrainer/model.py); every request gets its own
+SearchState or BitSearchState over it, so requests for the same problem run at the same
+time without copies.  Cancelling a request, or its deadline passing,
+stops its search before the next step of generate_leaves().  So does
+the client closing its --socket connection, for the requests it sent.
+"""
+
+import argparse
+import json
+import os
+import Queue
+import SocketServer
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from constrainer.model import Model, SearchState
+from constrainer.bitsearch import BitSearchState
+from soma import read_labels_shapes, SomaModel, PIECES_FILE
+from spell_dice import Die, SpellModel
+
+ENGINES = {"arrays": SearchState, "bits": BitSearchState}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", metavar="path",
+        type=str, default=None,
+        help="listen on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--workers", metavar="N",
+        type=int, default=4,
+        help="number of requests to work on at once")
+    parser.add_argument("--cache_size", metavar="N",
+        type=int, default=64,
+        help="number of parsed files and of models to keep")
+    return parser.parse_args()
+
+
+class LRUCache(object):
+    """ A dict that forgets its least-recently-used entries. """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, make):
+        """ Return the value for key, calling make() to create it if new. """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                value = self.entries.pop(key)
+                self.entries[key] = value
+                return value
+
+            self.misses += 1
+        # Make it outside the lock; two threads might both make it.
+        value = make()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+
+def is_id(x):
+    """ Is x usable as a request id: a number or a string? """
+    return isinstance(x, (int, long, float, basestring)) \
+           and not isinstance(x, bool)
+
+
+class Job(object):
+    """ One solve or count request, queued or running. """
+    def __init__(self, request, respond):
+        self.request = request
+        self.id = request.get("id")
+        self.respond = respond
+        self.lock = threading.Lock()
+        self.search = None  # The SearchState, while running.
+        self.stop_reason = None  # "cancelled" or "timeout"
+        self.timer = None  # Stops the job at its deadline.
+
+    def stop(self, reason):
+        with self.lock:
+            if self.stop_reason is None:
+                self.stop_reason = reason
+            if self.search is not None:
+                self.search.cancel()
+
+
+class Server(object):
+    def __init__(self, n_workers, cache_size):
+        self.files = LRUCache(cache_size)
+        self.models = LRUCache(cache_size)
+        self.queue = Queue.Queue()
+        self.jobs = {}
+        self.jobs_lock = threading.Lock()
+        for i in range(n_workers):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+
+    def handle(self, line, respond):
+        """
+        Take one request line; respond(dict) will be called later.
+        Return the Job if a solve or count was queued, else None.
+        """
+        try:
+            request = json.loads(line)
+            op = request["op"]
+        except (ValueError, KeyError, TypeError) as e:
+            respond({"id": None, "status": "error", "error": str(e)})
+            return
+
+        if op in ("solve", "count"):
+            job = Job(request, respond)
+            if not is_id(job.id):
+                respond({"id": job.id, "status": "error",
+                         "error": "a %s needs a number or string id" % op})
+                return
+
+            with self.jobs_lock:
+                duplicate = job.id in self.jobs
+                if not duplicate:
+                    self.jobs[job.id] = job
+            if duplicate:
+                respond({"id": job.id, "status": "error",
+                         "error": "id %r is already in use" % job.id})
+                return
+
+            if request.get("deadline") is not None:
+                job.timer = threading.Timer(request["deadline"], job.stop,
+                                            ["timeout"])
+                job.timer.daemon = True
+                job.timer.start()
+            self.queue.put(job)
+            return job
+        elif op == "cancel":
+            if not is_id(request.get("request")):
+                respond({"id": request.get("id"), "status": "error",
+                         "error": "cancel needs the number or string id "
+                                  "of a request"})
+                return
+
+            with self.jobs_lock:
+                job = self.jobs.get(request["request"])
+            if job:
+                job.stop("cancelled")
+            respond({"id": request.get("id"), "status": "ok",
+                     "cancelled": job is not None})
+        elif op == "stats":
+            respond({"id": request.get("id"), "status": "ok",
+                     "queued": self.queue.qsize(),
+                     "models_built": self.models.misses,
+                     "models_reused": self.models.hits,
+                     "file_hits": self.files.hits,
+                     "file_misses": self.files.misses})
+        else:
+            respond({"id": request.get("id"), "status": "error",
+                     "error": "unknown op %r" % op})
+
+    def is_current(self, job):
+        """ Is job still queued or running? """
+        with self.jobs_lock:
+            return self.jobs.get(job.id) is job
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                response = self.run(job)
+            except Exception as e:
+                response = {"status": "error",
+                            "error": "%s: %s" % (type(e).__name__, e)}
+            if job.timer:
+                job.timer.cancel()
+            with self.jobs_lock:
+                self.jobs.pop(job.id, None)
+            response["id"] = job.id
+            job.respond(response)
+
+    def read_file(self, filename, parse):
+        """
+        Return (key, parsed file).  The key changes when the file does,
+        so models built from the file can be cached by it too.
+        """
+        key = (filename, os.path.getmtime(filename))
+        return key, self.files.get(key, lambda: parse(filename))
+
+    def problem(self, request):
+        """
+        Return (key, build, extract) for a request: the model-cache key,
+        a function to build the problem's model object, and a function
+        of that and a SearchState that returns the current solution as
+        something JSON can encode.
+        """
+        kind = request["problem"]
+        if kind == "soma":
+            pieces_file = request.get("pieces", PIECES_FILE)
+            pieces_key, pieces = self.read_file(pieces_file,
+                                                read_labels_shapes)
+            puzzle_key, shapes = self.read_file(request["puzzle"],
+                                                read_labels_shapes)
+            target = shapes[0][1]
+            key = ("soma", pieces_key, puzzle_key)
+            build = lambda: SomaModel(target, dict(pieces))
+            def extract(model, search):
+                board = model.tiling.board
+                unused = set(model.tiling.unused_vars.values())
+                return dict((var.piece, board.mask_cells(var.mask))
+                            for var in search.true_vars()
+                            if var not in unused)
+        elif kind == "spell_dice":
+            dice_file = request.get("dice", "kitchen_dice.sort")
+            dice_key, dice = self.read_file(dice_file,
+                lambda filename: [Die(line) for line in open(filename)])
+            word = request["word"]
+            key = ("spell_dice", dice_key, word)
+            build = lambda: SpellModel(word, dice)
+            def extract(model, search):
+                letter_dice = {}
+                for var in search.true_vars():
+                    letter_dice.setdefault(var.letter, []).append(var.die)
+                return [(letter, letter_dice[letter].pop().faces)
+                        for letter in model.word]
+        else:
+            raise ValueError("unknown problem %r" % kind)
+
+        return key, build, extract
+
+    def build(self, build):
+        """ Build a problem's model, and the shared Model of it. """
+        model = build()
+        return model, Model.from_state(model.state)
+
+    def run(self, job):
+        if job.stop_reason:
+            return {"status": job.stop_reason}
+
+        request = job.request
+        key, build, extract = self.problem(request)
+        engine = request.get("engine", "arrays")
+        if engine not in ENGINES:
+            raise ValueError("unknown engine %r" % engine)
+
+        model, shared = self.models.get(key, lambda: self.build(build))
+        search = ENGINES[engine](shared)
+        with job.lock:
+            job.search = search
+            stopped = job.stop_reason is not None
+        if stopped:
+            search.cancel()
+        start = time.time()
+        just_count = request["op"] == "count"
+        max_solutions = request.get("max_solutions", 1)
+        solutions = []
+        n_solutions = 0
+        n_deadends = 0
+        try:
+            leaves = search.generate_leaves(
+                default_guess=request.get("default_guess"))
+            for is_solution in leaves:
+                if not is_solution:
+                    n_deadends += 1
+                    continue
+
+                n_solutions += 1
+                if just_count:
+                    continue
+
+                solutions.append(extract(model, search))
+                if max_solutions and n_solutions >= max_solutions:
+                    leaves.close()
+                    break
+        finally:
+            with job.lock:
+                job.search = None
+            search.reset()
+
+        response = {"status": job.stop_reason or "ok",
+                    "dead_ends": n_deadends,
+                    "seconds": round(time.time() - start, 6)}
+        if just_count:
+            response["count"] = n_solutions
+        else:
+            response["solutions"] = solutions
+        return response
+
+
+def line_writer(stream):
+    """ Return a thread-safe respond(dict) that writes JSON lines. """
+    lock = threading.Lock()
+    def respond(response):
+        line = json.dumps(response) + "\n"
+        with lock:
+            try:
+                stream.write(line)
+                stream.flush()
+            except (IOError, ValueError, AttributeError):
+                # The client went away.  (A socket's file, once its
+                # connection is closed, raises AttributeError.)
+                pass
+    return respond
+
+
+def serve_stdio(server):
+    respond = line_writer(sys.stdout)
+    for line in iter(sys.stdin.readline, ""):
+        if line.strip():
+            server.handle(line, respond)
+    # Let queued and running requests finish before exiting.
+    while server.jobs:
+        time.sleep(0.05)
+
+
+def serve_socket(server, path):
+    class Handler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            respond = line_writer(self.wfile)
+            # This connection's jobs that may still be queued or running.
+            jobs = []
+            try:
+                for line in iter(self.rfile.readline, ""):
+                    if line.strip():
+                        job = server.handle(line, respond)
+                        if job:
+                            jobs = [old for old in jobs
+                                    if server.is_current(old)] + [job]
+            finally:
+                # The client is gone; nobody will read the answers.
+                for job in jobs:
+                    if server.is_current(job):
+                        job.stop("cancelled")
+
+    if os.path.exists(path):
+        os.remove(path)
+    listener = SocketServer.ThreadingUnixStreamServer(path, Handler)
+    listener.daemon_threads = True
+    try:
+        listener.serve_forever()
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = Server(args.workers, args.cache_size)
+    if args.socket:
+        serve_socket(server, args.socket)
+    else:
+        serve_stdio(server)
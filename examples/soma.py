@@ -13,6 +13,12 @@ import time
 import argparse
 
 from constrainer.ddict import ddict
+from constrainer.tiling import Board, Tiling, normalize, orientations, popcount
+from constrainer.solutions import SolutionWriter
+from constrainer.memory import watch_trail
+from constrainer.portfolio import run_portfolio, apply_solution
+from constrainer.progress import Progress
+from constrainer.transpositions import TranspositionTable
 
 def parse_args():
     parser = argparse.ArgumentParser(description=__doc__)
@@ -29,6 +35,56 @@ def parse_args():
     parser.add_argument("--count", "-c",
         action="store_true",
         help="just output a count of the number of solutions found")
+    parser.add_argument("--save", metavar="file",
+        type=str, default=None,
+        help="write solutions to a binary solution file instead of printing")
+    parser.add_argument("--dedup",
+        action="store_true",
+        help="with --save, don't write a solution twice")
+    parser.add_argument("--transpositions", metavar="N",
+        type=int, default=0,
+        help="with --count, remember the solution counts of up to N "
+             "subproblems so repeats aren't searched again")
+    parser.add_argument("--prune",
+        action="store_true",
+        help="look for empty pockets no set of pieces can fill "
+             "(see DeadRegionPropagator)")
+    parser.add_argument("--lazy",
+        action="store_true",
+        help="make each placement's var only when the search gets to "
+             "it, guessing Dancing-Links style (for big targets; not with "
+             "--save, --transpositions, --prune or a --search other than "
+             "dfs)")
+    parser.add_argument("--search", metavar="mode",
+        type=str, default="dfs", choices=sorted(SEARCH_MODES),
+        help="order of search: "
+             + "; ".join("%s = %s" % mode_help
+                         for mode_help in sorted(SEARCH_MODES.items())))
+    parser.add_argument("--progress", metavar="sec",
+        type=float, nargs="?", const=10.0, default=0,
+        help="every sec seconds (default 10), report leaves per second "
+             "and estimate the size of the search and the time left "
+             "(not with --transpositions)")
+    parser.add_argument("--portfolio",
+        action="store_true",
+        help="look for one solution several ways at once, in parallel "
+             "processes, and take the first answer")
+    parser.add_argument("--timeout", metavar="sec",
+        type=float, default=None,
+        help="with --portfolio, give up after sec seconds")
+    parser.add_argument("--record", metavar="file",
+        type=str, default=None,
+        help="with --portfolio, append each run's config and stats to "
+             "file as JSON lines")
+    parser.add_argument("--core", metavar="leaves",
+        type=int, nargs="?", const=5000, default=None,
+        help="if there's no solution, find a small set of bloxels, "
+             "pieces and size rules that can't all be satisfied, giving "
+             "each try up to leaves leaves (default 5000; 0 for no "
+             "limit, which makes the set minimal but can take long)")
+    parser.add_argument("--memory",
+        action="store_true",
+        help="show how many bytes the model and the search trail take")
     parser.add_argument("--verbose", "-v",
         action="store_true",
         help="show search progress")
@@ -144,7 +200,7 @@ def read_label_shape(stream):
     assert len(chars) == 1, \
         "Should be only one significant character in a shape, not %s" % chars
 
-    return list(chars)[0], canonical_shape_copy(shape)
+    return list(chars)[0], normalize(shape)
 
 
 def read_labels_shapes(filename):
@@ -163,64 +219,14 @@ def read_labels_shapes(filename):
     return results
 
 
-def canonical_shape_copy(shape):
-    """ A shape is in canonical form when the mininums of x, y & z are zero. """
-    mins = [min(pt[dim] for pt in shape) for dim in range(3)]
-    new = [tuple(pt[dim] - mins[dim] for dim in range(3)) for pt in shape]
-    return tuple(sorted(new))
-
-
-def rotate_shape_copy(shape, dim1, dim2):
-    new_shape = []
-    for pt in shape:
-        new_pt = list(pt)
-        new_pt[dim1] = -pt[dim2]
-        new_pt[dim2] = pt[dim1]
-        new_shape.append(new_pt)
-    return canonical_shape_copy(new_shape)
-
-
-def all_unique_rotations(shape):
-    rotations = set()
-    shape1 = canonical_shape_copy(shape)
-    for i in range(4):
-        shape1 = rotate_shape_copy(shape1, 0, 1)
-        shape2 = canonical_shape_copy(shape1)
-        for j in range(4):
-            shape2 = rotate_shape_copy(shape2, 1, 2)
-            shape3 = canonical_shape_copy(shape2)
-            for k in range(4):
-                shape3 = rotate_shape_copy(shape3, 0, 2)
-                rotations.add(shape3)
-    return list(rotations)
-
-
-def translate_shape(shape, dx, dy, dz):
-    return tuple((x + dx, y + dy, z + dz) for x, y, z in shape)
-
-
-def all_translations_fitting(shape, target):
-    t_sizes = tuple(max(pt[dim] for pt in target) + 1 for dim in range(3))
-    s_sizes = tuple(max(pt[dim] for pt in shape) + 1 for dim in range(3))
-    target_set = set(target)
-    survivors = []
-    for dx in range(t_sizes[0] - s_sizes[0] + 1):
-        for dy in range(t_sizes[1] - s_sizes[1] + 1):
-            for dz in range(t_sizes[2] - s_sizes[2] + 1):
-                candidate = translate_shape(shape, dx, dy, dz)
-                if all(pt in target_set for pt in candidate):
-                    survivors.append(candidate)
-    return survivors
-
-
 def all_orientations_fitting(piece, target):
     """
     An "orientation" is a combination of a rotation and a translation
     of a specific puzzle piece.
     """
-    shapes = sum((all_translations_fitting(rs, target)
-                for rs in all_unique_rotations(piece.shape)), [])
-    return [Orientation(piece, shape) for shape in shapes]
+    board = Board(target)
+    return [Orientation(piece, tuple(board.cell(bit) for bit in bits))
+            for mask, bits in board.placements(piece.shape)]
 
 
 def range_cover(values, step=1):
@@ -303,7 +309,7 @@ def show_rotations(filenames):
     for filename in filenames:
         for label, shape in read_labels_shapes(filename):
             print label + ":", shape
-            rotations = all_unique_rotations(shape)
+            rotations = orientations(shape)
             print len(rotations), "rotations:"
             print
             print_array_of_pics([shape_to_pic(s) for s in rotations])
@@ -312,8 +318,8 @@ def show_rotations(filenames):
 def show_first_orientations(shapes_filename, target_filename):
     target_label, target = read_labels_shapes(target_filename) [0]
     for label, shape in read_labels_shapes(shapes_filename):
-        orientations = all_orientations_fitting(Piece(label, shape), target)
-        print label, len(orientations), "orientations"
+        fitting = all_orientations_fitting(Piece(label, shape), target)
+        print label, len(fitting), "orientations"
             
 
 def show_first_rotations():
@@ -344,105 +350,498 @@ def sufficient_pieces(n_pieces_of, target_size):
     return populations            
 
 
-def get_n_unused(pieces, target):
-    # Find how many pieces of each size must be *un* used,
-    # in order to fill the number of voxels in target.
-    # If there is no workable "population", raise "can't".
-    # If more than one, "no unique # of pieces, sorry!"
-    #     (i.e. punt on that till later.  Probably should loosen
-    #      number-of-each-size constraints in that case.)
+def populations(pieces, target):
+    """
+    Return ({size_of_piece: how_many_that_size_we_have...}, the list of
+    "populations" of pieces that fill the number of bloxels in target),
+    or raise an Exception if there are none.
+    """
     n_pieces_of = ddict[int] ()
     for piece in pieces:
         n_pieces_of[len(piece.shape)] += 1
 
-    populations = sufficient_pieces(n_pieces_of, len(target))
-    if not populations:
+    popus = sufficient_pieces(n_pieces_of, len(target))
+    if not popus:
         raise Exception("The pieces can't fill the %d bloxel target shape." 
                         % len(target))
 
-    if len(populations) > 1:
-        raise Exception("Multiple subsets of piece sizes can be used, sorry!")
-        
-    popu = populations[0]
-    return dict((size, n_pieces_of[size] - popu[size]) for size in n_pieces_of)    
+    return n_pieces_of, popus
+
+
+def unused_ranges(pieces, target):
+    """
+    Return a dict of {piece size: (fewest, most)}: how many pieces of
+    each size can go unused, over all the populations.
+    """
+    n_pieces_of, popus = populations(pieces, target)
+    return dict((size, (n_pieces_of[size] - max(popu[size]
+                                                for popu in popus),
+                        n_pieces_of[size] - min(popu[size]
+                                                for popu in popus)))
+                for size in n_pieces_of)
+
+
+# Colorings of the bloxels for why_impossible(): (name, function of a
+# point, number of colors).
+COLORINGS = [("checkerboard", lambda point: sum(point) % 2, 2),
+             ("diagonal 3-coloring", lambda point: sum(point) % 3, 3),
+             ("x layers", lambda point: point[0] % 2, 2),
+             ("y layers", lambda point: point[1] % 2, 2),
+             ("z layers", lambda point: point[2] % 2, 2),
+             ("parity of x, y and z",
+              lambda point: point[0] % 2 * 4 + point[1] % 2 * 2 + point[2] % 2,
+              8)]
+
+
+def why_impossible(target, piece_shapes):
+    """
+    Look for a reason, short of searching, that no set of the pieces
+    can fill target, and return it as a string, or None if none is found.
+
+    The checks: that some population of piece sizes adds up to the
+    target's size, that every bloxel is covered by some placement of
+    some piece, and for each of COLORINGS, that the pieces can cover as
+    many bloxels of each color as the target has.  For the colorings,
+    each piece can cover any of the color counts of its placements, or
+    nothing if unused, and the sets of reachable totals are built up a
+    piece at a time; the totals are bounded by the target's counts.
+    """
+    pieces = [Piece(label, piece_shapes[label])
+              for label in sorted(piece_shapes)]
+    try:
+        populations(pieces, target)
+    except Exception as e:
+        return str(e)
+
+    board = Board(target)
+    placements = [board.placements(piece.shape) for piece in pieces]
+    covered = 0
+    for piece_placements in placements:
+        for mask, bits in piece_placements:
+            covered |= mask
+    if covered != board.mask:
+        return "no piece fits at bloxel %s" % " ".join(Bloxel.name(point)
+                   for point in board.mask_cells(board.mask & ~covered))
+
+    for name, color_of, n_colors in COLORINGS:
+        # A list of counts, one per color, is packed into an int, with
+        # room in each field for twice the target's count plus a guard
+        # bit, so counts add as ints, and a total is within the goal if
+        # subtracting it from the goal leaves every guard bit set.
+        colors = dict((bit, color_of(board.cell(bit))) for bit in board.bits)
+        goal_counts = [0] * n_colors
+        for bit in board.bits:
+            goal_counts[colors[bit]] += 1
+        width = (2 * max(goal_counts)).bit_length() + 1
+        guards = sum(1 << (width * color + width - 1)
+                     for color in range(n_colors))
+        goal = sum(n << (width * color)
+                   for color, n in enumerate(goal_counts))
+        totals = set([0])
+        for piece_placements in placements:
+            choices = set([0])
+            for mask, bits in piece_placements:
+                choices.add(sum(1 << (width * colors[bit]) for bit in bits))
+            totals = set(total for total in
+                         (before + choice
+                          for before in totals for choice in choices)
+                         if (goal + guards - total) & guards == guards)
+        if goal not in totals:
+            return "with a %s, the target has %s bloxels of each color, " \
+                   "which the pieces can't cover" % (name, goal_counts)
+
+    return None
+
+
+def subset_sums(sizes):
+    """
+    Return the sums of the subsets of sizes (a list, repeats allowed) as
+    a bitmask: bit n is set if some subset adds up to n.
+    """
+    sums = 1
+    for size in sizes:
+        sums |= sums << size
+    return sums
+
+
+class DeadRegionPropagator(Propagator):
+    """
+    Watches the placement and unused vars of a Tiling.  Whenever they
+    change, it finds the connected pockets of empty bloxels, and reports
+    a conflict if some pocket's size isn't the total size of any set of
+    the pieces not yet placed.  It also rules out placements that would
+    leave the rest of a pocket unfillable.
+    """
+    # It's redundant: the cell constraints would find the same dead ends.
+    hash_by = None
+
+    def __init__(self, tiling, **kwargs):
+        self.tiling = tiling
+        self.board = tiling.board
+        self.filled = 0
+        self.n_done = dict((label, 0) for label in tiling.labels)
+        self.size = {}
+        self.unused = set(tiling.unused_vars.values())
+        vars = []
+        for label in tiling.labels:
+            placements = tiling.placement_vars[label]
+            self.size[label] = popcount(placements[0].mask) if placements else 0
+            vars += placements
+            if label in tiling.unused_vars:
+                vars.append(tiling.unused_vars[label])
+        super(DeadRegionPropagator, self).__init__(tiling.state, *vars,
+                                                   **kwargs)
+        for var in self.vars:
+            if var.value == True:
+                self.count(var, 1)
+
+    def count(self, var, sign):
+        """ Add (sign=1) or take away (sign=-1) a True var. """
+        self.n_done[var.piece] += sign
+        mask = 0 if var in self.unused else var.mask
+        if sign > 0:
+            self.filled |= mask
+        else:
+            self.filled &= ~mask
+
+    def notice_change(self, var, prev_value, new_value):
+        if prev_value == True:
+            self.count(var, -1)
+        if new_value == True:
+            self.count(var, 1)
+        return super(DeadRegionPropagator, self).notice_change(
+            var, prev_value, new_value)
+
+    def infer(self):
+        left = [label for label in self.tiling.labels
+                if not self.n_done[label]]
+        sums = subset_sums(self.size[label] for label in left)
+        # The sums possible without one piece of a given size:
+        sums_without = {}
+        for label in left:
+            size = self.size[label]
+            if size not in sums_without:
+                others = list(left)
+                others.remove(label)
+                sums_without[size] = subset_sums(self.size[other]
+                                                 for other in others)
+        empty = self.board.mask & ~self.filled
+        for region in self.board.components(empty):
+            region_size = popcount(region)
+            if not (sums >> region_size) & 1:
+                return self.conflict("no set of pieces fills %d bloxels"
+                                     % region_size)
+
+            for label in left:
+                size = self.size[label]
+                if region_size < size \
+                        or (sums_without[size] >> (region_size - size)) & 1:
+                    continue
+
+                for var in self.tiling.placement_vars[label]:
+                    if var.value == Maybe and var.mask & region:
+                        if not self.force(var, False):
+                            return False
+        return True
+
+
+class SomaModel(object):
+    """
+    The constraint problem for a soma puzzle: the exact-cover Tiling of
+    the target by the pieces, plus constraints on how many pieces of each
+    size go unused.
+    """
+    def __init__(self, target, piece_shapes, verbose=False, prune=False):
+        """
+        target is a shape.
+        piece_shapes is a dict of {label_letter: shape}.
+        If prune, a DeadRegionPropagator watches for unfillable pockets.
+        """
+        # 7 pieces, up to 27 target bloxels, up to about 700 piece-orientations.
+        # Let's only use "bloxel" to refer to points in the target.
+        # The Tiling has a var for each orientation of each piece and for
+        # each piece being unused, and constraints that each bloxel is
+        # occupied exactly once and that each piece is used exactly once:
+        # to occupy bloxels, or for nothing.
+        self.tiling = tiling = Tiling(target, piece_shapes, optional=True,
+                                      verbose=verbose)
+        self.state = state = tiling.state
+        self.pieces = pieces = [Piece(label, piece_shapes[label])
+                                for label in tiling.labels]
+        self.bloxels = [Bloxel(tiling.board.cell(bit))
+                        for bit in tiling.board.bits]
+        self.occupied_once = dict(zip(self.bloxels, tiling.cell_constraints))
+        self.oriented_one_way = dict(zip(pieces, tiling.piece_constraints))
+
+        # Constraints on how many pieces are unused, given sizes of pieces:
+        self.unused_ranges = unused_ranges(pieces, target)
+
+        # Between so many and so many pieces of each size will be unused.
+        # (The bloxel constraints make sure the sizes add up.)
+        self.how_many_unused = {}
+        for piece_size, (fewest, most) in self.unused_ranges.items():
+            self.how_many_unused[piece_size] = BoolConstraint(state,
+                *[tiling.unused_vars[piece.label] for piece in pieces
+                  if len(piece.shape) == piece_size],
+                piece_size=piece_size, min_True=fewest, max_True=most)
+
+        self.dead_regions = None
+        if prune:
+            self.dead_regions = DeadRegionPropagator(tiling,
+                                                     label="dead_regions")
+
+    def solution_point_labels(self):
+        """
+        At a solution, return a dict of {point: label of piece there}.
+        """
+        return self.tiling.solution_cell_labels()
+
+
+class SomaIntModel(object):
+    """
+    The same problem as SomaModel (without pruning), with an IntVar per
+    piece whose values are the masks of its placements, plus "unused".
+    A bloxel's constraint counts, for each piece, whether the piece is
+    among the placements that cover it.
+    """
+    def __init__(self, target, piece_shapes, verbose=False):
+        self.board = board = Board(target)
+        self.state = state = State(verbose=verbose)
+        self.pieces = pieces = [Piece(label, piece_shapes[label])
+                                for label in sorted(piece_shapes)]
+        self.piece_vars = piece_vars = []
+        for piece in pieces:
+            masks = [mask for mask, bits in board.placements(piece.shape)]
+            piece_vars.append(IntVar(state, masks + ["unused"],
+                                     piece=piece.label))
+
+        self.bloxels = []
+        self.occupied_once = {}
+        for bit in board.bits:
+            bloxel = Bloxel(board.cell(bit))
+            self.bloxels.append(bloxel)
+            self.occupied_once[bloxel] = BoolConstraint(state,
+                *[var.among([mask for mask in var.values[:-1]
+                             if mask >> bit & 1])
+                  for var in piece_vars
+                  if any(mask >> bit & 1 for mask in var.values[:-1])],
+                min_True=1, max_True=1, bloxel=bloxel)
+
+        self.unused_ranges = unused_ranges(pieces, target)
+        self.how_many_unused = {}
+        for piece_size, (fewest, most) in self.unused_ranges.items():
+            self.how_many_unused[piece_size] = BoolConstraint(state,
+                *[var.among(["unused"])
+                  for piece, var in zip(pieces, piece_vars)
+                  if len(piece.shape) == piece_size],
+                piece_size=piece_size, min_True=fewest, max_True=most)
+
+    def solution_point_labels(self):
+        """ Like SomaModel.solution_point_labels(). """
+        labels = {}
+        for var in self.piece_vars:
+            if var.value != "unused":
+                for cell in self.board.mask_cells(var.value):
+                    labels[cell] = var.piece
+        return labels
+
+
+class LazySomaModel(object):
+    """
+    The same problem as SomaModel, for big targets, with a var for a
+    placement only once the search needs it.  Whenever the lowest-numbered
+    empty bloxel has no vars yet for the placements that cover it, they
+    are made (see State.materialize()), and its constraint becomes
+    "occupied exactly once."  Until then a bloxel's constraint only says
+    "at most once," since the placements without vars might cover it.
+    Vars, once made, stay.  The guess is a placement of the empty bloxel
+    with the fewest left, as in Knuth's Dancing Links.
+
+    A piece is placed at most once; there are no unused vars, since the
+    bloxels add up to some population of pieces anyway.  It doesn't prune,
+    and new vars mid-search don't work with transpositions or solution
+    files.  Nor with the discrepancy search modes: made vars outlast an
+    iteration, so a later iteration would guess differently at the same
+    point.
+    """
+    def __init__(self, target, piece_shapes, verbose=False):
+        self.board = board = Board(target)
+        self.state = state = State(verbose=verbose)
+        self.pieces = pieces = [Piece(label, piece_shapes[label])
+                                for label in sorted(piece_shapes)]
+        self.unused_ranges = unused_ranges(pieces, target)
+        self.orientations = dict((piece.label, orientations(piece.shape))
+                                 for piece in pieces)
+        self.bloxels = []
+        self.occupied_once = {}
+        # {bit: the constraint on the bloxel there}
+        self.bit_constraints = {}
+        for bit in board.bits:
+            bloxel = Bloxel(board.cell(bit))
+            self.bloxels.append(bloxel)
+            self.occupied_once[bloxel] = self.bit_constraints[bit] = \
+                BoolConstraint(state, min_True=0, max_True=1, bloxel=bloxel)
+        self.oriented_one_way = dict((piece, BoolConstraint(state,
+                                          min_True=0, max_True=1,
+                                          piece=piece.label))
+                                     for piece in pieces)
+        self.piece_constraints = dict((piece.label, constraint)
+                                      for piece, constraint
+                                      in self.oriented_one_way.items())
+        # The bits whose covering placements all have vars, and the
+        # (label, mask) of every placement with a var.
+        self.complete = set()
+        self.made = set()
+        state.materialize = self.materialize
+        state.guess = self.guess
+
+    def materialize(self):
+        """
+        State.materialize() for me: if the lowest-numbered empty bloxel
+        is missing vars, make them, and return True.
+        """
+        for bit in self.board.bits:
+            if not self.bit_constraints[bit][True]:
+                break
+        else:
+            return False
+
+        if bit in self.complete:
+            return False
+
+        new = []
+        for piece in self.pieces:
+            for mask, bits in self.board.placements_covering(
+                    self.orientations[piece.label], bit):
+                if (piece.label, mask) not in self.made:
+                    self.made.add( (piece.label, mask) )
+                    new.append( (piece.label, mask, bits) )
+        vars = self.state.new_vars(len(new),
+                                   piece=[label for label, mask, bits in new],
+                                   mask=[mask for label, mask, bits in new])
+        touched = set()
+        for var, (label, mask, bits) in zip(vars, new):
+            for constraint in [self.piece_constraints[label]] \
+                    + [self.bit_constraints[other] for other in bits]:
+                constraint.constrain(var)
+                touched.add(constraint)
+        self.complete.add(bit)
+        self.bit_constraints[bit].min_True = 1
+        touched.add(self.bit_constraints[bit])
+        for constraint in touched:
+            constraint.check()
+        return True
+
+    def guess(self, default_guess=None):
+        """
+        State.guess() for me: of the empty bloxels, the one with the
+        fewest Maybe placements, and its placement with the lowest id,
+        guessed True.  (Every empty bloxel has all its vars when this is
+        called, or the lowest one would still be materializing.)
+        """
+        best = None
+        for bit in self.board.bits:
+            constraint = self.bit_constraints[bit]
+            if bit in self.complete and not constraint[True] \
+                    and constraint[Maybe] \
+                    and (best is None or len(constraint[Maybe])
+                                         < len(best[Maybe])):
+                best = constraint
+        if best is None:
+            return State.guess(self.state, default_guess)
+
+        return min(best[Maybe], key=lambda var: var.id), True
+
+    def solution_point_labels(self):
+        """ Like SomaModel.solution_point_labels(). """
+        labels = {}
+        for var in self.state.vars:
+            if var.value == True:
+                for cell in self.board.mask_cells(var.mask):
+                    labels[cell] = var.piece
+        return labels
+
 
 def solve(target, piece_shapes, multi=False, just_count=False,
-          verbose=False, default_guess=None):
+          verbose=False, default_guess=None, save_filename=None, dedup=False,
+          prune=False, n_transpositions=0, mode="dfs", progress=0,
+          memory=False, lazy=False):
     """
     target is a shape.
     piece_shapes is a dict of {label_letter: shape}.
+    If save_filename is given, solutions are written there as snapshots
+    (see constrainer/solutions.py) instead of being printed.
+    If just_count and n_transpositions, a TranspositionTable of that
+    size is used to skip repeated subproblems.
+    mode is the order of search (see SEARCH_MODES in constrainer.py).
+    If progress, a report goes to stderr every progress seconds (see
+    constrainer/progress.py).
+    If memory, the model's memory use is printed before and after the
+    search, after with the trail's high-water mark (see
+    constrainer/memory.py).
+    If lazy, the model is a LazySomaModel.
     """
-    # 7 pieces, up to 27 target bloxels, up to about 700 piece-orientations.
-    # Let's only use "bloxel" to refer to points in the target.
-    state = State(verbose=verbose)
-
-    # First we set up the Constraints.  Each is like a deputy who later
-    # gets assigned some variables and will make sure the number of True 
-    # variables under his watch stays in a range.
-
-    # Each bloxel is occupied exactly once.
-    point_bloxels = dict( (point, Bloxel(point)) for point in target)
-    bloxels = point_bloxels.values()
-    occupied_once = {}
-    for bloxel in bloxels:
-        occupied_once[bloxel] = BoolConstraint(state, bloxel=bloxel,
-                                                      min_True=1, max_True=1)
-
-    # Each piece is used exactly once: to occupy a bloxel, or for nothing:
-    labeled_pieces = dict( (label, Piece(label, shape))
-                           for label, shape in piece_shapes.iteritems())
-    pieces = labeled_pieces.values()
-    oriented_one_way = {}
-    for piece in pieces:
-        oriented_one_way[piece] = BoolConstraint(state, piece=piece,
-                                                        min_True=1, max_True=1)
-
-    # Constraints on how many pieces are unused, given sizes of pieces:
-    n_unused = get_n_unused(pieces, target)
-    t_unused = sum(n_unused.values())
-    if t_unused == 0:
-        print "All", len(pieces), "pieces used."
+    reason = why_impossible(target, piece_shapes)
+    if reason:
+        print "Impossible:", reason
+        return 0, 0
+
+    if lazy:
+        assert not save_filename and not n_transpositions, \
+               "A LazySomaModel's vars change during the search."
+        assert mode == "dfs", \
+               "A LazySomaModel's guesses change from one iteration to the next."
+        assert not prune, "A LazySomaModel doesn't prune."
+        model = LazySomaModel(target, piece_shapes, verbose=verbose)
     else:
-        print len(pieces) - t_unused, "pieces used."
-
-    # A fixed number of pieces of each size will be unused.
-    how_many_unused = {}
-    for piece_size in n_unused:
-        how_many_unused[piece_size] = \
-            BoolConstraint(state, piece_size=piece_size,
-                                  min_True=n_unused[piece_size],
-                                  max_True=n_unused[piece_size])
-        
-    # Create the Variables and assign them to their Constraints.
-    for piece in pieces:
-        piece_unused = BoolVar(state, piece=piece, label="unused")
-        # Unused is one way a piece can be "oriented"; see loop below.
-        oriented_one_way[piece].constrain(piece_unused)
-        piece_size = len(piece.shape)
-        how_many_unused[piece_size].constrain(piece_unused)
-        
-        for orientation in all_orientations_fitting(piece, target):
-            orient_bloxels = [point_bloxels[pt] for pt in orientation.shape]
-            piece_oriented_thus = BoolVar(state, orientation=orientation,
-                                                 bloxels=orient_bloxels)
-            # Each piece_oriented_thus is another way a piece can be oriented.
-            oriented_one_way[piece].constrain(piece_oriented_thus)
-            for bloxel in orient_bloxels:
-                occupied_once[bloxel].constrain(piece_oriented_thus)
+        model = SomaModel(target, piece_shapes, verbose=verbose, prune=prune)
+    state = model.state
+    n_used = sorted(set(sum(popu.values())
+                        for popu in populations(model.pieces, target)[1]))
+    if n_used == [len(model.pieces)]:
+        print "All", len(model.pieces), "pieces used."
+    else:
+        print " or ".join(map(str, n_used)), "pieces used."
+    if memory:
+        print state.memory_report()
 
     # Go solve it.
 
     stdout.flush()
     stderr.flush()
+    if just_count and n_transpositions:
+        table = TranspositionTable(n_transpositions)
+        n_solutions, n_deadends = state.count_solutions(table, verbose,
+            default_guess=default_guess)
+        print len(table), "subproblems stored,", table.hits, "repeats skipped,",
+        print table.evictions, "forgotten."
+        if memory:
+            print state.memory_report()
+        return n_solutions, n_deadends
+
+    writer = None
+    if save_filename:
+        writer = SolutionWriter(save_filename, len(state.vars), dedup=dedup)
     n_solutions = 0
     n_deadends = 0
-    for is_solution in state.generate_leaves(verbose,
-                                             default_guess=default_guess):
+    leaves = state.generate_leaves(verbose, default_guess=default_guess,
+                                   mode=mode)
+    if memory:
+        leaves = watch_trail(state, leaves)
+    if progress:
+        leaves = Progress(state, progress).leaves(leaves)
+    for is_solution in leaves:
         if not is_solution:
             n_deadends += 1
             continue
 
         n_solutions += 1
+        if writer:
+            writer.write(state.snapshot())
+            if not multi:
+                break
+            continue
+
         if not just_count or verbose:
             print "==== solution", n_solutions, "depth", "%d," % state.depth(),
             print n_deadends, "dead ends ===="
@@ -451,23 +850,103 @@ def solve(target, piece_shapes, multi=False, just_count=False,
             continue
 
         # Show a solution.
-        point_labels = {}
-        for bloxel in bloxels:
-            # Those vars overseen by occupied_once[bloxel] that are True.
-            occupiers = occupied_once[bloxel][True]
-            assert len(occupiers) == 1
-            orientation_var = list(occupiers) [0]
-            piece = orientation_var.orientation.piece
-            point_labels[bloxel.point] = piece.label
-        print_points_labels(point_labels)
+        print_points_labels(model.solution_point_labels())
         
         print
         if not multi:
             break
         
+    if writer:
+        writer.close()
+        print writer.n_written, "solutions saved to", save_filename
+    if memory:
+        state.reset()
+        print state.memory_report()
     return n_solutions, n_deadends
 
 
+def explain_unsat(target, piece_shapes, max_leaves=None, verbose=False):
+    """
+    If target can't be built, print an unsatisfiable core (see
+    constrainer/core.py): the bloxels that must be covered once (marked
+    # in a picture of target), the pieces that must be used once, and
+    the rules on how many pieces of a size go unused, that can't all be
+    satisfied together.  Return the core, or None if there's a solution.
+    """
+    # No DeadRegionPropagator: it assumes every bloxel gets covered.
+    model = SomaModel(target, piece_shapes, verbose=verbose, prune=False)
+    core = model.state.unsat_core(
+        model.occupied_once.values() + model.oriented_one_way.values()
+        + model.how_many_unused.values(),
+        max_leaves=max_leaves or None, verbose=verbose)
+    if core is None:
+        print "There is a solution."
+        return None
+
+    core_set = set(core)
+    print "No solutions, because of these %d constraints:" % len(core)
+    print_points_labels(dict((bloxel.point,
+                              "#" if constraint in core_set else "x")
+                             for bloxel, constraint
+                             in model.occupied_once.items()))
+    print "Pieces:", " ".join(sorted(piece.label for piece, constraint
+                                     in model.oriented_one_way.items()
+                                     if constraint in core_set))
+    for constraint in model.how_many_unused.values():
+        if constraint in core_set:
+            print "%s to %s pieces of size %s unused." \
+                % (constraint.min_True, constraint.max_True,
+                   constraint.piece_size)
+    return core
+
+
+# Configurations for --portfolio (see constrainer/portfolio.py).
+PORTFOLIO = [dict(default_guess=False),
+             dict(default_guess=True),
+             dict(default_guess=False, mode="lds"),
+             dict(default_guess=True, mode="lds"),
+             dict(default_guess=False, seed=1),
+             dict(default_guess=True, seed=2)]
+
+
+def solve_portfolio(target, piece_shapes, configs=PORTFOLIO, timeout=None,
+                    record=None, label=None, verbose=False, prune=False):
+    """
+    Search for one solution with each of configs in parallel, and show
+    the first answer and how every run did.  Return (n_solutions,
+    n_deadends) of the winning run.
+    """
+    reason = why_impossible(target, piece_shapes)
+    if reason:
+        print "Impossible:", reason
+        return 0, 0
+
+    model = SomaModel(target, piece_shapes, verbose=verbose, prune=prune)
+    state = model.state
+    stdout.flush()
+    winner, runs = run_portfolio(state, configs, timeout=timeout,
+                                 record=record, label=label, verbose=verbose)
+    for run in runs:
+        config = ", ".join("%s=%s" % (key, run[key])
+                           for key in ("default_guess", "mode", "seed")
+                           if key in run)
+        print "%-40s %-12s %8.2f sec. %s dead ends" \
+            % (config, run["status"], run["seconds"],
+               run.get("n_deadends", "?"))
+    if winner is None:
+        print "No run finished."
+        return 0, 0
+
+    print "Won by run", winner["index"]
+    if winner["status"] != "solution":
+        return 0, winner["n_deadends"]
+
+    apply_solution(state, winner["solution"])
+    print_points_labels(model.solution_point_labels())
+    state.reset()
+    return 1, winner["n_deadends"]
+
+
 if __name__ == "__main__":
     args = parse_args()
     pieces = dict(read_labels_shapes(args.pieces))
@@ -475,9 +954,25 @@ if __name__ == "__main__":
     default_guess = (args.default_guess == "True")
     print "default_guess =", default_guess
     start = time.clock()
-    n_solutions, n_deadends = solve(target, pieces,
-                                    args.many, args.count, args.verbose,
-                                    default_guess=default_guess)
+    if args.core is not None:
+        exit(0 if explain_unsat(target, pieces, args.core, args.verbose)
+             else 1)
+    if args.portfolio:
+        n_solutions, n_deadends = solve_portfolio(target, pieces,
+            timeout=args.timeout, record=args.record, label=args.puzzle,
+            verbose=args.verbose, prune=args.prune)
+    else:
+        n_solutions, n_deadends = solve(target, pieces,
+                                        args.many, args.count, args.verbose,
+                                        default_guess=default_guess,
+                                        save_filename=args.save,
+                                        dedup=args.dedup,
+                                        prune=args.prune,
+                                        n_transpositions=args.transpositions,
+                                        mode=args.search,
+                                        progress=args.progress,
+                                        memory=args.memory,
+                                        lazy=args.lazy)
     if args.count or args.many:
         print n_solutions, "solutions."
     if n_solutions == 0:
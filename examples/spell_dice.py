@@ -9,7 +9,8 @@ import sys
 import argparse
 
 from constrainer import *
-from maybies import *
+from constrainer.maybies import *
+from constrainer.progress import Progress
 
 
 def parse_args():
@@ -23,6 +24,22 @@ def parse_args():
     parser.add_argument("--count", "-c",
         action="store_true",
         help="just output a count of the number of solutions found")
+    parser.add_argument("--search", metavar="mode",
+        type=str, default="dfs", choices=sorted(SEARCH_MODES),
+        help="order of search: "
+             + "; ".join("%s = %s" % mode_help
+                         for mode_help in sorted(SEARCH_MODES.items())))
+    parser.add_argument("--progress", metavar="sec",
+        type=float, nargs="?", const=10.0, default=0,
+        help="every sec seconds (default 10), report leaves per second "
+             "and estimate the size of the search and the time left")
+    parser.add_argument("--int_vars", "-i",
+        action="store_true",
+        help="make each die one IntVar instead of a BoolVar per letter")
+    parser.add_argument("--fewest", metavar="kind",
+        type=str, default=None,
+        help="use as few as possible of the dice whose descriptions "
+             "contain kind (e.g. a color), showing each better solution")
     parser.add_argument("--verbose", "-v",
         action="store_true",
         help="show search progress")
@@ -44,55 +61,158 @@ class Die(object):
         return "Die(%r)" % str(self)
 
 
-def spell(word, dice, multi=False, just_count=False, verbose=False):
-    state = State(verbose=verbose)
-    
-    letters = list(set(word))
-    for i, die in enumerate(dice):
-        if not any(letter in die.faces for letter in letters):
-            print "Die", die, "is not usable."
-            dice.pop(i)
-    if len(dice) < len(word):
-        raise Exception("Not enough dice to spell the word!")
-
-    # First we set up the Constrainers:
-
-    letter_constraints = {}
-    for letter in letters:
-        # There are exactly as many dice showing a letter
-        # as appearances of the letter in the word.
-        n_appears = sum(c == letter for c in word)
-        letter_constraints[letter] = BoolConstraint(state, min_True=n_appears,
-                                             max_True=n_appears, letter=letter)
-
-    # It helps here to treat unused dice as like being
-    # "used for nothing," or "showing the null letter."
-    # The number of unused dice is exactly as many as the word doesn't need:
-    n_unused_dice = len(dice) - len(word)
-    letter_constraints["unused"] = BoolConstraint(state,
-                                                  min_True=n_unused_dice,
-                                                  max_True=n_unused_dice,
-                                                  letter="unused")
-
-    # Each die is used exactly once: either to show a letter, or for nothing:
-    die_constraints = dict( (die, BoolConstraint(state, min_True=1, max_True=1,
-                                                 die=die))
-                            for die in dice)
-
-    # Now the Variables:
-    
-    for letter in letters + ["unused"]:
-        for die in dice:
-            # Variables to say: this die is used to show this letter
-            # (or, this die is not used).
-            if letter == "unused" or letter in die.faces:
-                die_shows_letter = BoolVar(state, die=die, letter=letter)
-                letter_constraints[letter].constrain(die_shows_letter)
-                die_constraints[die].constrain(die_shows_letter)
+class SpellModel(object):
+    """
+    The constraint problem for spelling word with dice: a State plus the
+    constraints needed to read a solution back out of it.
+    """
+    def __init__(self, word, dice, verbose=False):
+        self.word = word
+        self.state = state = State(verbose=verbose)
+
+        self.letters = letters = list(set(word))
+        self.unusable = [die for die in dice
+                         if not any(letter in die.faces for letter in letters)]
+        self.dice = dice = [die for die in dice if die not in self.unusable]
+        if len(dice) < len(word):
+            raise Exception("Not enough dice to spell the word!")
+
+        # First we set up the Constrainers:
+
+        self.letter_constraints = letter_constraints = {}
+        for letter in letters:
+            # There are exactly as many dice showing a letter
+            # as appearances of the letter in the word.
+            n_appears = sum(c == letter for c in word)
+            letter_constraints[letter] = BoolConstraint(state,
+                min_True=n_appears, max_True=n_appears, letter=letter)
+
+        # It helps here to treat unused dice as like being
+        # "used for nothing," or "showing the null letter."
+        # The number of unused dice is exactly as many as the word doesn't
+        # need:
+        n_unused_dice = len(dice) - len(word)
+        letter_constraints["unused"] = BoolConstraint(state,
+                                                      min_True=n_unused_dice,
+                                                      max_True=n_unused_dice,
+                                                      letter="unused")
+
+        # Each die is used exactly once: either to show a letter, or for
+        # nothing:
+        self.die_constraints = die_constraints = \
+            dict( (die, BoolConstraint(state, min_True=1, max_True=1, die=die))
+                  for die in dice)
+
+        # Now the Variables:
+
+        for letter in letters + ["unused"]:
+            for die in dice:
+                # Variables to say: this die is used to show this letter
+                # (or, this die is not used).
+                if letter == "unused" or letter in die.faces:
+                    die_shows_letter = BoolVar(state, die=die, letter=letter)
+                    letter_constraints[letter].constrain(die_shows_letter)
+                    die_constraints[die].constrain(die_shows_letter)
+
+    def solution_letter_dice(self):
+        """
+        At a solution, return a list of (letter, die) in the order of
+        the letters of the word.
+        """
+        # For each letter, make a list of dice that are showing it.
+        letter_dice = dict( (letter, []) for letter in self.letters)
+        for letter in self.letters:
+            for var in self.letter_constraints[letter].vars:
+                if var.value == Maybe:
+                    print var.letter, var.die, "Maybe??"
+                    print var.letter, "constraints:"
+                    print [c2.value \
+                           for c2 in self.letter_constraints[var.letter].vars]
+                    print var.die, "constraints:"
+                    print [c2.value
+                           for c2 in self.die_constraints[var.die].vars]
+                if var.value:
+                    letter_dice[letter].append(var.die)
+        # Remove dice from their lists as you use them to spell:
+        return [(letter, letter_dice[letter].pop()) for letter in self.word]
+
+    def use_vars(self, kind):
+        """
+        Vars that are True when a die whose comment contains kind shows
+        a letter.
+        """
+        return [var for die in self.dice if kind in die.comment
+                for var in self.die_constraints[die].vars
+                if var.letter != "unused"]
+
+
+class SpellIntModel(object):
+    """
+    The same problem as SpellModel, with an IntVar per die whose values
+    are the die's letters that are in the word, plus "unused".  The
+    IntVars take the place of the die constraints.
+    """
+    def __init__(self, word, dice, verbose=False):
+        self.word = word
+        self.state = state = State(verbose=verbose)
+
+        self.letters = letters = list(set(word))
+        self.unusable = [die for die in dice
+                         if not any(letter in die.faces for letter in letters)]
+        self.dice = dice = [die for die in dice if die not in self.unusable]
+        if len(dice) < len(word):
+            raise Exception("Not enough dice to spell the word!")
+
+        self.die_vars = [IntVar(state, [letter for letter in letters
+                                        if letter in die.faces] + ["unused"],
+                                die=die)
+                         for die in dice]
+        n_needed = dict((letter, sum(c == letter for c in word))
+                        for letter in letters)
+        n_needed["unused"] = len(dice) - len(word)
+        self.letter_constraints = {}
+        for letter, n in n_needed.iteritems():
+            self.letter_constraints[letter] = BoolConstraint(state,
+                *[var.among([letter]) for var in self.die_vars
+                  if letter in var.index],
+                min_True=n, max_True=n, letter=letter)
+
+    def solution_letter_dice(self):
+        """ Like SpellModel.solution_letter_dice(). """
+        letter_dice = dict( (letter, []) for letter in self.letters)
+        for var in self.die_vars:
+            if var.value != "unused":
+                letter_dice[var.value].append(var.die)
+        return [(letter, letter_dice[letter].pop()) for letter in self.word]
+
+    def use_vars(self, kind):
+        """ Like SpellModel.use_vars(), but Amongs. """
+        return [var.among(var.values[:-1]) for var in self.die_vars
+                if kind in var.die.comment]
+
+
+def spell(word, dice, multi=False, just_count=False, verbose=False,
+          mode="dfs", progress=0, int_vars=False, fewest=None):
+    if int_vars:
+        model = SpellIntModel(word, dice, verbose=verbose)
+    else:
+        model = SpellModel(word, dice, verbose=verbose)
+    state = model.state
+    for die in model.unusable:
+        print "Die", die, "is not usable."
         
     n_solutions = 0
     n_deadends = 0
-    for is_solution in state.generate_leaves(verbose):
+    if fewest is not None:
+        # Every solution is better than the last; the last is the best.
+        leaves = state.minimize(model.use_vars(fewest), verbose=verbose,
+                                mode=mode)
+        multi = True
+    else:
+        leaves = state.generate_leaves(verbose, mode=mode)
+    if progress:
+        leaves = Progress(state, progress).leaves(leaves)
+    for is_solution in leaves:
         if not is_solution:
             n_deadends += 1
             continue
@@ -105,22 +225,9 @@ def spell(word, dice, multi=False, just_count=False, verbose=False):
             continue
 
         # Show a solution.
-        # For each letter, make a list of dice that are showing it.
-        letter_dice = dict( (letter, []) for letter in letters)
-        for letter in letters:
-            for var in letter_constraints[letter].vars:
-                if var.value == Maybe:
-                    print var.letter, var.die, "Maybe??"
-                    print var.letter, "constraints:"
-                    print [c2.value \
-                           for c2 in letter_constraints[var.letter].vars]
-                    print var.die, "constraints:"
-                    print [c2.value for c2 in die_constraints[var.die].vars]
-                if var.value:
-                    letter_dice[letter].append(var.die)
-        # Remove dice from their lists as you use them to spell:
-        for letter in word:
-            die = letter_dice[letter].pop()
+        if fewest is not None:
+            print "Using", state.incumbent, fewest, "dice:"
+        for letter, die in model.solution_letter_dice():
             print letter, die
         print
         if not multi:
@@ -133,7 +240,9 @@ if __name__ == "__main__":
     args = parse_args()
     dice = [Die(line) for line in open(args.dice)]
     n_solutions, n_deadends = spell(args.word, dice,
-                                    args.many, args.count, args.verbose)
+                                    args.many, args.count, args.verbose,
+                                    args.search, args.progress,
+                                    args.int_vars, args.fewest)
     if args.count or args.many:
         print n_solutions, "solutions."
     if n_solutions == 0:
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+examples/var_memory.py -- Measure the memory used by a large generated model.
+    Copyright (c) 2013 Steve Witham All rights reserved.  
+    Constrainer is available under a BSD license, whose full text is at
+        https://github.com/switham/constrainer/blob/master/LICENSE
+
+Builds an n x n grid of BoolVars, each carrying two attributes, with an
+exactly-one BoolConstraint on every row and column (the rook-placement
+model), and reports how much the process grew.
+"""
+
+import argparse
+import gc
+import resource
+import sys
+import time
+
+from constrainer import *
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", "-n", metavar="N",
+        type=int, default=1000,
+        help="size of the grid; the model has N*N vars")
+    parser.add_argument("--no-constraints",
+        action="store_true",
+        help="only create the vars")
+    return parser.parse_args()
+
+
+def max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on Mac OS X.
+    if sys.platform == "darwin":
+        return rss
+    return rss * 1024
+
+
+def build_grid(n, constrain=True):
+    state = State()
+    rows = [[] for y in range(n)]
+    cols = [[] for x in range(n)]
+    for y in range(n):
+        for x in range(n):
+            var = BoolVar(state, x=x, y=y)
+            rows[y].append(var)
+            cols[x].append(var)
+    if constrain:
+        for line in rows + cols:
+            BoolConstraint(state, *line, min_True=1, max_True=1)
+    return state
+
+
+def main():
+    args = parse_args()
+    gc.collect()
+    before = max_rss_bytes()
+    start = time.time()
+    state = build_grid(args.size, not args.no_constraints)
+    elapsed = time.time() - start
+    grown = max_rss_bytes() - before
+    n_vars = args.size ** 2
+    print n_vars, "vars,", len(state.constraints), "constraints,",
+    print "%.1f sec." % elapsed
+    print "%.1f MB, %.1f bytes per var." % (grown / 1e6, float(grown) / n_vars)
+
+
+if __name__ == "__main__":
+    main()